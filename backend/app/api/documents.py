@@ -1,21 +1,30 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any
+import json
+from typing import Any, AsyncIterator, NamedTuple
 
 from fastapi import APIRouter, File, Form, Query, Request, UploadFile
+from fastapi.responses import StreamingResponse
 
 from app.config.settings import settings
 from app.data_access.factory import get_data_provider
-from app.documents.extractor import extract_text
+from app.documents.extraction_cache import extract_chunks
+from app.documents.extractor import estimate_tokens
 from app.documents.factory import get_document_provider
+from app.documents.ingestion import get_ingestion_pipeline
 from app.documents.models import (
     DocumentListItem,
     DocumentSearchResult,
     EntityAssociation,
+    IngestionStatus,
+    PreparedDocument,
 )
 from app.exceptions import GoldMineError, NotFoundError
-from app.llm.models import LLMQueryRequest, LLMQueryResponse, LLMSource
+from app.llm.cache import cache_key, get_llm_cache, invalidate_entities
+from app.llm.context import pack_context
+from app.llm.gateway import get_llm_gateway
+from app.llm.models import LLMCacheStats, LLMQueryRequest, LLMQueryResponse, LLMSource
 from app.logging_config import get_logger
 from app.object_storage.factory import get_storage_provider
 from app.object_storage.models import FileMetadata
@@ -34,48 +43,27 @@ MAX_UPLOAD_SIZE = 10 * 1024 * 1024  # 10 MB
 # ---------------------------------------------------------------------------
 
 def _ensure_existing_files_indexed() -> None:
+    """Queue storage files missing from the index; requests use the partial index meanwhile."""
     global _indexed_existing
     if _indexed_existing:
         return
-    _indexed_existing = True
-
-    storage = get_storage_provider()
-    doc_provider = get_document_provider()
-    all_files = storage.list_files()
-
-    indexed_count = 0
-    for meta in all_files:
-        if doc_provider.is_indexed(meta.file_id):
-            continue
-
-        # Build entity associations from tickers
-        entities = [
-            EntityAssociation(entity_type="stock", entity_id=ticker)
-            for ticker in meta.tickers
-        ]
-
-        # Try to extract text
-        result = storage.get_file_bytes(meta.file_id)
-        text = ""
-        if result:
-            file_bytes, filename, mime_type = result
-            text = extract_text(file_bytes, mime_type, filename)
-
-        doc_provider.index_document(
-            file_id=meta.file_id,
-            filename=meta.filename,
-            title=meta.description or meta.filename,
-            doc_type=meta.type,
-            mime_type=meta.mime_type,
-            date=meta.date,
-            description=meta.description,
-            entities=entities,
-            text=text,
-        )
-        indexed_count += 1
 
-    if indexed_count > 0:
-        logger.info("auto_indexed_existing_files", count=indexed_count)
+    pipeline = get_ingestion_pipeline()
+    background = settings.DOCUMENT_INGEST_BACKGROUND
+    count = pipeline.ingest_missing(get_storage_provider().list_files(), background)
+    if count is None:
+        # Another worker is indexing; its documents arrive through the shared
+        # segments, and a later request checks again in case it stopped early
+        logger.info("auto_index_running_elsewhere")
+        return
+    _indexed_existing = True
+    if not count:
+        return
+    if background:
+        logger.info("auto_index_started", count=count)
+    else:
+        status = pipeline.status()
+        logger.info("auto_indexed_existing_files", count=status.indexed, failed=status.failed)
 
 
 # ---------------------------------------------------------------------------
@@ -123,22 +111,25 @@ async def upload_document(
     )
     storage.store_file(file.filename, file_bytes, file_meta)
 
-    # Extract and index
-    text = extract_text(file_bytes, mime, file.filename)
+    # Extract and index (identical bytes reuse the cached extraction)
+    chunks = await asyncio.to_thread(extract_chunks, file_bytes, mime, file.filename)
     entities = [EntityAssociation(entity_type=entity_type, entity_id=entity_id)]
 
     doc_provider = get_document_provider()
-    record = doc_provider.index_document(
-        file_id=file_id,
-        filename=file.filename,
-        title=title or file.filename,
-        doc_type=doc_type,
-        mime_type=mime,
-        date=date,
-        description=description,
-        entities=entities,
-        text=text,
-    )
+    [record] = doc_provider.index_documents([
+        PreparedDocument(
+            file_id=file_id,
+            filename=file.filename,
+            title=title or file.filename,
+            doc_type=doc_type,
+            mime_type=mime,
+            date=date,
+            description=description,
+            entities=entities,
+            chunks=chunks,
+        )
+    ])
+    invalidate_entities([(entity_type, entity_id)])
 
     return DocumentListItem(
         file_id=record.file_id,
@@ -163,74 +154,173 @@ async def list_documents(
     return provider.list_documents(entity_type=entity_type, entity_id=entity_id)
 
 
+@router.get("/ingestion")
+async def get_ingestion_status() -> IngestionStatus:
+    _ensure_existing_files_indexed()
+    return get_ingestion_pipeline().status()
+
+
 @router.get("/search")
 async def search_documents(
     q: str = Query(..., min_length=1),
     entity_type: str | None = Query(default=None),
     entity_id: str | None = Query(default=None),
+    limit: int = Query(default=50, ge=1, le=500),
+    mode: str = Query(default="keyword", pattern="^(keyword|hybrid)$"),
 ) -> list[DocumentSearchResult]:
     _ensure_existing_files_indexed()
     provider = get_document_provider()
-    return provider.search(q, entity_type=entity_type, entity_id=entity_id)
+    return await asyncio.to_thread(
+        provider.search, q, entity_type=entity_type, entity_id=entity_id, limit=limit, mode=mode,
+    )
 
 
 @router.post("/query")
 async def llm_query(request: Request, body: LLMQueryRequest) -> LLMQueryResponse:
     _ensure_existing_files_indexed()
+    _require_llm()
+
+    # 1-3. Entity data, document search and context assembly
+    prepared = await asyncio.to_thread(_prepare_llm_context, body)
+
+    # 4. Serve a cached answer for the same question over the same context
+    cache = get_llm_cache()
+    if cache is not None:
+        cached = cache.get(prepared.cache_key, prepared.entity)
+        if cached is not None:
+            logger.info("llm_cache_hit", entity_type=body.entity_type, entity_id=body.entity_id)
+            cached.cached = True
+            return cached
+
+    # 5. Call the LLM (concurrency-limited, rate-limited, coalesced)
+    response = await get_llm_gateway().query(
+        _username(request), prepared.cache_key, body, prepared.context, prepared.sources_context,
+    )
+
+    # 6. Attach source references
+    response.sources = prepared.sources
+    if cache is not None:
+        cache.put(prepared.cache_key, prepared.entity, response)
+    return response
+
+
+@router.post("/query/stream")
+async def llm_query_stream(request: Request, body: LLMQueryRequest) -> StreamingResponse:
+    """``/query`` as Server-Sent Events: ``sources`` first, then ``token`` deltas, then ``done``."""
+    _ensure_existing_files_indexed()
+    _require_llm()
+
+    prepared = await asyncio.to_thread(_prepare_llm_context, body)
+    cache = get_llm_cache()
+    cached = cache.get(prepared.cache_key, prepared.entity) if cache is not None else None
+    gateway = get_llm_gateway()
+    if cached is None:
+        # Before the response starts, so a limited user gets a real 429
+        gateway.admit(_username(request))
+
+    async def events() -> AsyncIterator[str]:
+        yield _sse("sources", [s.model_dump() for s in prepared.sources])
+
+        if cached is not None:
+            logger.info("llm_cache_hit", entity_type=body.entity_type, entity_id=body.entity_id)
+            yield _sse("token", {"text": cached.answer})
+            yield _sse("done", {"model": cached.model, "token_usage": cached.token_usage, "cached": True})
+            return
+
+        final: LLMQueryResponse | None = None
+        try:
+            async for item in gateway.stream(body, prepared.context, prepared.sources_context):
+                if isinstance(item, LLMQueryResponse):
+                    final = item
+                else:
+                    yield _sse("token", {"text": item})
+        except GoldMineError as e:
+            yield _sse("error", {"detail": e.message})
+            return
+        except Exception as e:
+            logger.error("llm_stream_failed", error=str(e))
+            yield _sse("error", {"detail": "LLM request failed"})
+            return
+
+        if final is not None:
+            final.sources = prepared.sources
+            if cache is not None:
+                cache.put(prepared.cache_key, prepared.entity, final)
+            yield _sse("done", {"model": final.model, "token_usage": final.token_usage, "cached": False})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/query/cache")
+async def get_llm_cache_stats() -> LLMCacheStats:
+    cache = get_llm_cache()
+    return cache.stats() if cache is not None else LLMCacheStats(enabled=False)
+
+
+# ---------------------------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------------------------
+
+class _LLMContext(NamedTuple):
+    context: str
+    sources_context: str
+    sources: list[LLMSource]
+    entity: tuple[str, str]
+    cache_key: str
 
-    if not settings.ANTHROPIC_API_KEY:
+
+def _require_llm() -> None:
+    if settings.LLM_PROVIDER == "anthropic" and not settings.ANTHROPIC_API_KEY:
         raise GoldMineError("LLM not configured", status_code=503)
 
-    # 1. Get entity structured data
+
+def _prepare_llm_context(body: LLMQueryRequest) -> _LLMContext:
+    """Entity data plus the best document chunks that fit the token budget."""
     context = _get_entity_context(body.entity_type, body.entity_id)
 
-    # 2. Search document chunks
     doc_provider = get_document_provider()
     search_results = doc_provider.search(
         body.query,
         entity_type=body.entity_type,
         entity_id=body.entity_id,
+        mode=settings.LLM_RETRIEVAL,
     )
 
-    # 3. Assemble document context (up to max chunks)
-    sources_parts: list[str] = []
-    source_refs: list[LLMSource] = []
-    chunk_count = 0
-    for result in search_results:
-        for chunk in result.matching_chunks:
-            if chunk_count >= settings.LLM_MAX_CONTEXT_CHUNKS:
-                break
-            sources_parts.append(
-                f"[{result.filename}, chunk {chunk.chunk_index}]\n{chunk.text}"
-            )
-            source_refs.append(
-                LLMSource(
-                    file_id=result.file_id,
-                    filename=result.filename,
-                    chunk_index=chunk.chunk_index,
-                    excerpt=chunk.text[:200],
-                )
-            )
-            chunk_count += 1
-        if chunk_count >= settings.LLM_MAX_CONTEXT_CHUNKS:
-            break
-
-    sources_context = "\n\n".join(sources_parts) if sources_parts else "(No relevant documents found)"
+    # Structured data is always sent; documents fill what is left of the budget
+    budget = settings.LLM_CONTEXT_TOKEN_BUDGET
+    packed = pack_context(
+        search_results,
+        token_budget=max(budget - estimate_tokens(context), budget // 2),
+        max_chunks=settings.LLM_MAX_CONTEXT_CHUNKS,
+        mmr_lambda=settings.LLM_CONTEXT_MMR_LAMBDA,
+    )
+    logger.info(
+        "llm_context_packed",
+        chunks=len(packed.chunk_ids),
+        tokens=packed.tokens,
+        candidates=sum(len(r.matching_chunks) for r in search_results),
+    )
+    return _LLMContext(
+        context=context,
+        sources_context=packed.text,
+        sources=packed.sources,
+        entity=(body.entity_type, body.entity_id),
+        cache_key=cache_key(body, context, packed.chunk_ids, settings.LLM_MODEL),
+    )
 
-    # 4. Call LLM via thread pool
-    from app.llm.factory import get_llm_provider
 
-    llm = get_llm_provider()
-    response = await asyncio.to_thread(llm.query, body, context, sources_context)
+def _username(request: Request) -> str:
+    user = getattr(request.state, "user", None)
+    return user.username if user is not None else "anonymous"
 
-    # 5. Attach source references
-    response.sources = source_refs
-    return response
 
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-# ---------------------------------------------------------------------------
-# Helpers
-# ---------------------------------------------------------------------------
 
 def _get_entity_context(entity_type: str, entity_id: str) -> str:
     """Build structured data context string for an entity."""
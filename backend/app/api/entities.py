@@ -1,10 +1,11 @@
 from __future__ import annotations
 
-import csv
 import math
-from pathlib import Path
+from datetime import date
 from typing import Any
 
+import numpy as np
+
 from fastapi import APIRouter, Query, Request
 
 from app.api.entity_models import (
@@ -16,12 +17,16 @@ from app.api.entity_models import (
     EntityResolution,
     FilterDefinition,
     FilterOption,
+    PriceHistoryBatch,
+    PriceHistoryColumns,
     SecondaryLine,
     WidgetConfig,
 )
-from app.data_access.factory import get_data_provider
+from app.data_access.downsampling import lttb_indices, marker_indices, minmax_indices
+from app.data_access.factory import get_data_provider, get_price_history_store
+from app.data_access.price_history import PriceBars, PriceSeries, day_number, resample
 from app.data_access.models import FilterParams, PaginatedResponse
-from app.exceptions import NotFoundError
+from app.exceptions import GoldMineError, NotFoundError
 from app.logging_config import get_logger
 from app.object_storage.factory import get_storage_provider
 
@@ -204,6 +209,10 @@ async def get_entity_detail(
     return detail
 
 
+# Enough points for a full-width chart; the series is downsampled server-side
+_PRICE_HISTORY_POINTS = 1000
+
+
 def _build_stock_detail(ticker: str) -> EntityDetail:
     provider = get_data_provider()
     record = provider.get_record("stocks", ticker)
@@ -229,7 +238,7 @@ def _build_stock_detail(ticker: str) -> EntityDetail:
         WidgetConfig(
             widget_id="price_history",
             title="Price History",
-            endpoint=f"/api/entities/stock/{ticker}/price-history",
+            endpoint=f"/api/entities/stock/{ticker}/price-history?points={_PRICE_HISTORY_POINTS}",
             widget_type="chart",
             chart_config=ChartConfig(
                 chart_type="line",
@@ -548,11 +557,7 @@ async def get_person_stocks(
     tickers_str = person.get("tickers", "")
     ticker_list = [t.strip() for t in tickers_str.split(";") if t.strip()]
 
-    stock_records: list[dict[str, Any]] = []
-    for ticker in ticker_list:
-        stock = provider.get_record("stocks", ticker)
-        if stock:
-            stock_records.append(stock)
+    stock_records = provider.get_records("stocks", ticker_list)
 
     return _paginate(stock_records, page, page_size, sort_by, sort_order, _extract_filters(request))
 
@@ -561,42 +566,125 @@ async def get_person_stocks(
 # Chart data endpoints
 # ---------------------------------------------------------------------------
 
-_STOCK_HISTORY_CSV = Path(__file__).resolve().parent.parent.parent.parent / "data" / "structured" / "stock_history.csv"
-
-
 @router.get("/stock/{ticker}/price-history")
 async def get_stock_price_history(
     ticker: str,
     page: int = Query(default=1, ge=1),
     page_size: int = Query(default=5000, ge=1, le=10000),
+    start: date | None = Query(default=None),
+    end: date | None = Query(default=None),
+    points: int | None = Query(default=None, ge=3, le=10000),
+    downsample: str = Query(default="lttb", pattern="^(lttb|minmax)$"),
+    interval: str = Query(default="daily", pattern="^(daily|weekly|monthly|quarterly)$"),
 ) -> PaginatedResponse:
     provider = get_data_provider()
     stock = provider.get_record("stocks", ticker)
     if stock is None:
         raise NotFoundError(f"Stock '{ticker}' not found")
 
-    if not _STOCK_HISTORY_CSV.exists():
-        return PaginatedResponse(
-            data=[], page=1, page_size=page_size,
-            total_records=0, total_pages=1, has_next=False, has_previous=False,
+    series = get_price_history_store().get_series(ticker)
+    if series is not None:
+        series = series.between(
+            day_number(start) if start else None,
+            day_number(end) if end else None,
         )
+        series = resample(series, interval)
+        if points is not None and series.size > points:
+            series = series.take(_downsample_indices(series, points, downsample))
+
+    total = series.size if series is not None else 0
+    total_pages = max(1, math.ceil(total / page_size))
+    page = min(page, total_pages)
+
+    # Rows are stored in date order; only the requested page is materialized
+    offset = (page - 1) * page_size
+    rows = series.take(slice(offset, offset + page_size)).to_records() if series is not None else []
+
+    return PaginatedResponse(
+        data=rows,
+        page=page,
+        page_size=page_size,
+        total_records=total,
+        total_pages=total_pages,
+        has_next=page < total_pages,
+        has_previous=page > 1,
+    )
 
-    rows: list[dict[str, Any]] = []
-    with open(_STOCK_HISTORY_CSV, newline="") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            if row["ticker"] == ticker:
-                entry: dict[str, Any] = {"date": row["date"], "close": row["close"]}
-                if row.get("eps_estimate"):
-                    entry["eps_estimate"] = row["eps_estimate"]
-                if row.get("eps_actual"):
-                    entry["eps_actual"] = row["eps_actual"]
-                rows.append(entry)
 
-    # Already sorted chronologically in the CSV, but ensure it
-    rows.sort(key=lambda r: r["date"])
+_MAX_BATCH_TICKERS = 100
 
-    return _paginate(rows, page, page_size, None, "asc")
+
+@router.get("/stock/price-history/batch")
+async def get_stock_price_history_batch(
+    tickers: str = Query(..., description="Comma-separated tickers"),
+    start: date | None = Query(default=None),
+    end: date | None = Query(default=None),
+    interval: str = Query(default="daily", pattern="^(daily|weekly|monthly|quarterly)$"),
+    align: bool = Query(default=False),
+) -> PriceHistoryBatch:
+    """Closing prices and EPS for several tickers as one columnar payload.
+
+    Each series is an indexed slice of the price-history store. With
+    ``align=true`` every series is forward-filled onto the union of their
+    dates; EPS values are only placed on the dates they were reported.
+    """
+    requested = list(dict.fromkeys(t.strip() for t in tickers.split(",") if t.strip()))
+    if not requested:
+        raise GoldMineError("At least one ticker is required", status_code=400)
+    if len(requested) > _MAX_BATCH_TICKERS:
+        raise GoldMineError(f"At most {_MAX_BATCH_TICKERS} tickers per request", status_code=400)
+
+    provider = get_data_provider()
+    store = get_price_history_store()
+    known = {r.get("ticker", "") for r in provider.get_records("stocks", requested)}
+    start_day = day_number(start) if start else None
+    end_day = day_number(end) if end else None
+
+    found: dict[str, PriceSeries | PriceBars] = {}
+    missing: list[str] = []
+    for ticker in requested:
+        series = store.get_series(ticker) if ticker in known else None
+        if series is None:
+            missing.append(ticker)
+            continue
+        found[ticker] = resample(series.between(start_day, end_day), interval)
+
+    if not align:
+        return PriceHistoryBatch(
+            tickers=list(found),
+            missing=missing,
+            series={
+                t: PriceHistoryColumns(
+                    dates=_iso_dates(s.dates),
+                    close=_nullable(s.close),
+                    eps_estimate=_nullable(s.eps_estimate),
+                    eps_actual=_nullable(s.eps_actual),
+                )
+                for t, s in found.items()
+            },
+        )
+
+    axis = np.unique(np.concatenate([np.asarray(s.dates) for s in found.values()] or [[]]))
+    series_out: dict[str, PriceHistoryColumns] = {}
+    for ticker, s in found.items():
+        dates = np.asarray(s.dates)
+        # Latest row on or before each axis date; -1 before the series starts
+        latest = np.searchsorted(dates, axis, side="right") - 1
+        has_row = latest >= 0
+        exact = has_row.copy()
+        exact[has_row] = dates[latest[has_row]] == axis[has_row]
+        series_out[ticker] = PriceHistoryColumns(
+            close=_nullable(_gather(s.close, latest, has_row)),
+            eps_estimate=_nullable(_gather(s.eps_estimate, latest, exact)),
+            eps_actual=_nullable(_gather(s.eps_actual, latest, exact)),
+        )
+    return PriceHistoryBatch(
+        tickers=list(found),
+        missing=missing,
+        aligned=True,
+        dates=_iso_dates(axis),
+        series=series_out,
+    )
 
 
 @router.get("/stock/{ticker}/peers")
@@ -625,11 +713,9 @@ async def get_person_coverage_sectors(person_id: str) -> PaginatedResponse:
     ticker_list = [t.strip() for t in tickers_str.split(";") if t.strip()]
 
     sector_counts: dict[str, int] = {}
-    for ticker in ticker_list:
-        stock = provider.get_record("stocks", ticker)
-        if stock:
-            sector = stock.get("sector", "Unknown")
-            sector_counts[sector] = sector_counts.get(sector, 0) + 1
+    for stock in provider.get_records("stocks", ticker_list):
+        sector = stock.get("sector", "Unknown")
+        sector_counts[sector] = sector_counts.get(sector, 0) + 1
 
     data = [{"sector": s, "count": str(c)} for s, c in sorted(sector_counts.items())]
     return _paginate(data, 1, 200, None, "asc")
@@ -674,6 +760,29 @@ def _sort_key(value: Any) -> Any:
         return str(value).lower()
 
 
+def _downsample_indices(series: PriceSeries | PriceBars, points: int, method: str) -> np.ndarray:
+    """Pick about ``points`` rows for the chart, always keeping EPS marker rows."""
+    if method == "minmax":
+        picked = minmax_indices(series.close, points)
+    else:
+        picked = lttb_indices(series.dates, series.close, points)
+    return np.union1d(picked, marker_indices(series.eps_estimate, series.eps_actual))
+
+
+def _gather(values: np.ndarray, positions: np.ndarray, keep: np.ndarray) -> np.ndarray:
+    out = np.full(len(positions), np.nan)
+    out[keep] = np.asarray(values, dtype=np.float64)[positions[keep]]
+    return out
+
+
+def _nullable(values: np.ndarray) -> list[float | None]:
+    return [None if math.isnan(v) else v for v in np.asarray(values, dtype=np.float64).tolist()]
+
+
+def _iso_dates(days: np.ndarray) -> list[str]:
+    return np.datetime_as_string(np.asarray(days).astype("datetime64[D]")).tolist()
+
+
 def _apply_view_overrides(detail: EntityDetail, view_id: str, username: str) -> EntityDetail:
     from app.views.factory import get_views_provider
 
@@ -764,10 +873,13 @@ def _paginate(
     sort_order: str,
     filters: dict[str, str] | None = None,
 ) -> PaginatedResponse:
-    # Apply filters (exact match)
+    # Apply filters (exact match, case-insensitive) in a single pass
     if filters:
-        for field, value in filters.items():
-            data = [r for r in data if str(r.get(field, "")).lower() == value.lower()]
+        wanted = [(field, value.lower()) for field, value in filters.items()]
+        data = [
+            r for r in data
+            if all(str(r.get(field, "")).lower() == value for field, value in wanted)
+        ]
 
     # Sort
     if sort_by and data:
@@ -85,3 +85,19 @@ class EntityDetail(BaseModel):
     widgets: list[WidgetConfig]
     active_view_id: str | None = None
     active_view_name: str | None = None
+
+
+class PriceHistoryColumns(BaseModel):
+    # Omitted when the batch is aligned onto the shared ``dates`` axis
+    dates: list[str] | None = None
+    close: list[float | None]
+    eps_estimate: list[float | None]
+    eps_actual: list[float | None]
+
+
+class PriceHistoryBatch(BaseModel):
+    tickers: list[str]
+    missing: list[str] = Field(default_factory=list)
+    aligned: bool = False
+    dates: list[str] | None = None
+    series: dict[str, PriceHistoryColumns] = Field(default_factory=dict)
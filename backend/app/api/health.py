@@ -2,9 +2,18 @@ from __future__ import annotations
 
 from fastapi import APIRouter
 
+from app.data_access.factory import get_data_provider
+from app.data_access.models import DataProviderStats
+
 router = APIRouter(prefix="/api", tags=["health"])
 
 
 @router.get("/health")
 async def health_check() -> dict:
     return {"status": "healthy", "service": "goldmine"}
+
+
+@router.get("/health/data")
+async def data_stats() -> DataProviderStats:
+    provider = get_data_provider()
+    return provider.get_stats()
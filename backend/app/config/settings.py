@@ -9,11 +9,41 @@ class Settings(BaseSettings):
     DATA_PROVIDER: str = "csv"
     STORAGE_PROVIDER: str = "local"
     DATA_DIR: str = "../data/structured"
+    DATA_CASE_INSENSITIVE_IDS: bool = False
+    DATA_RELOAD_INTERVAL_SECONDS: int = 30
+    PRICE_HISTORY_CACHE_DIR: str = ""
     STORAGE_DIR: str = "../data/unstructured"
     VIEWS_DIR: str = "../data/views"
     DOCUMENTS_DIR: str = "../data/documents"
+    DOCUMENT_SEGMENT_MAX_BYTES: int = 8 * 1024 * 1024
+    DOCUMENT_COMPACTION_INTERVAL_SECONDS: int = 300
+    DOCUMENT_INGEST_BACKGROUND: bool = True
+    DOCUMENT_INGEST_WORKERS: int = 2
+    DOCUMENT_INGEST_BATCH_SIZE: int = 25
+    DOCUMENT_INGEST_QUEUE_SIZE: int = 16
+    DOCUMENT_CHUNK_SIZE: int = 800
+    DOCUMENT_CHUNK_OVERLAP: int = 100
+    DOCUMENT_CHUNK_UNIT: str = "chars"  # or "tokens" (estimated)
+    DOCUMENT_EXTRACTION_CACHE_DIR: str = ""
+    DOCUMENT_EXTRACTION_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    DOCUMENT_PDF_WORKERS: int = 2
+    DOCUMENT_PDF_PAGES_PER_TASK: int = 16
+    DOCUMENT_PDF_PAGE_TIMEOUT_SECONDS: float = 10.0
+    # A sentence-transformers model name; empty uses the built-in hashing embedder
+    DOCUMENT_EMBEDDING_MODEL: str = ""
+    DOCUMENT_EMBEDDING_DIM: int = 512
     SCHEDULES_DIR: str = "../data/schedules"
-    SCHEDULER_INTERVAL_SECONDS: int = 60
+    SCHEDULE_PROVIDER: str = "sqlite"  # or "json"
+    SCHEDULER_INTERVAL_SECONDS: int = 60  # the due queue is rebuilt from the store this often
+    SCHEDULER_POLL_SECONDS: int = 5  # how often the store's earliest due time is checked
+    SCHEDULER_LOCK_BACKEND: str = "file"  # "file" (one host), "sqlite" (shared volume) or "none"
+    SCHEDULER_LEASE_SECONDS: int = 30
+    SCHEDULER_WORKERS: int = 8
+    SCHEDULER_DOMAIN_CONCURRENCY: int = 4  # per recipient domain; 0 = unlimited
+    SCHEDULER_JOB_TIMEOUT_SECONDS: int = 300
+    DELIVERY_LOG_MAX_FILE_BYTES: int = 4 * 1024 * 1024
+    DELIVERY_LOG_MAX_FILE_AGE_HOURS: int = 24 * 7
+    DELIVERY_LOG_RETENTION_DAYS: int = 365  # 0 keeps logs forever
     EMAIL_MAX_ROWS_PER_WIDGET: int = 50
     EMAIL_PROVIDER: str = "console"
     SMTP_HOST: str = ""
@@ -22,10 +52,24 @@ class Settings(BaseSettings):
     SMTP_PASSWORD: str = ""
     SMTP_USE_TLS: bool = True
     SMTP_SENDER: str = ""
+    SMTP_TIMEOUT_SECONDS: int = 60
     ANTHROPIC_API_KEY: str = ""
+    LLM_PROVIDER: str = "anthropic"  # or "fake" (offline, for development and tests)
     LLM_MODEL: str = "claude-sonnet-4-20250514"
     LLM_MAX_CONTEXT_CHUNKS: int = 15
+    LLM_CONTEXT_TOKEN_BUDGET: int = 3000  # estimated tokens of structured data + excerpts
+    LLM_CONTEXT_MMR_LAMBDA: float = 0.7  # 1.0 ranks by relevance only
     LLM_MAX_RESPONSE_TOKENS: int = 1024
+    LLM_BASE_URL: str = ""  # empty uses the Anthropic API
+    LLM_MAX_CONCURRENCY: int = 8
+    LLM_QUEUE_TIMEOUT_SECONDS: float = 30.0
+    LLM_REQUEST_TIMEOUT_SECONDS: float = 120.0
+    LLM_RATE_LIMIT_PER_MINUTE: int = 20  # per user; 0 disables
+    LLM_RETRIEVAL: str = "hybrid"  # or "keyword"
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_TTL_SECONDS: int = 3600
+    LLM_CACHE_MAX_ENTRIES: int = 1024
+    LLM_CACHE_DIR: str = ""  # empty keeps answers in memory only
     LOG_LEVEL: str = "DEBUG"
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRATION_HOURS: int = 8
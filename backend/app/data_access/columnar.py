@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+from typing import Any
+
+import numpy as np
+
+
+class Column:
+    """A dictionary-encoded CSV column.
+
+    Each distinct cell value is stored once in ``categories`` and rows hold an
+    int32 code into it, so repeated values (sector, exchange, ticker) cost four
+    bytes per row. ``folded_codes`` map rows onto the sorted, lowercased
+    distinct values and double as case-insensitive sort keys. Columns whose
+    non-empty cells all parse as numbers also carry a float64 array.
+    """
+
+    def __init__(self, name: str, raw: list[str]):
+        self.name = name
+        categories, codes = np.unique(np.array(raw, dtype=object), return_inverse=True)
+        self.categories: np.ndarray = categories
+        self.codes: np.ndarray = codes.astype(np.int32)
+
+        folded, fold_map = np.unique(
+            np.array([c.lower() for c in categories], dtype=object), return_inverse=True,
+        )
+        self.folded: np.ndarray = folded
+        self.folded_codes: np.ndarray = fold_map.astype(np.int32)[self.codes]
+        self._folded_lookup = {v: i for i, v in enumerate(folded.tolist())}
+
+        parsed = _parse_numeric(categories.tolist())
+        self.numeric: np.ndarray | None = parsed[self.codes] if parsed is not None else None
+        self.dtype = "float" if self.numeric is not None else "str"
+
+        # (row ids grouped by folded code, group boundaries); built lazily
+        self._postings: tuple[np.ndarray, np.ndarray] | None = None
+
+    @property
+    def is_indexed(self) -> bool:
+        return self._postings is not None
+
+    def folded_code(self, value: str) -> int | None:
+        return self._folded_lookup.get(value.lower())
+
+    def build_index(self) -> tuple[np.ndarray, np.ndarray]:
+        """Group row ids by case-folded value (a CSR-style hash index)."""
+        if self._postings is None:
+            order = np.argsort(self.folded_codes, kind="stable").astype(np.int64)
+            bounds = np.searchsorted(
+                self.folded_codes[order], np.arange(len(self.folded) + 1), side="left",
+            )
+            # Concurrent first uses may both build; the results are identical
+            self._postings = (order, bounds)
+        return self._postings
+
+    def postings(self, value: str) -> np.ndarray:
+        """Sorted row ids whose value equals ``value`` case-insensitively."""
+        order, bounds = self.build_index()
+        code = self.folded_code(value)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        return order[bounds[code]:bounds[code + 1]]
+
+    def sort_key(self) -> np.ndarray:
+        return self.numeric if self.numeric is not None else self.folded_codes
+
+
+class ColumnarTable:
+    """Immutable, column-oriented copy of a CSV dataset.
+
+    Query operations take and return int64 arrays of row ids so filters, search
+    and sorting compose without touching rows that are already excluded. Dicts
+    are only built for the rows handed to ``materialize``.
+    """
+
+    def __init__(
+        self,
+        fieldnames: list[str],
+        rows: list[dict[str, Any]],
+        indexed_fields: list[str] | None = None,
+        id_field: str | None = None,
+        case_insensitive_ids: bool = False,
+    ):
+        self.fieldnames = list(fieldnames)
+        self.row_count = len(rows)
+        self.columns: dict[str, Column] = {
+            name: Column(name, [_cell(r.get(name)) for r in rows]) for name in self.fieldnames
+        }
+        for field in indexed_fields or []:
+            if field in self.columns:
+                self.columns[field].build_index()
+
+        # Primary key: id value → first row carrying it (the first column if none is declared)
+        self.id_field = id_field or (self.fieldnames[0] if self.fieldnames else None)
+        self.case_insensitive_ids = case_insensitive_ids
+        self._primary_key: dict[str, int] = self._build_primary_key()
+
+    def _build_primary_key(self) -> dict[str, int]:
+        column = self.columns.get(self.id_field) if self.id_field else None
+        if column is None:
+            return {}
+        if self.case_insensitive_ids:
+            keys, codes = column.folded, column.folded_codes
+        else:
+            keys, codes = column.categories, column.codes
+        _, first_rows = np.unique(codes, return_index=True)
+        return dict(zip(keys.tolist(), first_rows.tolist()))
+
+    def lookup_ids(self, record_ids: list[str]) -> np.ndarray:
+        """Row ids for the given primary-key values, in order, skipping unknown ids."""
+        if self.case_insensitive_ids:
+            record_ids = [r.lower() for r in record_ids]
+        pk = self._primary_key
+        return np.array([pk[r] for r in record_ids if r in pk], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.row_count
+
+    def all_ids(self) -> np.ndarray:
+        return np.arange(self.row_count, dtype=np.int64)
+
+    def match_all(self, filters: dict[str, str]) -> np.ndarray:
+        """Row ids matching every equality filter (case-insensitive).
+
+        Each filter resolves to a posting list from the column's index and the
+        lists are intersected smallest-first, so the cost is proportional to the
+        number of matches rather than the number of rows.
+        """
+        postings: list[np.ndarray] = []
+        for field, value in filters.items():
+            column = self.columns.get(field)
+            if column is None:
+                # Missing columns behave like empty strings
+                if value == "":
+                    continue
+                return np.empty(0, dtype=np.int64)
+            postings.append(column.postings(value))
+        if not postings:
+            return self.all_ids()
+        postings.sort(key=len)
+        ids = postings[0]
+        for other in postings[1:]:
+            if not len(ids):
+                break
+            ids = np.intersect1d(ids, other, assume_unique=True)
+        return ids
+
+    def search(self, ids: np.ndarray, term: str) -> np.ndarray:
+        """Return the subset of ``ids`` where any column contains ``term`` (case-insensitive)."""
+        if not len(ids):
+            return ids
+        term = term.lower()
+        hits = np.zeros(len(ids), dtype=bool)
+        for column in self.columns.values():
+            # Substring test once per distinct value, then broadcast to rows
+            matched = np.fromiter(
+                (term in v for v in column.folded), dtype=bool, count=len(column.folded),
+            )
+            if matched.any():
+                hits |= matched[column.folded_codes[ids]]
+        return ids[hits]
+
+    def sort(self, ids: np.ndarray, field: str, descending: bool = False) -> np.ndarray:
+        column = self.columns.get(field)
+        if column is None or len(ids) < 2:
+            return ids
+        keys = column.sort_key()[ids]
+        if descending:
+            keys = -keys
+        # Stable, so ties keep file order; NaN (empty numeric cells) sorts last
+        return ids[np.argsort(keys, kind="stable")]
+
+    def materialize(self, ids: np.ndarray) -> list[dict[str, Any]]:
+        cols = [
+            (name, self.columns[name].categories[self.columns[name].codes[ids]].tolist())
+            for name in self.fieldnames
+        ]
+        return [{name: values[i] for name, values in cols} for i in range(len(ids))]
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else str(value)
+
+
+def _parse_numeric(values: list[str]) -> np.ndarray | None:
+    """Parse distinct values as float64 if every non-empty one is numeric."""
+    out = np.empty(len(values), dtype=np.float64)
+    seen_value = False
+    for i, v in enumerate(values):
+        if v == "":
+            out[i] = np.nan
+            continue
+        try:
+            out[i] = float(v)
+        except ValueError:
+            return None
+        seen_value = True
+    return out if seen_value else None
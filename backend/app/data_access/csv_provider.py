@@ -2,12 +2,23 @@ from __future__ import annotations
 
 import csv
 import math
+import os
+import threading
+import time
+from datetime import datetime, timezone
 from pathlib import Path
 from typing import Any
 
 from app.config.settings import settings
+from app.data_access.columnar import ColumnarTable
 from app.data_access.interfaces import DataAccessProvider
-from app.data_access.models import DatasetInfo, FilterParams, PaginatedResponse
+from app.data_access.models import (
+    DataProviderStats,
+    DatasetInfo,
+    DatasetLoadStats,
+    FilterParams,
+    PaginatedResponse,
+)
 from app.exceptions import DataAccessError, NotFoundError
 from app.logging_config import get_logger
 
@@ -16,12 +27,22 @@ logger = get_logger(__name__)
 # Dataset name → ID field mapping (loaded from datasets.csv)
 _ID_FIELDS: dict[str, str] = {}
 
+# Dataset name → columns indexed eagerly at load (loaded from datasets.csv)
+_INDEXED_FIELDS: dict[str, list[str]] = {}
+
+_META_KEY = "datasets"
+
 
 class CsvDataAccessProvider(DataAccessProvider):
     def __init__(self, data_dir: str | None = None):
         self._data_dir = Path(data_dir or settings.DATA_DIR).resolve()
-        self._cache: dict[str, list[dict[str, Any]]] = {}
+        self._cache: dict[str, ColumnarTable] = {}
         self._datasets_meta: list[DatasetInfo] = []
+        # (mtime_ns, size) of each file as of its last load, keyed by dataset name
+        self._file_state: dict[str, tuple[int, int]] = {}
+        self._stats: dict[str, DatasetLoadStats] = {}
+        self._generation = 0
+        self._load_lock = threading.Lock()
         self._load_datasets_meta()
 
     def _load_datasets_meta(self) -> None:
@@ -29,11 +50,19 @@ class CsvDataAccessProvider(DataAccessProvider):
         if not datasets_path.exists():
             logger.warning("datasets_csv_missing", path=str(datasets_path))
             return
+        state = _file_state(datasets_path)
         rows = self._read_csv(datasets_path)
+        meta: list[DatasetInfo] = []
         for row in rows:
             info = DatasetInfo(**row)
-            self._datasets_meta.append(info)
+            meta.append(info)
             _ID_FIELDS[info.name] = info.id_field
+            _INDEXED_FIELDS[info.name] = [
+                f.strip() for f in info.indexed_fields.split(";") if f.strip()
+            ]
+        self._datasets_meta = meta
+        if state is not None:
+            self._file_state[_META_KEY] = state
 
     def _read_csv(self, path: Path) -> list[dict[str, Any]]:
         try:
@@ -43,53 +72,133 @@ class CsvDataAccessProvider(DataAccessProvider):
         except Exception as e:
             raise DataAccessError(f"Failed to read {path}: {e}")
 
-    def _get_data(self, dataset: str) -> list[dict[str, Any]]:
-        if dataset in self._cache:
-            return self._cache[dataset]
+    def _get_data(self, dataset: str) -> ColumnarTable:
+        table = self._cache.get(dataset)
+        if table is not None:
+            return table
         path = self._data_dir / f"{dataset}.csv"
         if not path.exists():
             raise NotFoundError(f"Dataset '{dataset}' not found")
-        data = self._read_csv(path)
-        self._cache[dataset] = data
-        logger.info("csv_loaded", dataset=dataset, rows=len(data))
-        return data
+        with self._load_lock:
+            # Another request may have loaded it while we waited
+            table = self._cache.get(dataset)
+            if table is None:
+                table = self._load_dataset(dataset, path)
+        return table
+
+    def _load_dataset(self, dataset: str, path: Path) -> ColumnarTable:
+        """Build a dataset's table and indexes, then publish it in one assignment.
+
+        Readers hold a reference to whichever table they fetched, so a reload
+        never exposes a partially built table.
+        """
+        # Stat before reading: a write racing with the read is picked up next poll
+        state = _file_state(path)
+        started = time.perf_counter()
+        table = self._load_table(path, _INDEXED_FIELDS.get(dataset), _ID_FIELDS.get(dataset))
+        duration_ms = (time.perf_counter() - started) * 1000
+
+        self._cache[dataset] = table
+        self._generation += 1
+        previous = self._stats.get(dataset)
+        if state is not None:
+            self._file_state[dataset] = state
+        self._stats[dataset] = DatasetLoadStats(
+            dataset=dataset,
+            rows=len(table),
+            generation=previous.generation + 1 if previous else 1,
+            loaded_at=datetime.now(timezone.utc).isoformat(),
+            load_duration_ms=round(duration_ms, 3),
+            file_size=state[1] if state else 0,
+            file_mtime=datetime.fromtimestamp(state[0] / 1e9, timezone.utc).isoformat() if state else "",
+        )
+        logger.info("csv_loaded", dataset=dataset, rows=len(table), duration_ms=round(duration_ms, 1))
+        return table
+
+    def _load_table(
+        self,
+        path: Path,
+        indexed_fields: list[str] | None = None,
+        id_field: str | None = None,
+    ) -> ColumnarTable:
+        try:
+            with open(path, newline="") as f:
+                reader = csv.DictReader(f)
+                rows = list(reader)
+                fieldnames = list(reader.fieldnames or [])
+        except Exception as e:
+            raise DataAccessError(f"Failed to read {path}: {e}")
+        return ColumnarTable(
+            fieldnames,
+            rows,
+            indexed_fields=indexed_fields,
+            id_field=id_field,
+            case_insensitive_ids=settings.DATA_CASE_INSENSITIVE_IDS,
+        )
+
+    def reload_changed(self) -> list[str]:
+        reloaded: list[str] = []
+        with self._load_lock:
+            meta_path = self._data_dir / "datasets.csv"
+            meta_state = _file_state(meta_path)
+            if meta_state is not None and meta_state != self._file_state.get(_META_KEY):
+                self._load_datasets_meta()
+                reloaded.append(_META_KEY)
+
+            for dataset in list(self._cache):
+                path = self._data_dir / f"{dataset}.csv"
+                state = _file_state(path)
+                if state is None:
+                    logger.warning("csv_removed", dataset=dataset, path=str(path))
+                    self._cache.pop(dataset, None)
+                    self._file_state.pop(dataset, None)
+                    continue
+                if state == self._file_state.get(dataset):
+                    continue
+                try:
+                    self._load_dataset(dataset, path)
+                except DataAccessError as e:
+                    # Keep serving the previous generation until the file is readable
+                    logger.error("csv_reload_failed", dataset=dataset, error=e.message)
+                    continue
+                reloaded.append(dataset)
+
+        if reloaded:
+            logger.info("csv_reloaded", datasets=reloaded, generation=self._generation)
+        return reloaded
+
+    def get_stats(self) -> DataProviderStats:
+        return DataProviderStats(
+            generation=self._generation,
+            datasets=sorted(self._stats.values(), key=lambda s: s.dataset),
+        )
 
     def list_datasets(self) -> list[DatasetInfo]:
         return self._datasets_meta
 
     def query(self, dataset: str, params: FilterParams) -> PaginatedResponse:
-        data = self._get_data(dataset)
+        table = self._get_data(dataset)
 
-        # Apply filters
-        filtered = data
-        for field, value in params.filters.items():
-            filtered = [r for r in filtered if str(r.get(field, "")).lower() == value.lower()]
+        # Apply filters (index lookups; columns not declared in datasets.csv are indexed on first use)
+        ids = table.match_all(params.filters)
 
         # Apply search (searches across all string fields)
         if params.search:
-            search_lower = params.search.lower()
-            filtered = [
-                r for r in filtered
-                if any(search_lower in str(v).lower() for v in r.values())
-            ]
+            ids = table.search(ids, params.search)
 
         # Sort
-        if params.sort_by and filtered:
-            reverse = params.sort_order == "desc"
-            try:
-                filtered.sort(key=lambda r: _sort_key(r.get(params.sort_by, "")), reverse=reverse)
-            except Exception:
-                pass  # Skip sort if field types are inconsistent
+        if params.sort_by:
+            ids = table.sort(ids, params.sort_by, descending=params.sort_order == "desc")
 
         # Enforce max page size
         page_size = min(params.page_size, settings.MAX_PAGE_SIZE)
-        total = len(filtered)
+        total = len(ids)
         total_pages = max(1, math.ceil(total / page_size))
         page = min(params.page, total_pages)
 
         start = (page - 1) * page_size
         end = start + page_size
-        page_data = filtered[start:end]
+        page_data = table.materialize(ids[start:end])
 
         return PaginatedResponse(
             data=page_data,
@@ -102,23 +211,17 @@ class CsvDataAccessProvider(DataAccessProvider):
         )
 
     def get_record(self, dataset: str, record_id: str) -> dict[str, Any] | None:
-        data = self._get_data(dataset)
-        id_field = _ID_FIELDS.get(dataset)
-        if not id_field:
-            # Fallback: try first column
-            if data:
-                id_field = list(data[0].keys())[0]
-            else:
-                return None
-        for row in data:
-            if str(row.get(id_field, "")) == record_id:
-                return row
-        return None
+        records = self.get_records(dataset, [record_id])
+        return records[0] if records else None
 
+    def get_records(self, dataset: str, record_ids: list[str]) -> list[dict[str, Any]]:
+        table = self._get_data(dataset)
+        return table.materialize(table.lookup_ids(record_ids))
 
-def _sort_key(value: Any) -> Any:
-    """Try to sort numerically, fall back to string."""
+
+def _file_state(path: Path) -> tuple[int, int] | None:
     try:
-        return float(value)
-    except (ValueError, TypeError):
-        return str(value).lower()
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import numpy as np
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of ``threshold`` representative points.
+
+    The first and last points are always kept. Every other bucket keeps the
+    point forming the largest triangle with the previously kept point and the
+    average of the next bucket, which preserves peaks and troughs far better
+    than striding. Each bucket is evaluated with array operations; only the
+    walk across buckets is sequential.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 3:
+        return np.arange(n, dtype=np.int64)
+
+    xf = np.asarray(x, dtype=np.float64)
+    yf = np.asarray(y, dtype=np.float64)
+
+    # Bucket boundaries over the interior points [1, n - 1)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    starts, ends = edges[:-1], edges[1:]
+    sums_x = np.add.reduceat(xf[1:n - 1], starts - 1)
+    sums_y = np.add.reduceat(np.nan_to_num(yf[1:n - 1]), starts - 1)
+    sizes = np.maximum(ends - starts, 1)
+    avg_x = np.append(sums_x / sizes, xf[-1])[1:]
+    avg_y = np.append(sums_y / sizes, yf[-1])[1:]
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i, (lo, hi) in enumerate(zip(starts.tolist(), ends.tolist())):
+        if hi <= lo:
+            hi = lo + 1
+        bx, by = xf[lo:hi], yf[lo:hi]
+        area = np.abs((xf[a] - avg_x[i]) * (by - yf[a]) - (xf[a] - bx) * (avg_y[i] - yf[a]))
+        area[np.isnan(area)] = -1.0
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return np.unique(selected)
+
+
+def minmax_indices(y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the minimum and maximum of each of ``threshold // 2`` equal buckets.
+
+    Fully vectorized: one lexsort by (bucket, value) puts each bucket's min
+    first and max last. The first and last points are always kept.
+    """
+    n = len(y)
+    if threshold >= n or threshold < 4:
+        return np.arange(n, dtype=np.int64)
+
+    buckets = threshold // 2
+    bucket_of = (np.arange(n, dtype=np.int64) * buckets) // n
+    # NaN sorts last within a bucket; treat it as missing, not as the max
+    values = np.asarray(y, dtype=np.float64)
+    order = np.lexsort((values, bucket_of))
+    sorted_buckets = bucket_of[order]
+    firsts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+    valid_counts = np.bincount(bucket_of[~np.isnan(values)], minlength=buckets)
+    lasts = firsts + np.maximum(valid_counts[sorted_buckets[firsts]], 1) - 1
+    picked = np.concatenate(([0, n - 1], order[firsts], order[lasts]))
+    return np.unique(picked)
+
+
+def marker_indices(*columns: np.ndarray) -> np.ndarray:
+    """Indices where any of ``columns`` has a value (used to keep EPS points)."""
+    if not columns:
+        return np.empty(0, dtype=np.int64)
+    present = np.zeros(len(columns[0]), dtype=bool)
+    for col in columns:
+        present |= ~np.isnan(np.asarray(col, dtype=np.float64))
+    return np.flatnonzero(present)
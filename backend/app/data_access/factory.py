@@ -1,10 +1,14 @@
 from __future__ import annotations
 
+from pathlib import Path
+
 from app.config.settings import settings
 from app.data_access.interfaces import DataAccessProvider
 from app.data_access.csv_provider import CsvDataAccessProvider
+from app.data_access.price_history import PriceHistoryStore
 
 _provider: DataAccessProvider | None = None
+_price_history_store: PriceHistoryStore | None = None
 
 
 def get_data_provider() -> DataAccessProvider:
@@ -18,3 +22,14 @@ def get_data_provider() -> DataAccessProvider:
         raise ValueError(f"Unknown data provider: {settings.DATA_PROVIDER}")
 
     return _provider
+
+
+def get_price_history_store() -> PriceHistoryStore:
+    global _price_history_store
+    if _price_history_store is not None:
+        return _price_history_store
+
+    data_dir = Path(settings.DATA_DIR).resolve()
+    cache_dir = Path(settings.PRICE_HISTORY_CACHE_DIR) if settings.PRICE_HISTORY_CACHE_DIR else None
+    _price_history_store = PriceHistoryStore(data_dir / "stock_history.csv", cache_dir)
+    return _price_history_store
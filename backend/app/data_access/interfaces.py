@@ -3,7 +3,7 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 from typing import Any
 
-from app.data_access.models import DatasetInfo, FilterParams, PaginatedResponse
+from app.data_access.models import DataProviderStats, DatasetInfo, FilterParams, PaginatedResponse
 
 
 class DataAccessProvider(ABC):
@@ -18,3 +18,15 @@ class DataAccessProvider(ABC):
     @abstractmethod
     def get_record(self, dataset: str, record_id: str) -> dict[str, Any] | None:
         """Get a single record by ID from a dataset."""
+
+    @abstractmethod
+    def get_records(self, dataset: str, record_ids: list[str]) -> list[dict[str, Any]]:
+        """Get records by ID, in the order given. Unknown IDs are skipped."""
+
+    @abstractmethod
+    def reload_changed(self) -> list[str]:
+        """Reload datasets whose backing data changed. Returns the reloaded names."""
+
+    @abstractmethod
+    def get_stats(self) -> DataProviderStats:
+        """Return load/reload statistics for the loaded datasets."""
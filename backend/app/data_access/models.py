@@ -32,3 +32,19 @@ class DatasetInfo(BaseModel):
     record_count: int
     id_field: str
     category: str
+    indexed_fields: str = ""
+
+
+class DatasetLoadStats(BaseModel):
+    dataset: str
+    rows: int
+    generation: int
+    loaded_at: str
+    load_duration_ms: float
+    file_size: int = 0
+    file_mtime: str = ""
+
+
+class DataProviderStats(BaseModel):
+    generation: int
+    datasets: list[DatasetLoadStats] = Field(default_factory=list)
@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import csv
+import json
+import os
+import shutil
+import threading
+import uuid
+from datetime import date
+from pathlib import Path
+from typing import Any, NamedTuple
+
+import numpy as np
+
+from app.exceptions import DataAccessError
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Bump when the on-disk layout changes so stale caches are rebuilt
+FORMAT_VERSION = 1
+
+_ARRAYS = ("dates", "close", "eps_estimate", "eps_actual")
+
+_EPOCH = date(1970, 1, 1)
+
+
+class PriceSeries(NamedTuple):
+    """One ticker's history as parallel arrays (views into the shared store).
+
+    ``dates`` are int32 days since 1970-01-01; EPS arrays hold NaN where the
+    CSV cell was empty.
+    """
+
+    ticker: str
+    dates: np.ndarray
+    close: np.ndarray
+    eps_estimate: np.ndarray
+    eps_actual: np.ndarray
+
+    @property
+    def size(self) -> int:
+        return int(self.dates.shape[0])
+
+    def take(self, index: slice | np.ndarray) -> PriceSeries:
+        return PriceSeries(
+            self.ticker,
+            self.dates[index],
+            self.close[index],
+            self.eps_estimate[index],
+            self.eps_actual[index],
+        )
+
+    def between(self, start_day: int | None = None, end_day: int | None = None) -> PriceSeries:
+        """Restrict to ``start_day <= date <= end_day`` by binary search on the sorted dates."""
+        lo = int(np.searchsorted(self.dates, start_day, side="left")) if start_day is not None else 0
+        hi = int(np.searchsorted(self.dates, end_day, side="right")) if end_day is not None else self.size
+        return self.take(slice(lo, max(lo, hi)))
+
+    def to_records(self) -> list[dict[str, Any]]:
+        """Materialize rows in the price-history widget's shape."""
+        dates = np.datetime_as_string(np.asarray(self.dates).astype("datetime64[D]")).tolist()
+        close = np.asarray(self.close).tolist()
+        est = np.asarray(self.eps_estimate)
+        act = np.asarray(self.eps_actual)
+        has_est = ~np.isnan(est)
+        has_act = ~np.isnan(act)
+        rows: list[dict[str, Any]] = []
+        for i, (d, c) in enumerate(zip(dates, close)):
+            row: dict[str, Any] = {"date": d, "close": c}
+            if has_est[i]:
+                row["eps_estimate"] = float(est[i])
+            if has_act[i]:
+                row["eps_actual"] = float(act[i])
+            rows.append(row)
+        return rows
+
+
+class PriceBars(NamedTuple):
+    """OHLC bars aggregated from a ``PriceSeries`` (see ``resample``).
+
+    Each bar is dated by the last trading day in its period and carries the
+    latest EPS estimate/actual reported within it (NaN when none was).
+    """
+
+    ticker: str
+    dates: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    eps_estimate: np.ndarray
+    eps_actual: np.ndarray
+
+    @property
+    def size(self) -> int:
+        return int(self.dates.shape[0])
+
+    def take(self, index: slice | np.ndarray) -> PriceBars:
+        return PriceBars(self.ticker, *(getattr(self, name)[index] for name in self._fields[1:]))
+
+    def to_records(self) -> list[dict[str, Any]]:
+        rows = PriceSeries(
+            self.ticker, self.dates, self.close, self.eps_estimate, self.eps_actual,
+        ).to_records()
+        for row, o, h, l in zip(rows, self.open.tolist(), self.high.tolist(), self.low.tolist()):
+            row.update(open=o, high=h, low=l)
+        return rows
+
+
+INTERVALS = ("daily", "weekly", "monthly", "quarterly")
+
+
+def resample(series: PriceSeries, interval: str) -> PriceSeries | PriceBars:
+    """Aggregate a daily series into weekly, monthly or quarterly OHLC bars.
+
+    Dates are sorted, so periods are contiguous runs and every aggregate is a
+    single ``reduceat`` over the run boundaries.
+    """
+    if interval == "daily":
+        return series
+    if interval not in INTERVALS:
+        raise ValueError(f"Unknown interval '{interval}'")
+
+    days = np.asarray(series.dates, dtype=np.int64)
+    if interval == "weekly":
+        # 1970-01-01 was a Thursday; shift so weeks start on Monday
+        period = (days + 3) // 7
+    else:
+        period = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+        if interval == "quarterly":
+            period //= 3
+
+    if not len(days):
+        empty = np.empty(0, dtype=np.float64)
+        return PriceBars(series.ticker, series.dates[:0], empty, empty, empty, empty, empty, empty)
+
+    starts = np.flatnonzero(np.r_[True, period[1:] != period[:-1]])
+    ends = np.r_[starts[1:], len(days)] - 1
+    close = np.asarray(series.close, dtype=np.float64)
+    return PriceBars(
+        series.ticker,
+        np.asarray(series.dates)[ends],
+        close[starts],
+        np.fmax.reduceat(close, starts),
+        np.fmin.reduceat(close, starts),
+        close[ends],
+        _last_valid(series.eps_estimate, starts, ends),
+        _last_valid(series.eps_actual, starts, ends),
+    )
+
+
+def _last_valid(values: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Last non-NaN value within each [start, end] run, NaN if there is none."""
+    values = np.asarray(values, dtype=np.float64)
+    positions = np.where(np.isnan(values), -1, np.arange(len(values)))
+    latest = np.maximum.accumulate(positions)[ends]
+    out = np.full(len(ends), np.nan)
+    found = latest >= starts
+    out[found] = values[latest[found]]
+    return out
+
+
+class PriceHistoryStore:
+    """Memory-mapped, per-ticker contiguous copy of ``stock_history.csv``.
+
+    The CSV is converted once into ``<cache_dir>/v<version>-<mtime>-<size>/``:
+    one ``.npy`` file per column, sorted by (ticker, date), plus a
+    ``directory.json`` mapping each ticker to its (offset, length). Arrays are
+    opened with ``mmap_mode="r"`` so every worker process shares the same page
+    cache, and a ticker's series is a zero-copy slice. A rewritten CSV gets a
+    new cache directory on the next access.
+    """
+
+    def __init__(self, csv_path: Path, cache_dir: Path | None = None):
+        self._csv_path = Path(csv_path).resolve()
+        self._cache_dir = Path(cache_dir).resolve() if cache_dir else self._csv_path.parent / ".price_history"
+        self._lock = threading.Lock()
+        self._state: tuple[int, int] | None = None
+        self._arrays: dict[str, np.ndarray] = {}
+        self._directory: dict[str, tuple[int, int]] = {}
+
+    def tickers(self) -> list[str]:
+        self._ensure_current()
+        return sorted(self._directory)
+
+    def get_series(self, ticker: str) -> PriceSeries | None:
+        self._ensure_current()
+        # Read both under one reference so a concurrent swap can't mix generations
+        arrays, directory = self._arrays, self._directory
+        entry = directory.get(ticker)
+        if entry is None:
+            return None
+        offset, length = entry
+        window = slice(offset, offset + length)
+        return PriceSeries(ticker, *(arrays[name][window] for name in _ARRAYS))
+
+    def _ensure_current(self) -> None:
+        state = _file_state(self._csv_path)
+        if state == self._state:
+            return
+        with self._lock:
+            if state == self._state:
+                return
+            if state is None:
+                self._arrays, self._directory = {}, {}
+                self._state = None
+                return
+            target = self._cache_dir / f"v{FORMAT_VERSION}-{state[0]}-{state[1]}"
+            if not (target / "directory.json").exists():
+                self._convert(target)
+            arrays, directory = _open(target)
+            self._arrays, self._directory = arrays, directory
+            self._state = state
+            logger.info("price_history_opened", path=str(target), tickers=len(directory))
+            self._remove_stale(target)
+
+    def _convert(self, target: Path) -> None:
+        """Convert the CSV into the binary layout, publishing it with an atomic rename."""
+        tickers: list[str] = []
+        dates: list[str] = []
+        close: list[float] = []
+        est: list[float] = []
+        act: list[float] = []
+        try:
+            with open(self._csv_path, newline="") as f:
+                for row in csv.DictReader(f):
+                    tickers.append(row["ticker"])
+                    dates.append(row["date"])
+                    close.append(_to_float(row.get("close")))
+                    est.append(_to_float(row.get("eps_estimate")))
+                    act.append(_to_float(row.get("eps_actual")))
+        except (OSError, KeyError, csv.Error) as e:
+            raise DataAccessError(f"Failed to read {self._csv_path}: {e}")
+
+        day_numbers = np.array(dates, dtype="datetime64[D]").astype(np.int32)
+        names, ticker_codes = np.unique(np.array(tickers, dtype=object), return_inverse=True)
+        order = np.lexsort((day_numbers, ticker_codes))
+        counts = np.bincount(ticker_codes, minlength=len(names))
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+        columns = {
+            "dates": day_numbers[order],
+            "close": np.array(close, dtype=np.float64)[order],
+            "eps_estimate": np.array(est, dtype=np.float64)[order],
+            "eps_actual": np.array(act, dtype=np.float64)[order],
+        }
+        directory = {
+            name: [int(off), int(cnt)] for name, off, cnt in zip(names.tolist(), offsets, counts)
+        }
+
+        self._cache_dir.mkdir(parents=True, exist_ok=True)
+        staging = self._cache_dir / f".tmp-{uuid.uuid4().hex}"
+        staging.mkdir()
+        try:
+            for name, values in columns.items():
+                np.save(staging / f"{name}.npy", values)
+            with open(staging / "directory.json", "w") as f:
+                json.dump({"rows": len(order), "tickers": directory}, f)
+            os.rename(staging, target)
+        except OSError:
+            # Another worker published the same version first; use theirs
+            shutil.rmtree(staging, ignore_errors=True)
+            if not (target / "directory.json").exists():
+                raise
+        logger.info("price_history_converted", rows=len(order), tickers=len(directory))
+
+    def _remove_stale(self, current: Path) -> None:
+        # Safe while other processes still map them: unlinked files live on until unmapped
+        for path in self._cache_dir.glob("v*-*"):
+            if path != current and path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def day_number(value: date) -> int:
+    """Days since 1970-01-01, the store's date encoding."""
+    return (value - _EPOCH).days
+
+
+def _open(target: Path) -> tuple[dict[str, np.ndarray], dict[str, tuple[int, int]]]:
+    with open(target / "directory.json") as f:
+        meta = json.load(f)
+    arrays = {name: np.load(target / f"{name}.npy", mmap_mode="r") for name in _ARRAYS}
+    directory = {t: (entry[0], entry[1]) for t, entry in meta["tickers"].items()}
+    return arrays, directory
+
+
+def _to_float(value: str | None) -> float:
+    if not value:
+        return float("nan")
+    try:
+        return float(value)
+    except ValueError:
+        return float("nan")
+
+
+def _file_state(path: Path) -> tuple[int, int] | None:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import asyncio
+
+from fastapi import FastAPI
+
+from app.config.settings import settings
+from app.data_access.factory import get_data_provider
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def start_data_reloader(app: FastAPI) -> None:
+    """Register a background task that hot-reloads changed dataset files."""
+    if settings.DATA_RELOAD_INTERVAL_SECONDS <= 0:
+        return
+
+    @app.on_event("startup")
+    async def _launch_reloader() -> None:
+        asyncio.create_task(_reloader_loop())
+        logger.info("data_reloader_started", interval=settings.DATA_RELOAD_INTERVAL_SECONDS)
+
+    async def _reloader_loop() -> None:
+        while True:
+            await asyncio.sleep(settings.DATA_RELOAD_INTERVAL_SECONDS)
+            try:
+                # Rebuilds run off the event loop; requests keep using the old tables meanwhile
+                await asyncio.to_thread(get_data_provider().reload_changed)
+            except Exception:
+                logger.exception("data_reloader_error")
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import asyncio
+
+from fastapi import FastAPI
+
+from app.config.settings import settings
+from app.documents.factory import get_document_provider
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def start_document_compactor(app: FastAPI) -> None:
+    """Register a background task that compacts the document index segments."""
+    if settings.DOCUMENT_COMPACTION_INTERVAL_SECONDS <= 0:
+        return
+
+    @app.on_event("startup")
+    async def _launch_compactor() -> None:
+        asyncio.create_task(_compactor_loop())
+        logger.info("document_compactor_started", interval=settings.DOCUMENT_COMPACTION_INTERVAL_SECONDS)
+
+    async def _compactor_loop() -> None:
+        while True:
+            await asyncio.sleep(settings.DOCUMENT_COMPACTION_INTERVAL_SECONDS)
+            try:
+                # Uploads keep appending to the active segment while this runs
+                await asyncio.to_thread(get_document_provider().compact)
+            except Exception:
+                logger.exception("document_compactor_error")
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import math
+import zlib
+from abc import ABC, abstractmethod
+from collections import Counter
+
+import numpy as np
+
+from app.config.settings import settings
+from app.documents.inverted_index import tokenize
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Subword features make "revenues"/"revenue" or "margin"/"margins" overlap
+_NGRAM = 3
+_NGRAM_WEIGHT = 0.5
+
+
+class Embedder(ABC):
+    """Maps texts to L2-normalized float32 vectors of a fixed dimension."""
+
+    dim: int
+
+    @abstractmethod
+    def embed(self, texts: list[str]) -> np.ndarray:
+        """Return a ``(len(texts), dim)`` float32 matrix of unit-length rows."""
+
+
+class HashingEmbedder(Embedder):
+    """Feature-hashed term frequencies; no model, vocabulary or download.
+
+    Words and their character trigrams are hashed into ``dim`` buckets with a
+    random sign, weighted by sublinear term frequency. The result is
+    stateless and deterministic across processes, so vectors can be computed
+    anywhere and compared with cosine similarity.
+    """
+
+    def __init__(self, dim: int = 512) -> None:
+        self.dim = dim
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features: Counter[str] = Counter()
+            for token in tokenize(text):
+                features[token] += 1
+                padded = f"<{token}>"
+                features.update("#" + padded[i:i + _NGRAM] for i in range(len(padded) - _NGRAM + 1))
+            vec = out[row]
+            for feature, count in features.items():
+                h = zlib.crc32(feature.encode("utf-8"))
+                weight = (1.0 + math.log(count)) * (_NGRAM_WEIGHT if feature[0] == "#" else 1.0)
+                vec[h % self.dim] += weight if h & 0x80000000 else -weight
+        return _normalize(out)
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """A local sentence-transformers model, run on CPU."""
+
+    def __init__(self, model_name: str) -> None:
+        from sentence_transformers import SentenceTransformer
+
+        self._model = SentenceTransformer(model_name, device="cpu")
+        self.dim = int(self._model.get_sentence_embedding_dimension())
+        logger.info("sentence_transformer_embedder_init", model=model_name, dim=self.dim)
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = self._model.encode(
+            list(texts), batch_size=32, convert_to_numpy=True, normalize_embeddings=True,
+        )
+        return np.asarray(vectors, dtype=np.float32).reshape(len(texts), self.dim)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix /= norms
+    return matrix
+
+
+_embedder: Embedder | None = None
+
+
+def get_embedder() -> Embedder:
+    global _embedder
+    if _embedder is not None:
+        return _embedder
+
+    model = settings.DOCUMENT_EMBEDDING_MODEL
+    if model:
+        try:
+            _embedder = SentenceTransformerEmbedder(model)
+            return _embedder
+        except ImportError:
+            logger.warning("sentence_transformers_unavailable", model=model)
+    _embedder = HashingEmbedder(settings.DOCUMENT_EMBEDDING_DIM)
+    return _embedder
@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator
+
+from app.config.settings import settings
+from app.documents.extractor import EXTRACTOR_VERSION, chunk_text, iter_chunks, iter_text
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+Chunk = tuple[str, int, int]
+
+
+class ExtractionCache:
+    """Content-addressed, size-bounded disk cache of extracted text and chunks.
+
+    Extracted text is keyed by the SHA-256 of the file bytes plus the
+    extractor version; chunk lists are keyed by that text key plus the chunk
+    parameters. Re-indexing identical bytes skips extraction entirely, and
+    changing the chunk size only redoes chunking. Least recently used entries
+    are evicted once the cache exceeds ``max_bytes``. Entries are written via
+    atomic rename, so several worker processes can share one directory.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self._dir = Path(cache_dir)
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # file name → size, least recently used first
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        files = [p for p in self._dir.iterdir() if p.suffix in (".txt", ".json")]
+        for path in sorted(files, key=lambda p: p.stat().st_mtime_ns):
+            size = path.stat().st_size
+            self._entries[path.name] = size
+            self._total += size
+
+    def get_text(self, text_key: str) -> str | None:
+        data = self._read(f"{text_key}.txt")
+        return data.decode("utf-8") if data is not None else None
+
+    def put_text(self, text_key: str, text: str) -> None:
+        self._write(f"{text_key}.txt", text.encode("utf-8"))
+
+    def get_chunks(
+        self, text_key: str, chunk_size: int, overlap: int, unit: str = "chars",
+    ) -> list[Chunk] | None:
+        data = self._read(_chunks_name(text_key, chunk_size, overlap, unit))
+        if data is None:
+            return None
+        return [(t, s, e) for t, s, e in json.loads(data)]
+
+    def put_chunks(
+        self, text_key: str, chunk_size: int, overlap: int, chunks: list[Chunk], unit: str = "chars",
+    ) -> None:
+        self._write(
+            _chunks_name(text_key, chunk_size, overlap, unit), json.dumps(chunks).encode("utf-8"),
+        )
+
+    def _read(self, name: str) -> bytes | None:
+        path = self._dir / name
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            # Possibly evicted by another process
+            with self._lock:
+                self._forget(name)
+                self.misses += 1
+            return None
+        with self._lock:
+            if name in self._entries:
+                self._entries.move_to_end(name)
+            else:
+                self._entries[name] = len(data)
+                self._total += len(data)
+            self.hits += 1
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _write(self, name: str, data: bytes) -> None:
+        if len(data) > self._max_bytes:
+            return
+        tmp = self._dir / f".{name}.{uuid.uuid4().hex}.tmp"
+        tmp.write_bytes(data)
+        os.replace(tmp, self._dir / name)
+        with self._lock:
+            self._forget(name)
+            self._entries[name] = len(data)
+            self._total += len(data)
+            evicted = self._evict()
+        if evicted:
+            logger.info("extraction_cache_evicted", entries=evicted, total_bytes=self._total)
+
+    def _forget(self, name: str) -> None:
+        size = self._entries.pop(name, None)
+        if size is not None:
+            self._total -= size
+
+    def _evict(self) -> int:
+        evicted = 0
+        while self._total > self._max_bytes and self._entries:
+            name, size = self._entries.popitem(last=False)
+            self._total -= size
+            try:
+                os.remove(self._dir / name)
+            except FileNotFoundError:
+                pass
+            evicted += 1
+        return evicted
+
+
+def text_key(file_bytes: bytes) -> str:
+    digest = hashlib.sha256(file_bytes).hexdigest()
+    return f"{digest}-v{EXTRACTOR_VERSION}"
+
+
+def _chunks_name(text_key: str, chunk_size: int, overlap: int, unit: str) -> str:
+    suffix = "" if unit == "chars" else f"-{unit}"
+    return f"{text_key}-c{chunk_size}-o{overlap}{suffix}.json"
+
+
+def extract_chunks(file_bytes: bytes, mime_type: str, filename: str) -> list[Chunk]:
+    """Extract and chunk a file, reusing cached text and chunks for identical bytes.
+
+    Incomplete extractions (a page failed or overran its budget) are not
+    cached, so the next indexing of the same bytes tries again.
+    """
+    cache = get_extraction_cache()
+    key = text_key(file_bytes)
+    chunk_size, overlap = settings.DOCUMENT_CHUNK_SIZE, settings.DOCUMENT_CHUNK_OVERLAP
+    unit = settings.DOCUMENT_CHUNK_UNIT
+
+    chunks = cache.get_chunks(key, chunk_size, overlap, unit)
+    if chunks is not None:
+        return chunks
+
+    text = cache.get_text(key)
+    if text is not None:
+        chunks = chunk_text(text, chunk_size, overlap, unit)
+    else:
+        # Chunk pages as they are extracted, keeping the pieces for the text cache
+        pieces: list[str] = []
+        issues: list[str] = []
+
+        def collect() -> Iterator[str]:
+            for piece in iter_text(file_bytes, mime_type, filename, issues):
+                pieces.append(piece)
+                yield piece
+
+        chunks = list(iter_chunks(collect(), chunk_size, overlap, unit))
+        if issues:
+            logger.warning("extraction_incomplete_not_cached", filename=filename, issues=issues[:10])
+            return chunks
+        cache.put_text(key, "".join(pieces))
+    cache.put_chunks(key, chunk_size, overlap, chunks, unit)
+    return chunks
+
+
+_cache: ExtractionCache | None = None
+
+
+def get_extraction_cache() -> ExtractionCache:
+    global _cache
+    if _cache is None:
+        cache_dir = settings.DOCUMENT_EXTRACTION_CACHE_DIR or str(
+            Path(settings.DOCUMENTS_DIR) / "extraction_cache"
+        )
+        _cache = ExtractionCache(Path(cache_dir).resolve(), settings.DOCUMENT_EXTRACTION_CACHE_MAX_BYTES)
+    return _cache
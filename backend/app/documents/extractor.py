@@ -1,119 +1,316 @@
 from __future__ import annotations
 
+import io
+import multiprocessing
 import re
+import signal
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Iterable, Iterator
 
+from app.config.settings import settings
 from app.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+# Bump when extraction output changes so cached text is not reused
+EXTRACTOR_VERSION = 1
+
+# True in processes started by an extraction pool (see ``mark_worker_process``)
+_in_worker_process = False
+
+
+def mark_worker_process() -> None:
+    """Pool initializer: this process extracts PDF pages itself.
+
+    Pool workers run tasks on their main thread, where the per-page time
+    budget can be enforced, and must not start a page pool of their own.
+    Other child processes (e.g. uvicorn workers) are not marked.
+    """
+    global _in_worker_process
+    _in_worker_process = True
+
 
 def extract_text(file_bytes: bytes, mime_type: str, filename: str) -> str:
     """Extract text content from a file based on its mime type."""
+    return "".join(iter_text(file_bytes, mime_type, filename))
+
+
+def iter_text(
+    file_bytes: bytes, mime_type: str, filename: str, issues: list[str] | None = None,
+) -> Iterator[str]:
+    """Yield a file's text in pieces (one per PDF page) as it is extracted.
+
+    Problems that may not recur on another attempt (a PDF that fails to
+    parse, a page that errors or overruns its time budget) are appended to
+    ``issues``; the text is then incomplete.
+    """
     lower_mime = mime_type.lower()
     lower_name = filename.lower()
 
     if lower_mime in ("text/plain", "text/csv") or lower_name.endswith((".txt", ".csv")):
         try:
-            return file_bytes.decode("utf-8")
+            yield file_bytes.decode("utf-8")
         except UnicodeDecodeError:
             logger.warning("utf8_decode_failed", filename=filename)
-            return file_bytes.decode("utf-8", errors="replace")
+            yield file_bytes.decode("utf-8", errors="replace")
+        return
 
     if lower_mime == "application/pdf" or lower_name.endswith(".pdf"):
-        return _extract_pdf(file_bytes, filename)
+        yield from _iter_pdf_text(file_bytes, filename, issues)
+        return
 
     if lower_mime.startswith("audio/") or lower_name.endswith((".mp3", ".wav", ".m4a")):
         logger.info("audio_skip", filename=filename)
-        return ""
+        return
 
     logger.warning("unsupported_mime", mime_type=mime_type, filename=filename)
-    return ""
 
 
-def _extract_pdf(file_bytes: bytes, filename: str) -> str:
-    """Extract text from PDF bytes using pypdf."""
+def _iter_pdf_text(file_bytes: bytes, filename: str, issues: list[str] | None) -> Iterator[str]:
+    """Non-empty page texts separated by blank lines."""
+    first = True
     try:
-        import io
-
-        from pypdf import PdfReader
-
-        reader = PdfReader(io.BytesIO(file_bytes))
-        pages: list[str] = []
-        for page in reader.pages:
-            text = page.extract_text()
-            if text:
-                pages.append(text)
-        return "\n\n".join(pages)
+        for page in iter_pdf_pages(file_bytes, filename, issues):
+            if not page:
+                continue
+            if not first:
+                yield "\n\n"
+            first = False
+            yield page
     except Exception as e:
         logger.error("pdf_extraction_failed", filename=filename, error=str(e))
-        return ""
+        if issues is not None:
+            issues.append(f"pdf: {e}")
+
+
+def iter_pdf_pages(
+    file_bytes: bytes, filename: str, issues: list[str] | None = None,
+) -> Iterator[str]:
+    """Yield each page's text in order, extracting ranges of pages in parallel.
+
+    Pages are split into tasks of ``DOCUMENT_PDF_PAGES_PER_TASK`` and handed
+    to a shared process pool, so a long filing is spread across workers and
+    a pathological one cannot stall the API process. Every page gets
+    ``DOCUMENT_PDF_PAGE_TIMEOUT_SECONDS``; a page that overruns is skipped.
+    Inside a pool worker (e.g. the ingestion pool), pages are extracted
+    serially on that worker's main thread, under the same budget. With
+    ``DOCUMENT_PDF_WORKERS=0`` they are extracted serially in-process, and
+    the budget only applies when called from the main thread. Skipped pages
+    yield ``""`` and are reported in ``issues``.
+    """
+    from pypdf import PdfReader
+
+    page_count = len(PdfReader(io.BytesIO(file_bytes)).pages)
+    timeout = settings.DOCUMENT_PDF_PAGE_TIMEOUT_SECONDS
+    per_task = max(1, settings.DOCUMENT_PDF_PAGES_PER_TASK)
+
+    def pages(texts: list[str | None], start: int) -> Iterator[str]:
+        for number, text in enumerate(texts, start=start + 1):
+            if text is None and issues is not None:
+                issues.append(f"page {number}")
+            yield text or ""
+
+    if settings.DOCUMENT_PDF_WORKERS <= 0 or _in_worker_process:
+        for start in range(0, page_count, per_task):
+            texts = _extract_page_range(file_bytes, filename, start, start + per_task, timeout)
+            yield from pages(texts, start)
+        return
+
+    pool = _get_page_pool()
+    starts = range(0, page_count, per_task)
+    futures = [
+        pool.submit(_extract_page_range, file_bytes, filename, start, start + per_task, timeout)
+        for start in starts
+    ]
+    try:
+        for start, future in zip(starts, futures):
+            yield from pages(future.result(), start)
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _extract_page_range(
+    file_bytes: bytes, filename: str, start: int, stop: int, timeout: float,
+) -> list[str | None]:
+    """Extract pages [start, stop); None for a page that failed or timed out.
+
+    Top-level so it can run in a worker process.
+    """
+    from pypdf import PdfReader
+
+    reader = PdfReader(io.BytesIO(file_bytes))
+    texts: list[str | None] = []
+    for number in range(start, min(stop, len(reader.pages))):
+        try:
+            with _time_budget(timeout):
+                texts.append(reader.pages[number].extract_text() or "")
+        except _PageTimeout:
+            logger.warning("pdf_page_timeout", filename=filename, page=number + 1, budget=timeout)
+            texts.append(None)
+        except Exception as e:
+            logger.warning("pdf_page_failed", filename=filename, page=number + 1, error=str(e))
+            texts.append(None)
+    return texts
+
+
+class _PageTimeout(Exception):
+    pass
+
+
+@contextmanager
+def _time_budget(seconds: float) -> Iterator[None]:
+    """Raise ``_PageTimeout`` after ``seconds`` (main thread on POSIX only; otherwise no limit)."""
+    if (
+        seconds <= 0
+        or not hasattr(signal, "setitimer")
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        yield
+        return
+
+    def _expired(signum: int, frame: Any) -> None:
+        raise _PageTimeout()
+
+    previous = signal.signal(signal.SIGALRM, _expired)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+_page_pool: ProcessPoolExecutor | None = None
+_page_pool_lock = threading.Lock()
+
+
+def _get_page_pool() -> ProcessPoolExecutor:
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            _page_pool = ProcessPoolExecutor(
+                max_workers=settings.DOCUMENT_PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=mark_worker_process,
+            )
+        return _page_pool
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate LLM token count (about four characters per token for English)."""
+    return (len(text) + 3) // 4
 
 
 def chunk_text(
     text: str,
     chunk_size: int = 800,
     overlap: int = 100,
+    unit: str = "chars",
 ) -> list[tuple[str, int, int]]:
     """Split text into overlapping chunks at sentence/paragraph boundaries.
 
     Returns list of (chunk_text, char_start, char_end).
     """
-    if not text or not text.strip():
-        return []
-
-    # Split into sentences (at period/newline boundaries)
-    sentences: list[tuple[str, int, int]] = []
-    for m in re.finditer(r"[^\n]+", text):
-        line = m.group()
-        line_start = m.start()
-        # Split line into sentences at period boundaries
-        for sm in re.finditer(r"[^.!?]*[.!?]+\s*|[^.!?]+$", line):
-            s = sm.group()
-            if s.strip():
-                start = line_start + sm.start()
-                end = line_start + sm.end()
-                sentences.append((s, start, end))
+    return list(iter_chunks(text, chunk_size, overlap, unit))
 
-    if not sentences:
-        # Fallback: treat entire text as one chunk
-        return [(text.strip(), 0, len(text))]
 
-    chunks: list[tuple[str, int, int]] = []
-    current_texts: list[str] = []
+def iter_chunks(
+    pieces: str | Iterable[str],
+    chunk_size: int = 800,
+    overlap: int = 100,
+    unit: str = "chars",
+) -> Iterator[tuple[str, int, int]]:
+    """Yield overlapping (chunk_text, char_start, char_end) chunks in one pass.
+
+    ``pieces`` may be a string or any iterable of text fragments (e.g. PDF
+    pages as they are extracted); only the current line and the sentences of
+    the chunk being built are held, so memory is O(chunk size). Sizes are in
+    characters, or in estimated tokens with ``unit="tokens"``. Offsets are
+    always characters into the concatenated input.
+    """
+    if unit not in ("chars", "tokens"):
+        raise ValueError(f"Unknown chunk unit '{unit}'")
+    measure = len if unit == "chars" else estimate_tokens
+
+    # Sentences of the chunk being built: (text, size in units)
+    window: deque[tuple[str, int]] = deque()
     current_len = 0
-    chunk_start = sentences[0][1]
+    chunk_start = 0
+    last_end = 0
+
+    for sent_text, sent_start, sent_end in _iter_sentences(pieces):
+        sent_len = measure(sent_text)
+        last_end = sent_end
 
-    for sent_text, sent_start, sent_end in sentences:
-        sent_len = len(sent_text)
+        if not window:
+            chunk_start = sent_start
 
-        if current_len + sent_len > chunk_size and current_texts:
+        if current_len + sent_len > chunk_size and window:
             # Emit current chunk
-            chunk_text_str = "".join(current_texts).strip()
+            chunk_text_str = "".join(t for t, _ in window).strip()
             if chunk_text_str:
-                chunks.append((chunk_text_str, chunk_start, sent_start))
+                yield chunk_text_str, chunk_start, sent_start
 
-            # Calculate overlap: keep sentences from the end that fit in overlap
-            overlap_texts: list[str] = []
-            overlap_len = 0
-            for t in reversed(current_texts):
-                if overlap_len + len(t) > overlap:
+            # Overlap: keep sentences from the end that fit in overlap
+            kept: deque[tuple[str, int]] = deque()
+            kept_len = 0
+            kept_chars = 0
+            for t, n in reversed(window):
+                if kept_len + n > overlap:
                     break
-                overlap_texts.insert(0, t)
-                overlap_len += len(t)
+                kept.appendleft((t, n))
+                kept_len += n
+                kept_chars += len(t)
 
-            current_texts = overlap_texts + [sent_text]
-            current_len = overlap_len + sent_len
-            chunk_start = sent_start - overlap_len if overlap_texts else sent_start
-            chunk_start = max(0, chunk_start)
+            window = kept
+            window.append((sent_text, sent_len))
+            current_len = kept_len + sent_len
+            chunk_start = max(0, sent_start - kept_chars if kept else sent_start)
         else:
-            current_texts.append(sent_text)
+            window.append((sent_text, sent_len))
             current_len += sent_len
 
     # Emit remaining text
-    if current_texts:
-        chunk_text_str = "".join(current_texts).strip()
+    if window:
+        chunk_text_str = "".join(t for t, _ in window).strip()
         if chunk_text_str:
-            last_end = sentences[-1][2] if sentences else len(text)
-            chunks.append((chunk_text_str, chunk_start, last_end))
+            yield chunk_text_str, chunk_start, last_end
+
+
+_LINE_RE = re.compile(r"[^\n]+")
+_SENTENCE_RE = re.compile(r"[^.!?]*[.!?]+\s*|[^.!?]+$")
+
+
+def _iter_sentences(pieces: str | Iterable[str]) -> Iterator[tuple[str, int, int]]:
+    """Yield non-blank sentences as (text, start, end), one line at a time."""
+    for line, line_start in _iter_lines(pieces):
+        # Split line into sentences at period boundaries
+        for sm in _SENTENCE_RE.finditer(line):
+            s = sm.group()
+            if s.strip():
+                yield s, line_start + sm.start(), line_start + sm.end()
+
 
-    return chunks
+def _iter_lines(pieces: str | Iterable[str]) -> Iterator[tuple[str, int]]:
+    """Yield (line, offset) for each non-empty line of the concatenated pieces."""
+    if isinstance(pieces, str):
+        pieces = (pieces,)
+    pending = ""
+    pending_start = 0
+    for piece in pieces:
+        buffer = pending + piece
+        last_newline = buffer.rfind("\n")
+        if last_newline < 0:
+            pending = buffer
+            continue
+        for m in _LINE_RE.finditer(buffer, 0, last_newline):
+            yield m.group(), pending_start + m.start()
+        pending = buffer[last_newline + 1:]
+        pending_start += last_newline + 1
+    if pending:
+        for m in _LINE_RE.finditer(pending):
+            yield m.group(), pending_start + m.start()
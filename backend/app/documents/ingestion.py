@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import multiprocessing
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import NamedTuple
+
+from app.config.settings import settings
+from app.documents.extraction_cache import extract_chunks
+from app.documents.extractor import mark_worker_process
+from app.documents.factory import get_document_provider
+from app.documents.models import EntityAssociation, IngestionStatus, PreparedDocument
+from app.email.interfaces import LeaderLock
+from app.email.leader_lock import FileLeaderLock
+from app.llm.cache import invalidate_entities
+from app.logging_config import get_logger
+from app.object_storage.factory import get_storage_provider
+from app.object_storage.models import FileMetadata
+
+logger = get_logger(__name__)
+
+# flock in DOCUMENTS_DIR: one process at a time indexes missing storage files
+INGESTION_LOCK_NAME = "ingestion.lock"
+
+
+class IngestJob(NamedTuple):
+    meta: FileMetadata
+    file_bytes: bytes | None
+
+
+def prepare_document(job: IngestJob) -> PreparedDocument:
+    """Extract and chunk one file. Runs in a worker process, so it must stay top-level."""
+    meta = job.meta
+    chunks = extract_chunks(job.file_bytes, meta.mime_type, meta.filename) if job.file_bytes else []
+    return PreparedDocument(
+        file_id=meta.file_id,
+        filename=meta.filename,
+        title=meta.description or meta.filename,
+        doc_type=meta.type,
+        mime_type=meta.mime_type,
+        date=meta.date,
+        description=meta.description,
+        entities=[EntityAssociation(entity_type="stock", entity_id=t) for t in meta.tickers],
+        chunks=chunks,
+    )
+
+
+class IngestionPipeline:
+    """Indexes existing storage files off the request path.
+
+    A single coordinator thread reads file bytes and submits extraction and
+    chunking to a process pool, keeping at most ``queue_size`` files in
+    flight so memory stays bounded. Prepared documents are committed to the
+    index ``batch_size`` at a time; searches see each batch as it lands.
+    With ``workers=0`` extraction runs in the coordinator thread instead.
+
+    ``ingest_missing`` is for processes sharing one index (uvicorn workers):
+    it runs only while holding ``claim``, so a single process does the work
+    and the others pick its documents up from the shared segments.
+    """
+
+    def __init__(
+        self,
+        workers: int | None = None,
+        batch_size: int | None = None,
+        queue_size: int | None = None,
+        claim: LeaderLock | None = None,
+    ) -> None:
+        self._workers = settings.DOCUMENT_INGEST_WORKERS if workers is None else workers
+        self._batch_size = max(1, batch_size or settings.DOCUMENT_INGEST_BATCH_SIZE)
+        self._queue_size = max(1, queue_size or settings.DOCUMENT_INGEST_QUEUE_SIZE)
+        self._lock = threading.Lock()
+        self._status = IngestionStatus()
+        self._started = 0.0
+        self._thread: threading.Thread | None = None
+        self._claim = claim
+
+    def status(self) -> IngestionStatus:
+        with self._lock:
+            status = self._status.model_copy()
+        if status.state == "running":
+            elapsed = time.monotonic() - self._started
+            status.elapsed_seconds = round(elapsed, 1)
+            done = status.indexed + status.failed
+            if done:
+                status.eta_seconds = round(elapsed / done * (status.total - done), 1)
+        return status
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, files: list[FileMetadata]) -> bool:
+        """Ingest ``files`` in a background thread. Returns False if already running."""
+        with self._lock:
+            if self.is_running():
+                return False
+            self._begin(len(files))
+            self._thread = threading.Thread(
+                target=self._run, args=(files,), name="document-ingestion", daemon=True,
+            )
+            self._thread.start()
+        return True
+
+    def run(self, files: list[FileMetadata]) -> IngestionStatus:
+        """Ingest ``files`` in the calling thread."""
+        with self._lock:
+            self._begin(len(files))
+        self._run(files)
+        return self.status()
+
+    def ingest_missing(self, files: list[FileMetadata], background: bool) -> int | None:
+        """Ingest the ``files`` the index lacks; returns how many, or None if another process is.
+
+        The claim is held until the run ends. Missing files are worked out
+        after taking it, so a previous holder's documents are not redone.
+        """
+        if self._claim is not None and not self._claim.acquire():
+            return None
+        provider = get_document_provider()
+        pending = [meta for meta in files if not provider.is_indexed(meta.file_id)]
+        if not pending:
+            self._release_claim()
+            return 0
+        if background:
+            # Already running here: that run holds the claim and releases it
+            self.start(pending)
+        else:
+            self.run(pending)
+        return len(pending)
+
+    def join(self, timeout: float | None = None) -> None:
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _begin(self, total: int) -> None:
+        self._started = time.monotonic()
+        self._status = IngestionStatus(
+            state="running",
+            total=total,
+            started_at=datetime.now(timezone.utc).isoformat(),
+        )
+
+    def _run(self, files: list[FileMetadata]) -> None:
+        try:
+            if self._workers > 0 and len(files) > 1:
+                # spawn: forking a process that holds threads and mmaps is unsafe
+                with ProcessPoolExecutor(
+                    max_workers=self._workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=mark_worker_process,
+                ) as pool:
+                    self._ingest(files, pool)
+            else:
+                self._ingest(files, None)
+        except Exception as e:
+            logger.exception("document_ingestion_failed")
+            self._finish("failed", str(e))
+            return
+        finally:
+            self._release_claim()
+        self._finish("completed")
+
+    def _release_claim(self) -> None:
+        if self._claim is not None:
+            self._claim.release()
+
+    def _ingest(self, files: list[FileMetadata], pool: Executor | None) -> None:
+        storage = get_storage_provider()
+        pending: deque[tuple[FileMetadata, Future[PreparedDocument] | IngestJob]] = deque()
+        batch: list[PreparedDocument] = []
+
+        def collect_one() -> None:
+            meta, work = pending.popleft()
+            try:
+                batch.append(work.result() if isinstance(work, Future) else prepare_document(work))
+            except Exception as e:
+                logger.error("document_ingest_file_failed", file_id=meta.file_id, error=str(e))
+                with self._lock:
+                    self._status.failed += 1
+            if len(batch) >= self._batch_size:
+                self._commit(batch)
+
+        for meta in files:
+            result = storage.get_file_bytes(meta.file_id)
+            job = IngestJob(meta, result[0] if result else None)
+            pending.append((meta, pool.submit(prepare_document, job) if pool else job))
+            while len(pending) >= self._queue_size:
+                collect_one()
+        while pending:
+            collect_one()
+        self._commit(batch)
+
+    def _commit(self, batch: list[PreparedDocument]) -> None:
+        if not batch:
+            return
+        get_document_provider().index_documents(batch)
+        invalidate_entities({(e.entity_type, e.entity_id) for doc in batch for e in doc.entities})
+        with self._lock:
+            self._status.indexed += len(batch)
+        logger.info("document_ingest_batch_committed", count=len(batch))
+        batch.clear()
+
+    def _finish(self, state: str, error: str | None = None) -> None:
+        with self._lock:
+            self._status.state = state
+            self._status.error = error
+            self._status.finished_at = datetime.now(timezone.utc).isoformat()
+            self._status.elapsed_seconds = round(time.monotonic() - self._started, 1)
+            self._status.eta_seconds = 0.0 if state == "completed" else None
+        logger.info(
+            "document_ingestion_finished",
+            state=state,
+            indexed=self._status.indexed,
+            failed=self._status.failed,
+        )
+
+
+_pipeline: IngestionPipeline | None = None
+
+
+def get_ingestion_pipeline() -> IngestionPipeline:
+    global _pipeline
+    if _pipeline is None:
+        claim = FileLeaderLock(Path(settings.DOCUMENTS_DIR) / INGESTION_LOCK_NAME)
+        _pipeline = IngestionPipeline(claim=claim)
+    return _pipeline
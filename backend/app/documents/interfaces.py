@@ -7,6 +7,7 @@ from app.documents.models import (
     DocumentRecord,
     DocumentSearchResult,
     EntityAssociation,
+    PreparedDocument,
 )
 
 
@@ -26,6 +27,10 @@ class DocumentIndexProvider(ABC):
     ) -> DocumentRecord:
         """Index a document with extracted text."""
 
+    @abstractmethod
+    def index_documents(self, documents: list[PreparedDocument]) -> list[DocumentRecord]:
+        """Index already-chunked documents as one batched write."""
+
     @abstractmethod
     def get_document(self, file_id: str) -> DocumentRecord | None:
         """Get a single document record by file_id."""
@@ -44,8 +49,22 @@ class DocumentIndexProvider(ABC):
         query: str,
         entity_type: str | None = None,
         entity_id: str | None = None,
+        limit: int | None = None,
+        mode: str = "keyword",
     ) -> list[DocumentSearchResult]:
-        """Search documents by keyword query."""
+        """Search documents, best ``limit`` results first.
+
+        ``mode`` is ``"keyword"`` (BM25) or ``"hybrid"`` (BM25 fused with
+        embedding similarity). Hybrid searches rank by keyword alone until
+        the embedding index is ready; see ``build_vector_index``.
+        """
+
+    @abstractmethod
+    def build_vector_index(self, wait: bool = False) -> bool:
+        """Start building the embedding index in the background, if not built.
+
+        With ``wait``, block until it is ready. Returns True once it is.
+        """
 
     @abstractmethod
     def remove_document(self, file_id: str) -> bool:
@@ -54,3 +73,11 @@ class DocumentIndexProvider(ABC):
     @abstractmethod
     def is_indexed(self, file_id: str) -> bool:
         """Check if a file_id is already indexed."""
+
+    @abstractmethod
+    def compact(self, force: bool = False) -> bool:
+        """Reclaim storage held by replaced or removed documents.
+
+        Unless ``force`` is set, only runs once enough garbage has built up.
+        Returns True if a compaction ran.
+        """
@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# Okapi BM25 parameters (the usual defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    """Split text into lowercase word tokens, dropping single characters."""
+    return [w for w in _TOKEN_RE.findall(text.lower()) if len(w) >= 2]
+
+
+class InvertedIndex:
+    """Term → postings index with BM25 scoring.
+
+    Each posting maps a key (a chunk id, or a file id for metadata) to the
+    term's frequency in it. Scoring only visits the postings of the query
+    terms, so its cost follows the number of matches rather than the corpus.
+    Not thread-safe; callers serialize writes.
+    """
+
+    def __init__(self) -> None:
+        self._postings: dict[str, dict[str, int]] = {}
+        self._lengths: dict[str, int] = {}
+        self._total_length = 0
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._lengths
+
+    def add(self, key: str, text: str) -> None:
+        if key in self._lengths:
+            self.remove(key)
+        counts = Counter(tokenize(text))
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[key] = tf
+        length = sum(counts.values())
+        self._lengths[key] = length
+        self._total_length += length
+
+    def remove(self, key: str, text: str | None = None) -> None:
+        """Drop ``key``; pass its text to touch only its own terms' postings."""
+        length = self._lengths.pop(key, None)
+        if length is None:
+            return
+        self._total_length -= length
+        terms = set(tokenize(text)) if text is not None else list(self._postings)
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is None or postings.pop(key, None) is None:
+                continue
+            if not postings:
+                del self._postings[term]
+
+    def document_frequency(self, term: str) -> int:
+        return len(self._postings.get(term, ()))
+
+    def score(self, terms: list[str], keys: set[str] | None = None) -> dict[str, float]:
+        """BM25 score of every key matching at least one of ``terms``.
+
+        ``keys`` optionally restricts scoring to an allowed subset.
+        """
+        n = len(self._lengths)
+        if not n:
+            return {}
+        avg_length = self._total_length / n or 1.0
+        scores: dict[str, float] = {}
+        for term in dict.fromkeys(terms):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            df = len(postings)
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            for key, tf in postings.items():
+                if keys is not None and key not in keys:
+                    continue
+                norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self._lengths[key] / avg_length)
+                scores[key] = scores.get(key, 0.0) + idf * tf * (BM25_K1 + 1.0) / (tf + norm)
+        return scores
@@ -1,53 +1,428 @@
 from __future__ import annotations
 
+import heapq
 import json
-import re
+import threading
 import uuid
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any, Iterable, NamedTuple
 
+import numpy as np
+
+from app.config.settings import settings
+from app.documents.embeddings import get_embedder
 from app.documents.extractor import chunk_text
 from app.documents.interfaces import DocumentIndexProvider
+from app.documents.inverted_index import InvertedIndex, tokenize
+from app.documents.segments import FORMAT_VERSION, SegmentStore
+from app.documents.vector_index import VectorIndex
 from app.documents.models import (
     DocumentChunk,
     DocumentListItem,
     DocumentRecord,
     DocumentSearchResult,
     EntityAssociation,
+    PreparedDocument,
 )
 from app.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+# Metadata (title, filename, description) matches count double
+_META_WEIGHT = 2.0
+
+_MAX_CHUNKS_PER_RESULT = 5
+
+# Hybrid search: reciprocal rank fusion of the keyword and vector rankings,
+# each cut to its best candidates; k=60 is the constant from the RRF paper
+_RRF_K = 60
+_HYBRID_CANDIDATES = 100
+_MIN_VECTOR_SIMILARITY = 0.1
+_EMBED_BATCH = 256
+
+SEARCH_MODES = ("keyword", "hybrid")
+
+# Pre-segment storage format: one JSON array rewritten on every change
+_LEGACY_INDEX = "index.json"
+
+# Compact once superseded/removed entries make up this share of all entries
+_COMPACTION_DEAD_RATIO = 0.5
+_COMPACTION_MIN_DEAD = 32
+
+
+class _ChunkRef(NamedTuple):
+    """A chunk's metadata and where its text lives in a segment blob."""
+
+    chunk_id: str
+    chunk_index: int
+    char_start: int
+    char_end: int
+    segment: str
+    offset: int
+    length: int
+
 
 class JsonDocumentIndexProvider(DocumentIndexProvider):
-    def __init__(self, documents_dir: str) -> None:
+    """Document index persisted as append-only JSON-lines segments.
+
+    Each ``index_document`` appends one ``put`` line and each removal a
+    ``del`` tombstone, so a write costs I/O proportional to the document.
+    ``compact`` rewrites live records from sealed segments into one new
+    segment and drops the rest. It reads the sealed segments from disk, not
+    this process's memory, so documents other workers wrote survive; only
+    one process compacts at a time.
+
+    Every uvicorn worker keeps its own in-memory copy. Before each call it
+    applies whatever has been appended to the segments since (by any
+    process); after a compaction it reconciles with a full replay instead.
+
+    Document metadata is held in memory; chunk texts stay in the segments'
+    memory-mapped blobs and are only decoded for search hits, ``get_document``
+    and building the chunk search indexes, which happens on the first search.
+    The embedding index for hybrid search is built on a background thread,
+    started by the first hybrid search, and then kept in step with writes;
+    until it is ready, hybrid searches rank by keyword alone.
+    """
+
+    def __init__(self, documents_dir: str, max_segment_bytes: int | None = None) -> None:
         self._dir = Path(documents_dir).resolve()
         self._dir.mkdir(parents=True, exist_ok=True)
-        self._index_path = self._dir / "index.json"
+        # Metadata only (``chunks`` is empty); chunk locations live in _chunks
         self._records: dict[str, DocumentRecord] = {}
+        self._chunks: dict[str, list[_ChunkRef]] = {}
+        # Search structures, kept in step with _records
+        self._chunk_index: InvertedIndex | None = None
+        self._vector_index: VectorIndex | None = None
+        # While the vector index is being built: chunks whose vectors still
+        # need (re)computing or dropping; None when no build is running
+        self._vector_dirty: set[str] | None = None
+        # Set when the current build attempt ends, however it ends
+        self._vector_build_done = threading.Event()
+        self._meta_index = InvertedIndex()
+        self._chunk_owner: dict[str, tuple[str, int]] = {}
+        self._entity_files: dict[tuple[str, str], set[str]] = {}
+        # file_id → segment holding its live entry; entry totals per segment
+        self._locations: dict[str, str] = {}
+        self._entry_counts: dict[str, int] = {}
+        # Bytes of each segment already applied to the in-memory state
+        self._applied: dict[str, int] = {}
+        # Guards all in-memory state: background ingestion writes while requests read
+        self._lock = threading.RLock()
+        self._store = SegmentStore(
+            self._dir, max_segment_bytes or settings.DOCUMENT_SEGMENT_MAX_BYTES,
+        )
         self._load_index()
 
     def _load_index(self) -> None:
-        if not self._index_path.exists():
-            return
+        legacy_path = self._dir / _LEGACY_INDEX
         try:
-            with open(self._index_path) as f:
-                data = json.load(f)
-            for item in data:
-                rec = DocumentRecord(**item)
-                self._records[rec.file_id] = rec
-            logger.info("document_index_loaded", count=len(self._records))
+            # Under the manifest lock: a worker booting alongside waits for the
+            # migration instead of reading a half-initialised store
+            with self._store.exclusive() as existed:
+                if not existed and legacy_path.exists():
+                    self._migrate_legacy(legacy_path)
+                elif self._store.version < FORMAT_VERSION:
+                    self._upgrade_inline_segments()
+            self._catch_up()
+            logger.info(
+                "document_index_loaded",
+                count=len(self._records),
+                segments=len(self._store.segments),
+            )
         except Exception as e:
             logger.error("document_index_load_failed", error=str(e))
 
-    def _save_index(self) -> None:
-        with open(self._index_path, "w") as f:
-            json.dump(
-                [rec.model_dump() for rec in self._records.values()],
-                f,
-                indent=2,
+    def _migrate_legacy(self, legacy_path: Path) -> None:
+        """Convert a pre-segment ``index.json`` into one compacted segment.
+
+        The legacy file is left in place; it is ignored once a manifest exists.
+        """
+        with open(legacy_path) as f:
+            data = json.load(f)
+        records = [DocumentRecord(**item) for item in data]
+        self._rewrite(records, [])
+        logger.info("document_index_migrated", count=len(records))
+
+    def _upgrade_inline_segments(self) -> None:
+        """Move chunk texts from version-1 segments (inline text) into blobs."""
+        live: dict[str, DocumentRecord] = {}
+        for _, entry in self._store.replay():
+            if entry.get("op") == "put":
+                rec = DocumentRecord(**entry["record"])
+                live[rec.file_id] = rec
+            elif entry.get("op") == "del":
+                live.pop(entry["file_id"], None)
+        self._rewrite(list(live.values()), self._store.seal())
+        logger.info("document_index_upgraded", count=len(live))
+
+    def _rewrite(self, records: list[DocumentRecord], old_segments: list[str]) -> None:
+        segment, _ = self._store.write_segment(
+            (_put(rec, rec.chunks), [c.text for c in rec.chunks]) for rec in records
+        )
+        self._store.replace(old_segments, segment)
+        self._store.release(old_segments)
+
+    def _apply(self, segment: str, entry: dict[str, Any]) -> None:
+        """Apply one segment entry to the in-memory state."""
+        self._entry_counts[segment] = self._entry_counts.get(segment, 0) + 1
+        if entry.get("op") == "put":
+            data = entry["record"]
+            rec = DocumentRecord(**{**data, "chunks": []})
+            refs = [
+                _ChunkRef(
+                    c["chunk_id"], c["chunk_index"], c["char_start"], c["char_end"],
+                    segment, offset, length,
+                )
+                for c, (offset, length) in zip(data.get("chunks", []), entry.get("spans", []))
+            ]
+            self._drop(rec.file_id)
+            self._records[rec.file_id] = rec
+            self._chunks[rec.file_id] = refs
+            self._add_to_search(rec, refs)
+            self._locations[rec.file_id] = segment
+        elif entry.get("op") == "del":
+            self._drop(entry["file_id"])
+
+    def _drop(self, file_id: str) -> None:
+        previous = self._records.pop(file_id, None)
+        if previous is not None:
+            self._remove_from_search(previous, self._chunks.pop(file_id, []))
+        self._locations.pop(file_id, None)
+
+    def _read(self, ref: _ChunkRef) -> str:
+        return self._store.read_text(ref.segment, ref.offset, ref.length)
+
+    def _materialize(self, file_id: str, ref: _ChunkRef) -> DocumentChunk:
+        return DocumentChunk(
+            chunk_id=ref.chunk_id,
+            file_id=file_id,
+            chunk_index=ref.chunk_index,
+            text=self._read(ref),
+            char_start=ref.char_start,
+            char_end=ref.char_end,
+        )
+
+    def _add_to_search(self, rec: DocumentRecord, refs: list[_ChunkRef]) -> None:
+        self._meta_index.add(rec.file_id, _meta_text(rec))
+        for position, ref in enumerate(refs):
+            if self._chunk_index is not None:
+                self._chunk_index.add(ref.chunk_id, self._read(ref))
+            self._chunk_owner[ref.chunk_id] = (rec.file_id, position)
+        if self._vector_index is not None and refs:
+            self._embed_into(self._vector_index, refs)
+        elif self._vector_dirty is not None:
+            self._vector_dirty.update(ref.chunk_id for ref in refs)
+        for e in rec.entities:
+            self._entity_files.setdefault((e.entity_type, e.entity_id), set()).add(rec.file_id)
+
+    def _remove_from_search(self, rec: DocumentRecord, refs: list[_ChunkRef]) -> None:
+        self._meta_index.remove(rec.file_id, _meta_text(rec))
+        for ref in refs:
+            if self._chunk_index is not None:
+                self._chunk_index.remove(ref.chunk_id, self._read(ref))
+            if self._vector_index is not None:
+                self._vector_index.remove(ref.chunk_id)
+            elif self._vector_dirty is not None:
+                self._vector_dirty.add(ref.chunk_id)
+            self._chunk_owner.pop(ref.chunk_id, None)
+        for e in rec.entities:
+            files = self._entity_files.get((e.entity_type, e.entity_id))
+            if files is not None:
+                files.discard(rec.file_id)
+                if not files:
+                    del self._entity_files[(e.entity_type, e.entity_id)]
+
+    def _ensure_chunk_index(self) -> InvertedIndex:
+        index = self._chunk_index
+        if index is not None:
+            return index
+        # Holding the lock means no document can slip in between build and publish
+        with self._lock:
+            if self._chunk_index is None:
+                index = InvertedIndex()
+                for refs in self._chunks.values():
+                    for ref in refs:
+                        index.add(ref.chunk_id, self._read(ref))
+                self._chunk_index = index
+                logger.info("document_chunk_index_built", chunks=len(index))
+            return self._chunk_index
+
+    def build_vector_index(self, wait: bool = False) -> bool:
+        with self._lock:
+            if self._vector_index is None and self._vector_dirty is None:
+                self._vector_dirty = {ref.chunk_id for refs in self._chunks.values() for ref in refs}
+                self._vector_build_done = threading.Event()
+                threading.Thread(
+                    target=self._build_vector_index,
+                    args=(self._vector_build_done,),
+                    name="document-vector-index",
+                    daemon=True,
+                ).start()
+            done = self._vector_build_done
+        if wait:
+            done.wait()
+        return self._vector_index is not None
+
+    def _build_vector_index(self, done: threading.Event) -> None:
+        """Embed every chunk without holding the lock for the expensive part.
+
+        Each round takes a batch of dirty chunk ids and reads their texts
+        under the lock, then embeds them outside it. Writes meanwhile mark
+        their chunks dirty again, so the last (small) round, done under the
+        lock, leaves the index exactly in step before it is published.
+        """
+        index = VectorIndex(get_embedder().dim)
+        try:
+            while True:
+                with self._lock:
+                    assert self._vector_dirty is not None
+                    final = len(self._vector_dirty) <= _EMBED_BATCH
+                    size = min(_EMBED_BATCH, len(self._vector_dirty))
+                    batch = [self._vector_dirty.pop() for _ in range(size)]
+                    live = self._live_chunk_texts(batch)
+                    if final:
+                        self._embed_batch(index, batch, live)
+                        self._vector_index = index
+                        self._vector_dirty = None
+                        break
+                self._embed_batch(index, batch, live)
+        except Exception:
+            logger.exception("document_vector_index_build_failed")
+            with self._lock:
+                # The next hybrid search starts over
+                self._vector_dirty = None
+            return
+        finally:
+            done.set()
+        logger.info("document_vector_index_built", chunks=len(index))
+
+    def _live_chunk_texts(self, chunk_ids: list[str]) -> dict[str, str]:
+        texts: dict[str, str] = {}
+        for chunk_id in chunk_ids:
+            owner = self._chunk_owner.get(chunk_id)
+            if owner is not None:
+                file_id, position = owner
+                texts[chunk_id] = self._read(self._chunks[file_id][position])
+        return texts
+
+    @staticmethod
+    def _embed_batch(index: VectorIndex, chunk_ids: list[str], live: dict[str, str]) -> None:
+        for chunk_id in chunk_ids:
+            if chunk_id not in live:
+                index.remove(chunk_id)
+        if live:
+            index.add_many(list(live), get_embedder().embed(list(live.values())))
+
+    def _embed_into(self, index: VectorIndex, refs: list[_ChunkRef]) -> None:
+        vectors = get_embedder().embed([self._read(ref) for ref in refs])
+        index.add_many([ref.chunk_id for ref in refs], vectors)
+
+    def _entity_file_ids(self, entity_type: str | None, entity_id: str | None) -> set[str]:
+        matched: set[str] = set()
+        for (etype, eid), files in self._entity_files.items():
+            if (entity_type is None or etype == entity_type) and (entity_id is None or eid == entity_id):
+                matched |= files
+        return matched
+
+    def _dead_entries(self) -> int:
+        return sum(self._entry_counts.values()) - len(self._records)
+
+    def compact(self, force: bool = False) -> bool:
+        self._catch_up()
+        dead = self._dead_entries()
+        total = sum(self._entry_counts.values())
+        if not force and (dead < _COMPACTION_MIN_DEAD or dead < total * _COMPACTION_DEAD_RATIO):
+            return False
+
+        with self._store.compaction() as acquired:
+            if not acquired:
+                logger.info("document_compaction_skipped", reason="running_elsewhere")
+                return False
+            sealed = self._store.seal()
+            if not sealed:
+                return False
+            # Replayed from disk: other processes' writes are not in our memory
+            live: dict[str, tuple[str, dict[str, Any]]] = {}
+            for name, entry in self._store.replay(sealed):
+                if entry.get("op") == "put":
+                    live[entry["record"]["file_id"]] = (name, entry)
+                elif entry.get("op") == "del":
+                    live.pop(entry["file_id"], None)
+
+            # New entries go to the active segment meanwhile, and since the
+            # compacted segment is placed first, they still win on replay
+            segment, _ = self._store.write_segment(
+                (
+                    {k: v for k, v in entry.items() if k != "spans"},
+                    [self._store.read_text(name, *span) for span in entry.get("spans", [])],
+                )
+                for name, entry in live.values()
             )
+            self._store.replace(sealed, segment)
+        self._catch_up()
+        logger.info(
+            "document_index_compacted",
+            segments_removed=len(sealed),
+            records=len(live),
+            dead_before=dead,
+        )
+        return True
+
+    def _catch_up(self) -> None:
+        """Apply entries appended to the segments (by any process) since the last call."""
+        with self._lock:
+            segments, stale = self._store.snapshot()
+            if stale:
+                self._reconcile(segments)
+                self._store.release(stale)
+                return
+            for segment in segments:
+                start = self._applied.get(segment, 0)
+                if self._store.size(segment) <= start:
+                    continue
+                entries, end = self._store.read_entries(segment, start)
+                for entry in entries:
+                    self._apply(segment, entry)
+                self._applied[segment] = end
+
+    def _reconcile(self, segments: list[str]) -> None:
+        """Bring the in-memory state in line with a full replay of ``segments``.
+
+        Needed once a compaction has rewritten part of the log. A record
+        whose chunks are unchanged only has its chunk locations moved, so
+        the search indexes are not rebuilt for it.
+        """
+        latest: dict[str, tuple[str, dict[str, Any]]] = {}
+        counts: dict[str, int] = {}
+        applied: dict[str, int] = {}
+        for segment in segments:
+            entries, applied[segment] = self._store.read_entries(segment)
+            counts[segment] = len(entries)
+            for entry in entries:
+                if entry.get("op") == "put":
+                    latest[entry["record"]["file_id"]] = (segment, entry)
+                elif entry.get("op") == "del":
+                    latest.pop(entry["file_id"], None)
+
+        for fid in [fid for fid in self._records if fid not in latest]:
+            self._drop(fid)
+        moved = 0
+        for fid, (segment, entry) in latest.items():
+            refs = self._chunks.get(fid)
+            chunks = entry["record"].get("chunks", [])
+            if refs is None or [ref.chunk_id for ref in refs] != [c["chunk_id"] for c in chunks]:
+                self._apply(segment, entry)
+                continue
+            self._chunks[fid] = [
+                ref._replace(segment=segment, offset=offset, length=length)
+                for ref, (offset, length) in zip(refs, entry.get("spans", []))
+            ]
+            self._locations[fid] = segment
+            moved += 1
+        self._entry_counts = counts
+        self._applied = applied
+        logger.info("document_index_reconciled", records=len(latest), records_moved=moved)
 
     def index_document(
         self,
@@ -61,20 +436,7 @@ class JsonDocumentIndexProvider(DocumentIndexProvider):
         entities: list[EntityAssociation],
         text: str,
     ) -> DocumentRecord:
-        raw_chunks = chunk_text(text)
-        chunks = [
-            DocumentChunk(
-                chunk_id=str(uuid.uuid4()),
-                file_id=file_id,
-                chunk_index=i,
-                text=chunk_text_str,
-                char_start=start,
-                char_end=end,
-            )
-            for i, (chunk_text_str, start, end) in enumerate(raw_chunks)
-        ]
-
-        record = DocumentRecord(
+        prepared = PreparedDocument(
             file_id=file_id,
             filename=filename,
             title=title,
@@ -83,25 +445,68 @@ class JsonDocumentIndexProvider(DocumentIndexProvider):
             date=date,
             description=description,
             entities=entities,
-            chunks=chunks,
-            indexed_at=datetime.now(timezone.utc).isoformat(),
+            chunks=chunk_text(
+                text,
+                settings.DOCUMENT_CHUNK_SIZE,
+                settings.DOCUMENT_CHUNK_OVERLAP,
+                settings.DOCUMENT_CHUNK_UNIT,
+            ),
         )
+        return self.index_documents([prepared])[0]
+
+    def index_documents(self, documents: list[PreparedDocument]) -> list[DocumentRecord]:
+        if not documents:
+            return []
+        indexed_at = datetime.now(timezone.utc).isoformat()
+        records = [
+            DocumentRecord(
+                **doc.model_dump(exclude={"chunks"}),
+                chunks=[
+                    DocumentChunk(
+                        chunk_id=str(uuid.uuid4()),
+                        file_id=doc.file_id,
+                        chunk_index=i,
+                        text=chunk_text_str,
+                        char_start=start,
+                        char_end=end,
+                    )
+                    for i, (chunk_text_str, start, end) in enumerate(doc.chunks)
+                ],
+                indexed_at=indexed_at,
+            )
+            for doc in documents
+        ]
+        entries = [_put(rec, rec.chunks) for rec in records]
 
-        self._records[file_id] = record
-        self._save_index()
-        logger.info("document_indexed", file_id=file_id, chunks=len(chunks))
-        return record
+        with self._lock:
+            self._store.append_many(
+                [(entry, [c.text for c in rec.chunks]) for entry, rec in zip(entries, records)]
+            )
+            # Applies these entries along with any other process's before them
+            self._catch_up()
+        for rec in records:
+            logger.info("document_indexed", file_id=rec.file_id, chunks=len(rec.chunks))
+        return records
 
     def get_document(self, file_id: str) -> DocumentRecord | None:
-        return self._records.get(file_id)
+        with self._lock:
+            self._catch_up()
+            rec = self._records.get(file_id)
+            refs = self._chunks.get(file_id, [])
+        if rec is None:
+            return None
+        return rec.model_copy(update={"chunks": [self._materialize(file_id, r) for r in refs]})
 
     def list_documents(
         self,
         entity_type: str | None = None,
         entity_id: str | None = None,
     ) -> list[DocumentListItem]:
+        with self._lock:
+            self._catch_up()
+            snapshot = [(rec, len(self._chunks.get(fid, []))) for fid, rec in self._records.items()]
         results: list[DocumentListItem] = []
-        for rec in self._records.values():
+        for rec, chunk_count in snapshot:
             if entity_type or entity_id:
                 match = any(
                     (entity_type is None or e.entity_type == entity_type)
@@ -119,7 +524,7 @@ class JsonDocumentIndexProvider(DocumentIndexProvider):
                     date=rec.date,
                     description=rec.description,
                     entities=rec.entities,
-                    chunk_count=len(rec.chunks),
+                    chunk_count=chunk_count,
                     indexed_at=rec.indexed_at,
                 )
             )
@@ -130,44 +535,80 @@ class JsonDocumentIndexProvider(DocumentIndexProvider):
         query: str,
         entity_type: str | None = None,
         entity_id: str | None = None,
+        limit: int | None = None,
+        mode: str = "keyword",
     ) -> list[DocumentSearchResult]:
-        tokens = _tokenize(query)
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Unknown search mode: {mode}")
+        tokens = tokenize(query)
         if not tokens:
             return []
+        self._catch_up()
+        query_vector = None
+        if mode == "hybrid":
+            if self.build_vector_index():
+                # Embedded outside the lock; a model-backed embedder is not free
+                query_vector = get_embedder().embed([query])[0]
+            else:
+                logger.info("document_vector_index_pending")
 
-        results: list[DocumentSearchResult] = []
+        with self._lock:
+            return self._search(tokens, query_vector, entity_type, entity_id, limit)
 
-        for rec in self._records.values():
-            # Entity filter
-            if entity_type or entity_id:
-                match = any(
-                    (entity_type is None or e.entity_type == entity_type)
-                    and (entity_id is None or e.entity_id == entity_id)
-                    for e in rec.entities
-                )
-                if not match:
-                    continue
+    def _search(
+        self,
+        tokens: list[str],
+        query_vector: np.ndarray | None,
+        entity_type: str | None,
+        entity_id: str | None,
+        limit: int | None,
+    ) -> list[DocumentSearchResult]:
+        allowed: set[str] | None = None
+        if entity_type or entity_id:
+            allowed = self._entity_file_ids(entity_type, entity_id)
+            if not allowed:
+                return []
 
-            # Score metadata (2x boost)
-            meta_text = f"{rec.title} {rec.filename} {rec.description}".lower()
-            meta_score = sum(meta_text.count(t) for t in tokens) * 2.0
+        # BM25 over metadata and chunks; only postings of the query terms are visited
+        meta_scores = self._meta_index.score(tokens, allowed)
+        chunk_scores: dict[str, float] = {}
+        for chunk_id, score in self._ensure_chunk_index().score(tokens).items():
+            owner = self._chunk_owner.get(chunk_id)
+            if owner is not None and (allowed is None or owner[0] in allowed):
+                chunk_scores[chunk_id] = score
 
-            # Score chunks
-            matching_chunks: list[tuple[DocumentChunk, float]] = []
-            for chunk in rec.chunks:
-                chunk_lower = chunk.text.lower()
-                chunk_score = sum(chunk_lower.count(t) for t in tokens)
-                if chunk_score > 0:
-                    matching_chunks.append((chunk, float(chunk_score)))
+        if query_vector is not None:
+            allowed_chunks = None
+            if allowed is not None:
+                allowed_chunks = {ref.chunk_id for fid in allowed for ref in self._chunks.get(fid, [])}
+            assert self._vector_index is not None
+            vector_hits = self._vector_index.search(
+                query_vector, _HYBRID_CANDIDATES, allowed_chunks, _MIN_VECTOR_SIMILARITY,
+            )
+            meta_scores = _rrf([meta_scores.items()])
+            chunk_scores = _rrf([chunk_scores.items(), vector_hits])
 
-            total_score = meta_score + sum(s for _, s in matching_chunks)
-            if total_score <= 0:
-                continue
+        doc_scores = {fid: score * _META_WEIGHT for fid, score in meta_scores.items()}
+        chunks_by_file: dict[str, list[tuple[float, int]]] = {}
+        for chunk_id, score in chunk_scores.items():
+            file_id, position = self._chunk_owner[chunk_id]
+            doc_scores[file_id] = doc_scores.get(file_id, 0.0) + score
+            chunks_by_file.setdefault(file_id, []).append((score, position))
 
-            # Sort matching chunks by score descending, take top 5
-            matching_chunks.sort(key=lambda x: x[1], reverse=True)
-            top_chunks = [c for c, _ in matching_chunks[:5]]
+        if limit is None:
+            ranked = sorted(doc_scores.items(), key=lambda kv: kv[1], reverse=True)
+        else:
+            ranked = heapq.nlargest(limit, doc_scores.items(), key=lambda kv: kv[1])
 
+        results: list[DocumentSearchResult] = []
+        for file_id, total_score in ranked:
+            rec = self._records[file_id]
+            refs = self._chunks.get(file_id, [])
+            top = heapq.nlargest(
+                _MAX_CHUNKS_PER_RESULT,
+                chunks_by_file.get(file_id, []),
+                key=lambda sp: (sp[0], -sp[1]),
+            )
             results.append(
                 DocumentSearchResult(
                     file_id=rec.file_id,
@@ -177,26 +618,52 @@ class JsonDocumentIndexProvider(DocumentIndexProvider):
                     date=rec.date,
                     description=rec.description,
                     entities=rec.entities,
-                    matching_chunks=top_chunks,
+                    # Only the returned chunks are read from the blobs
+                    matching_chunks=[self._materialize(file_id, refs[p]) for _, p in top],
                     score=total_score,
                 )
             )
-
-        results.sort(key=lambda r: r.score, reverse=True)
         return results
 
     def remove_document(self, file_id: str) -> bool:
-        if file_id not in self._records:
-            return False
-        del self._records[file_id]
-        self._save_index()
+        with self._lock:
+            self._catch_up()
+            if file_id not in self._records:
+                return False
+            self._store.append({"op": "del", "file_id": file_id})
+            self._catch_up()
         logger.info("document_removed", file_id=file_id)
         return True
 
     def is_indexed(self, file_id: str) -> bool:
+        self._catch_up()
         return file_id in self._records
 
 
-def _tokenize(text: str) -> list[str]:
-    """Tokenize a query string into lowercase words."""
-    return [w for w in re.findall(r"\w+", text.lower()) if len(w) >= 2]
+def _rrf(rankings: list[Iterable[tuple[str, float]]]) -> dict[str, float]:
+    """Reciprocal rank fusion: each ranking adds 1 / (k + rank) per key."""
+    fused: dict[str, float] = {}
+    for ranking in rankings:
+        best = heapq.nlargest(_HYBRID_CANDIDATES, ranking, key=lambda kv: kv[1])
+        for rank, (key, _) in enumerate(best, start=1):
+            fused[key] = fused.get(key, 0.0) + 1.0 / (_RRF_K + rank)
+    return fused
+
+
+def _meta_text(rec: DocumentRecord) -> str:
+    return f"{rec.title} {rec.filename} {rec.description}"
+
+
+def _put(rec: DocumentRecord, chunks: list[Any]) -> dict[str, Any]:
+    """A ``put`` entry: record metadata plus chunk positions, without chunk text."""
+    data = rec.model_dump(exclude={"chunks"})
+    data["chunks"] = [
+        {
+            "chunk_id": c.chunk_id,
+            "chunk_index": c.chunk_index,
+            "char_start": c.char_start,
+            "char_end": c.char_end,
+        }
+        for c in chunks
+    ]
+    return {"op": "put", "record": data}
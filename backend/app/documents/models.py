@@ -17,6 +17,21 @@ class DocumentChunk(BaseModel):
     char_end: int
 
 
+class PreparedDocument(BaseModel):
+    """A document's metadata and already-chunked text, ready to be indexed."""
+
+    file_id: str
+    filename: str
+    title: str
+    doc_type: str
+    mime_type: str
+    date: str
+    description: str
+    entities: list[EntityAssociation] = Field(default_factory=list)
+    # (chunk_text, char_start, char_end), as returned by ``chunk_text``
+    chunks: list[tuple[str, int, int]] = Field(default_factory=list)
+
+
 class DocumentRecord(BaseModel):
     file_id: str
     filename: str
@@ -52,3 +67,15 @@ class DocumentListItem(BaseModel):
     entities: list[EntityAssociation] = Field(default_factory=list)
     chunk_count: int = 0
     indexed_at: str = ""
+
+
+class IngestionStatus(BaseModel):
+    state: str = "idle"  # idle, running, completed, failed
+    total: int = 0
+    indexed: int = 0
+    failed: int = 0
+    started_at: str | None = None
+    finished_at: str | None = None
+    elapsed_seconds: float = 0.0
+    eta_seconds: float | None = None
+    error: str | None = None
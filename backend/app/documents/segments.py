@@ -0,0 +1,393 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator
+
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# 1: chunk texts inline in the JSON lines; 2: texts in a per-segment blob
+FORMAT_VERSION = 2
+
+MANIFEST_NAME = "manifest.json"
+SEGMENTS_DIR = "segments"
+# flock targets: manifest changes are serialized across processes; one compacts at a time
+MANIFEST_LOCK_NAME = "manifest.lock"
+COMPACTION_LOCK_NAME = "compaction.lock"
+
+Span = tuple[int, int]
+
+
+class SegmentStore:
+    """Append-only segments listed by a small manifest.
+
+    Each segment is a JSON-lines file of entries plus a ``.blob`` file of
+    UTF-8 texts; an entry written with texts carries their ``spans``
+    (byte offset, length) into the blob. Writes append to the active
+    segment, so their cost is proportional to the entry written. When the
+    active segment reaches ``max_segment_bytes`` it is sealed and a new one
+    started. The manifest (segment order plus a name counter) is the only
+    file ever rewritten, always via an atomic rename. Replaying the segments
+    in manifest order rebuilds the current state; later entries win.
+
+    Blobs are read through read-only memory maps, so texts stay in the
+    shared page cache until a caller asks for them.
+
+    Several processes (uvicorn workers) may share one directory. Every
+    manifest change and append happens under an ``flock`` on
+    ``manifest.lock``, after re-reading the manifest, so all processes
+    append to the same active segment and none overwrites another's
+    segment list; ``exclusive`` holds that lock across a caller's own
+    read-modify-write (e.g. a format migration at startup). Readers
+    follow the log with ``snapshot`` and ``read_entries``. Each store holds
+    a shared ``flock`` on every segment it may read; segments dropped by
+    ``replace`` are listed as ``retired`` and their files are deleted only
+    once no store holds them any more.
+    """
+
+    def __init__(self, root: Path, max_segment_bytes: int):
+        self._root = Path(root)
+        self._segments_dir = self._root / SEGMENTS_DIR
+        self._segments_dir.mkdir(parents=True, exist_ok=True)
+        self._manifest_path = self._root / MANIFEST_NAME
+        self._max_segment_bytes = max_segment_bytes
+        # Reentrant, so ``exclusive`` callers can use the other methods
+        self._lock = threading.RLock()
+        self._lock_depth = 0
+        self._maps: dict[str, mmap.mmap] = {}
+        self._segments: list[str] = []
+        # Replaced segments whose files some store may still be reading
+        self._retired: list[str] = []
+        # Segment → open file carrying this store's shared flock
+        self._held: dict[str, IO[bytes]] = {}
+        self._next_id = 1
+        self._active_size = 0
+        self.version = FORMAT_VERSION
+        self._lock_file = open(self._root / MANIFEST_LOCK_NAME, "a+")
+
+    @property
+    def segments(self) -> list[str]:
+        return list(self._segments)
+
+    @contextmanager
+    def exclusive(self) -> Iterator[bool]:
+        """Hold the manifest lock with the manifest freshly read.
+
+        Yields whether a manifest already existed; if not, an empty one has
+        just been created, and no other process sees it before this block
+        ends. Other processes' appends and manifest changes wait meanwhile.
+        """
+        with self._locked():
+            existed = self._manifest_path.exists()
+            self._refresh()
+            yield existed
+
+    def snapshot(self) -> tuple[list[str], set[str]]:
+        """The listed segments, and those this store holds but the manifest dropped.
+
+        A dropped (stale) segment means another ``replace`` has rewritten
+        part of the log; callers rebuild their view from a full replay, then
+        ``release`` the stale segments.
+        """
+        with self._locked():
+            self._refresh()
+            return list(self._segments), set(self._held) - set(self._segments)
+
+    def size(self, segment: str) -> int:
+        return self._size(segment)
+
+    def read_entries(self, segment: str, start: int = 0) -> tuple[list[dict[str, Any]], int]:
+        """Entries of ``segment`` from byte ``start``, and the offset after the last one.
+
+        Only complete lines are read, so an append still being written by
+        another process is picked up by the next call.
+        """
+        try:
+            with open(self._segments_dir / segment, "rb") as f:
+                f.seek(start)
+                data = f.read()
+        except FileNotFoundError:
+            logger.warning("document_segment_missing", segment=segment)
+            return [], start
+        end = data.rfind(b"\n") + 1
+        entries: list[dict[str, Any]] = []
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                # A crash mid-append leaves a torn line
+                logger.warning("document_segment_torn_line", segment=segment, offset=start)
+        return entries, start + end
+
+    def replay(self, segments: list[str] | None = None) -> Iterator[tuple[str, dict[str, Any]]]:
+        """Yield (segment, entry) for every entry in manifest order (or of ``segments``)."""
+        for name in list(self._segments if segments is None else segments):
+            entries, _ = self.read_entries(name)
+            for entry in entries:
+                yield name, entry
+
+    def append(self, entry: dict[str, Any], texts: list[str] | None = None) -> tuple[str, list[Span]]:
+        """Append one entry (and its texts) and return the segment and text spans."""
+        segment, spans = self.append_many([(entry, texts or [])])
+        return segment, spans[0]
+
+    def append_many(
+        self, items: list[tuple[dict[str, Any], list[str]]],
+    ) -> tuple[str, list[list[Span]]]:
+        """Append several entries with one write per file; returns the segment and spans."""
+        with self._locked():
+            # Another process may have rolled the active segment
+            self._refresh()
+            name = self._segments[-1]
+            all_spans: list[list[Span]] = []
+            lines: list[str] = []
+            # Texts first: a crash in between only leaves unreferenced blob bytes
+            with open(self._segments_dir / _blob_name(name), "ab") as blob:
+                for entry, texts in items:
+                    spans = _write_texts(blob, texts) if texts else []
+                    all_spans.append(spans)
+                    if texts:
+                        entry = {**entry, "spans": spans}
+                    lines.append(json.dumps(entry, separators=(",", ":")) + "\n")
+                blob_size = blob.seek(0, os.SEEK_END)
+            with open(self._segments_dir / name, "a") as f:
+                f.write("".join(lines))
+                f.flush()
+                # Sizes from the files, so other processes' appends count too
+                self._active_size = blob_size + os.fstat(f.fileno()).st_size
+            if self._active_size >= self._max_segment_bytes:
+                self._roll()
+        return name, all_spans
+
+    def seal(self) -> list[str]:
+        """Start a new active segment (if the current one has data) and return the sealed ones."""
+        with self._locked():
+            self._refresh()
+            active = self._segments[-1]
+            if self._size(active) + self._size(_blob_name(active)) > 0:
+                self._roll()
+            return self._segments[:-1]
+
+    def release(self, segments: Iterable[str]) -> None:
+        """Stop holding ``segments`` and delete retired files no store holds."""
+        with self._locked():
+            for name in segments:
+                held = self._held.pop(name, None)
+                if held is not None:
+                    held.close()
+                # Don't close: a reader may still hold the map, which outlives the unlink
+                self._maps.pop(name, None)
+            self._refresh()
+            self._sweep_retired()
+
+    @contextmanager
+    def compaction(self) -> Iterator[bool]:
+        """Yield True if this process may compact now; False while another does."""
+        with open(self._root / COMPACTION_LOCK_NAME, "a+") as f:
+            yield _flock(f, shared=False, block=False)
+
+    def write_segment(
+        self, items: Iterable[tuple[dict[str, Any], list[str]]],
+    ) -> tuple[str, list[list[Span]]]:
+        """Write a complete segment that is not yet listed in the manifest.
+
+        Returns its name and the text spans of each item, in order.
+        """
+        with self._locked():
+            self._refresh()
+            name = self._new_segment_name()
+            self._write_manifest()
+        final = self._segments_dir / name
+        tmp = final.with_suffix(".tmp")
+        blob_final = self._segments_dir / _blob_name(name)
+        blob_tmp = blob_final.with_suffix(".blob-tmp")
+        all_spans: list[list[Span]] = []
+        with open(tmp, "w") as f, open(blob_tmp, "wb") as blob:
+            for entry, texts in items:
+                spans = _write_texts(blob, texts)
+                all_spans.append(spans)
+                f.write(json.dumps({**entry, "spans": spans}, separators=(",", ":")) + "\n")
+        os.replace(blob_tmp, blob_final)
+        os.replace(tmp, final)
+        return name, all_spans
+
+    def replace(self, old: list[str], new: str) -> None:
+        """Swap ``old`` segments for ``new`` (placed first) and retire them.
+
+        Their files stay until every store has released them; this one
+        still holds them until the caller calls ``release``.
+        """
+        dropped = set(old)
+        with self._locked():
+            # Keep segments other processes rolled since ours was sealed
+            self._refresh()
+            self._segments = [new] + [s for s in self._segments if s not in dropped]
+            self._retired += [s for s in old if s not in self._retired]
+            self.version = FORMAT_VERSION
+            self._write_manifest()
+            self._hold(new)
+
+    def read_text(self, segment: str, offset: int, length: int) -> str:
+        if length == 0:
+            return ""
+        end = offset + length
+        view = self._maps.get(segment)
+        if view is None or end > len(view):
+            # First read, or the active blob has grown since it was mapped
+            with self._lock:
+                view = self._maps.get(segment)
+                if view is None or end > len(view):
+                    with open(self._segments_dir / _blob_name(segment), "rb") as f:
+                        view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._maps[segment] = view
+        return view[offset:end].decode("utf-8")
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock:
+            if self._lock_depth == 0:
+                _flock(self._lock_file, shared=False)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0:
+                    _flock(self._lock_file, unlock=True)
+
+    def _refresh(self) -> None:
+        """Pick up manifest changes made by other processes; needs ``_locked``."""
+        self._read_manifest()
+        if not self._segments:
+            self._roll()
+        self._hold_listed()
+
+    def _hold_listed(self) -> None:
+        for name in self._segments:
+            self._hold(name)
+
+    def _hold(self, name: str) -> None:
+        if name in self._held:
+            return
+        try:
+            f = open(self._segments_dir / name, "rb")
+        except FileNotFoundError:
+            return
+        _flock(f, shared=True)
+        self._held[name] = f
+
+    def _sweep_retired(self) -> None:
+        """Delete retired segments no store holds; needs ``_locked``."""
+        remaining = [
+            name for name in self._retired
+            if name in self._held or not self._delete_unheld(name)
+        ]
+        if remaining != self._retired:
+            self._retired = remaining
+            self._write_manifest()
+
+    def _delete_unheld(self, name: str) -> bool:
+        path = self._segments_dir / name
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            f = None
+        try:
+            if f is not None and not _flock(f, shared=False, block=False):
+                return False
+            for p in (path, self._segments_dir / _blob_name(name)):
+                try:
+                    os.remove(p)
+                except FileNotFoundError:
+                    pass
+        finally:
+            if f is not None:
+                f.close()
+        logger.info("document_segment_deleted", segment=name)
+        return True
+
+    def _roll(self) -> None:
+        name = self._new_segment_name()
+        (self._segments_dir / name).touch()
+        (self._segments_dir / _blob_name(name)).touch()
+        self._segments.append(name)
+        self._active_size = 0
+        self._write_manifest()
+        self._hold(name)
+
+    def _new_segment_name(self) -> str:
+        while True:
+            name = f"seg-{self._next_id:06d}.jsonl"
+            self._next_id += 1
+            # Never reuse a name, even one left behind without a manifest entry
+            if not (self._segments_dir / name).exists():
+                return name
+
+    def _read_manifest(self) -> bool:
+        if not self._manifest_path.exists():
+            return False
+        with open(self._manifest_path) as f:
+            manifest = json.load(f)
+        self._segments = list(manifest.get("segments", []))
+        self._retired = list(manifest.get("retired", []))
+        self._next_id = int(manifest.get("next_segment", 1))
+        self.version = int(manifest.get("version", 1))
+        return True
+
+    def _write_manifest(self) -> None:
+        tmp = self._manifest_path.with_suffix(".tmp")
+        with open(tmp, "w") as f:
+            json.dump(
+                {
+                    "version": self.version,
+                    "segments": self._segments,
+                    "next_segment": self._next_id,
+                    "retired": self._retired,
+                },
+                f,
+            )
+        os.replace(tmp, self._manifest_path)
+
+    def _size(self, name: str) -> int:
+        try:
+            return (self._segments_dir / name).stat().st_size
+        except FileNotFoundError:
+            return 0
+
+
+def _flock(f: IO[Any], shared: bool = False, block: bool = True, unlock: bool = False) -> bool:
+    """``flock`` ``f``; returns False if ``block`` is off and another holder conflicts."""
+    import fcntl
+
+    if unlock:
+        op = fcntl.LOCK_UN
+    else:
+        op = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if block else fcntl.LOCK_NB)
+    try:
+        fcntl.flock(f, op)
+    except BlockingIOError:
+        return False
+    return True
+
+
+def _blob_name(segment: str) -> str:
+    return segment.rsplit(".", 1)[0] + ".blob"
+
+
+def _write_texts(blob: Any, texts: list[str]) -> list[Span]:
+    offset = blob.seek(0, os.SEEK_END)
+    spans: list[Span] = []
+    for text in texts:
+        data = text.encode("utf-8")
+        blob.write(data)
+        spans.append((offset, len(data)))
+        offset += len(data)
+    return spans
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import numpy as np
+
+_INITIAL_CAPACITY = 1024
+
+
+class VectorIndex:
+    """Key → unit vector store with exact (brute-force) cosine search.
+
+    Vectors live in one contiguous float32 matrix that grows by doubling;
+    removal swaps the last row into the freed slot, so the live rows are
+    always ``matrix[:len(self)]`` and a search is a single matrix-vector
+    product. Not thread-safe; callers serialize writes.
+    """
+
+    def __init__(self, dim: int) -> None:
+        self.dim = dim
+        self._matrix = np.zeros((_INITIAL_CAPACITY, dim), dtype=np.float32)
+        self._keys: list[str] = []
+        self._rows: dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    def add_many(self, keys: list[str], vectors: np.ndarray) -> None:
+        for key in keys:
+            self.remove(key)
+        n = len(self._keys)
+        needed = n + len(keys)
+        if needed > len(self._matrix):
+            capacity = max(needed, 2 * len(self._matrix))
+            grown = np.zeros((capacity, self.dim), dtype=np.float32)
+            grown[:n] = self._matrix[:n]
+            self._matrix = grown
+        self._matrix[n:needed] = vectors
+        for offset, key in enumerate(keys):
+            self._rows[key] = n + offset
+            self._keys.append(key)
+
+    def remove(self, key: str) -> None:
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self._keys) - 1
+        if row != last:
+            moved = self._keys[last]
+            self._matrix[row] = self._matrix[last]
+            self._keys[row] = moved
+            self._rows[moved] = row
+        self._keys.pop()
+
+    def search(
+        self,
+        vector: np.ndarray,
+        k: int,
+        keys: set[str] | None = None,
+        min_score: float = 0.0,
+    ) -> list[tuple[str, float]]:
+        """The ``k`` most similar keys (optionally within ``keys``), best first."""
+        if keys is None:
+            rows = None
+            scores = self._matrix[:len(self._keys)] @ vector
+        else:
+            rows = np.fromiter((self._rows[key] for key in keys if key in self._rows), dtype=np.int64)
+            scores = self._matrix[rows] @ vector
+        if k < len(scores):
+            top = np.argpartition(-scores, k)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        results: list[tuple[str, float]] = []
+        for i in top:
+            score = float(scores[i])
+            if score <= min_score:
+                break
+            results.append((self._keys[int(rows[i] if rows is not None else i)], score))
+        return results
@@ -4,10 +4,8 @@ from __future__ import annotations
 import io
 from typing import Any
 
-import matplotlib
-matplotlib.use("Agg")  # non-interactive backend
-import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
+from matplotlib.figure import Figure
 
 
 HIGHLIGHT_COLOR = "#e86319"
@@ -110,7 +108,9 @@ def render_chart_image(
             else:
                 bar_colors.append(_hex_to_rgba(default_color, 0.8))
 
-    fig, ax = plt.subplots(figsize=(7, 3.5), dpi=150)
+    # A standalone Figure (not pyplot) so schedules can render on worker threads
+    fig = Figure(figsize=(7, 3.5), dpi=150)
+    ax = fig.subplots()
 
     if chart_type == "line":
         ax.plot(range(len(labels)), values, color=default_color, linewidth=2, marker="o", markersize=4)
@@ -153,6 +153,5 @@ def render_chart_image(
 
     buf = io.BytesIO()
     fig.savefig(buf, format="png", bbox_inches="tight", facecolor="white")
-    plt.close(fig)
     buf.seek(0)
     return buf.read()
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+from app.email.models import EmailLog
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+LOCK_NAME = ".lock"
+
+
+class _LogRef(NamedTuple):
+    file: str
+    offset: int
+    length: int
+
+
+class JsonlDeliveryLog:
+    """Append-only delivery log in rotated JSON-lines files.
+
+    Each entry is one line appended to the active file, so a write costs the
+    size of the entry. The active file is sealed once it exceeds
+    ``max_file_bytes`` or is older than ``max_file_age_seconds``. An in-memory
+    index maps each schedule to the byte ranges of its entries, so ``get``
+    reads only that schedule's lines. Retention drops whole sealed files
+    whose newest entry is past the cutoff.
+
+    Several processes may share one directory: writes hold an ``flock`` on
+    ``.lock`` and take their offsets from the file itself, and every call
+    first indexes whatever other processes appended, rolled or pruned.
+
+    File names carry a sequence number and their creation time:
+    ``log-000042-1767258000.jsonl``.
+    """
+
+    def __init__(self, log_dir: Path, max_file_bytes: int, max_file_age_seconds: float) -> None:
+        self._dir = Path(log_dir)
+        self.existed = self._dir.exists()
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._max_bytes = max_file_bytes
+        self._max_age = max_file_age_seconds
+        self._lock = threading.Lock()
+        self._lock_file = open(self._dir / LOCK_NAME, "a+")
+        self._index: dict[str, list[_LogRef]] = {}
+        # file → newest sent_at in it, oldest file first
+        self._newest: dict[str, str] = {}
+        self._entries: dict[str, int] = {}
+        # file → offset just past the last entry indexed from it
+        self._indexed: dict[str, int] = {}
+        self._next_seq = 1
+        with self._locked():
+            self._catch_up()
+        logger.info("delivery_log_loaded", files=len(self._newest), schedules=len(self._index))
+
+    @property
+    def files(self) -> list[str]:
+        with self._locked():
+            self._catch_up()
+            return list(self._newest)
+
+    def append(self, log: EmailLog) -> None:
+        self.append_many([log])
+
+    def append_many(self, logs: list[EmailLog]) -> None:
+        data = [(log, (log.model_dump_json() + "\n").encode("utf-8")) for log in logs]
+        with self._locked():
+            self._catch_up()
+            self._drop_torn_tail()
+            if self._needs_rotation():
+                self._roll()
+            name = next(reversed(self._newest))
+            with open(self._dir / name, "ab") as f:
+                offset = f.tell()
+                f.write(b"".join(line for _, line in data))
+            for log, line in data:
+                self._index.setdefault(log.schedule_id, []).append(_LogRef(name, offset, len(line)))
+                offset += len(line)
+            self._indexed[name] = offset
+            self._entries[name] += len(logs)
+            newest = max(log.sent_at for log in logs)
+            if newest > self._newest[name]:
+                self._newest[name] = newest
+
+    def get(self, schedule_id: str) -> list[EmailLog]:
+        """Entries for one schedule, newest first."""
+        with self._locked():
+            self._catch_up()
+            refs = list(self._index.get(schedule_id, []))
+        logs: list[EmailLog] = []
+        by_file: dict[str, list[_LogRef]] = {}
+        for ref in refs:
+            by_file.setdefault(ref.file, []).append(ref)
+        for name, file_refs in by_file.items():
+            try:
+                with open(self._dir / name, "rb") as f:
+                    for ref in file_refs:
+                        f.seek(ref.offset)
+                        logs.append(EmailLog.model_validate_json(f.read(ref.length)))
+            except FileNotFoundError:
+                # Removed by retention since the refs were copied
+                continue
+        logs.sort(key=lambda l: l.sent_at, reverse=True)
+        return logs
+
+    def read_all(self) -> list[EmailLog]:
+        """Every entry, oldest file first (for migrating to another store)."""
+        logs: list[EmailLog] = []
+        for name in self.files:
+            with open(self._dir / name, "rb") as f:
+                for line in f:
+                    if line.endswith(b"\n"):
+                        logs.append(EmailLog.model_validate_json(line))
+        return logs
+
+    def prune(self, cutoff: str) -> int:
+        """Delete sealed files whose newest entry is older than ``cutoff``; returns entries removed."""
+        with self._locked():
+            self._catch_up()
+            sealed = list(self._newest)[:-1]
+            expired = {name for name in sealed if self._newest[name] < cutoff}
+            if not expired:
+                return 0
+            removed = sum(self._entries[name] for name in expired)
+            self._forget(expired)
+            for name in expired:
+                try:
+                    os.remove(self._dir / name)
+                except FileNotFoundError:
+                    pass
+        logger.info("delivery_log_pruned", files=len(expired), entries=removed)
+        return removed
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        import fcntl
+
+        with self._lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _catch_up(self) -> None:
+        """Index files and entries written by other processes; needs ``_locked``."""
+        on_disk = sorted(p.name for p in self._dir.glob("log-*.jsonl"))
+        gone = set(self._newest) - set(on_disk)
+        if gone:
+            self._forget(gone)
+        for name in on_disk:
+            if name not in self._newest:
+                self._track(name)
+            if (self._dir / name).stat().st_size > self._indexed[name]:
+                self._scan(name)
+
+    def _needs_rotation(self) -> bool:
+        if not self._newest:
+            return True
+        name = next(reversed(self._newest))
+        size = self._indexed[name]
+        if size >= self._max_bytes:
+            return True
+        created = int(name.rsplit("-", 1)[1].split(".")[0])
+        return size > 0 and time.time() - created >= self._max_age
+
+    def _roll(self) -> None:
+        name = f"log-{self._next_seq:06d}-{int(time.time())}.jsonl"
+        (self._dir / name).touch()
+        self._track(name)
+
+    def _track(self, name: str) -> None:
+        self._next_seq = max(self._next_seq, int(name.split("-")[1]) + 1)
+        self._newest[name] = ""
+        self._entries[name] = 0
+        self._indexed[name] = 0
+
+    def _forget(self, names: set[str]) -> None:
+        for name in names:
+            del self._newest[name]
+            del self._entries[name]
+            del self._indexed[name]
+        for schedule_id in list(self._index):
+            kept = [ref for ref in self._index[schedule_id] if ref.file not in names]
+            if kept:
+                self._index[schedule_id] = kept
+            else:
+                del self._index[schedule_id]
+
+    def _drop_torn_tail(self) -> None:
+        """Truncate a partial line left in the active file by a crash; needs ``_locked``."""
+        if not self._newest:
+            return
+        name = next(reversed(self._newest))
+        path = self._dir / name
+        if path.stat().st_size > self._indexed[name]:
+            # Writers hold the lock for a whole append, so this tail is not in progress
+            logger.warning("delivery_log_torn_line", file=name, offset=self._indexed[name])
+            os.truncate(path, self._indexed[name])
+
+    def _scan(self, name: str) -> None:
+        """Index one file's complete entries past what is already indexed."""
+        offset = self._indexed[name]
+        newest = self._newest[name]
+        count = 0
+        with open(self._dir / name, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # A crash mid-append leaves at most a torn final line
+                    break
+                length = len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    logger.warning("delivery_log_torn_line", file=name, offset=offset)
+                    offset += length
+                    continue
+                self._index.setdefault(entry["schedule_id"], []).append(_LogRef(name, offset, length))
+                newest = max(newest, entry["sent_at"])
+                count += 1
+                offset += length
+        self._newest[name] = newest
+        self._entries[name] += count
+        self._indexed[name] = offset
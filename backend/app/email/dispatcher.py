@@ -0,0 +1,188 @@
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from app.email.models import EmailSchedule
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# Renders and sends one schedule; returns an error message, or None when sent
+Deliver = Callable[[EmailSchedule], str | None]
+
+
+class _Job:
+    def __init__(self, schedule: EmailSchedule, domains: tuple[str, ...]) -> None:
+        self.schedule = schedule
+        self.domains = domains
+        self.lock = threading.Lock()
+        # Set once the outcome is recorded, or once the job has timed out
+        self.settled = threading.Event()
+        self.started = False
+        self.finished = False
+        self.timed_out = False
+        self.timer: threading.Timer | None = None
+
+
+class ScheduleDispatcher:
+    """Sends due schedules on a bounded pool of worker threads.
+
+    - At most ``workers`` schedules are rendered and sent at once.
+    - At most ``domain_concurrency`` of them may address the same recipient
+      domain (0 disables the limit), so one mail server is not flooded.
+      Jobs wait for their domains *before* taking a worker, so a busy
+      domain never holds up sends to other domains.
+    - A job not finished within ``job_timeout`` seconds of starting is
+      given up and reported through ``on_timeout``. Time spent queued for a
+      worker or domain slot does not count: a job that never ran cannot
+      have timed out. Threads cannot be killed, so a running schedule stays
+      in flight until its worker returns, and its late result goes to
+      ``on_late_result`` instead of ``record``.
+    - A schedule that is still in flight is never submitted again, so
+      callers may simply resubmit everything that is due.
+
+    ``deliver`` does the work without touching the store; ``record`` then
+    writes the outcome (``None`` for sent, else the error message).
+    ``on_late_result`` takes the same arguments.
+    """
+
+    def __init__(
+        self,
+        deliver: Deliver,
+        record: Callable[[EmailSchedule, str | None], None],
+        on_timeout: Callable[[EmailSchedule], None],
+        on_late_result: Callable[[EmailSchedule, str | None], None],
+        workers: int,
+        domain_concurrency: int,
+        job_timeout: float,
+    ) -> None:
+        self._deliver = deliver
+        self._record = record
+        self._on_timeout = on_timeout
+        self._on_late_result = on_late_result
+        self._workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="schedule")
+        self._domain_limit = domain_concurrency
+        self._timeout = job_timeout
+        self._lock = threading.Lock()
+        self._in_flight: set[str] = set()
+        # Admitted jobs waiting for a worker or a domain slot, oldest first
+        self._pending: list[_Job] = []
+        self._running = 0
+        self._domain_active: dict[str, int] = {}
+        self._closed = False
+
+    @property
+    def in_flight(self) -> set[str]:
+        with self._lock:
+            return set(self._in_flight)
+
+    def submit(self, schedules: list[EmailSchedule]) -> list[_Job]:
+        """Admit every schedule that is not already in flight; does not wait."""
+        jobs: list[_Job] = []
+        with self._lock:
+            for schedule in schedules:
+                if schedule.schedule_id in self._in_flight:
+                    logger.debug("schedule_already_in_flight", schedule_id=schedule.schedule_id)
+                    continue
+                self._in_flight.add(schedule.schedule_id)
+                job = _Job(schedule, self._domains_of(schedule.recipients))
+                self._pending.append(job)
+                jobs.append(job)
+        self._pump()
+        return jobs
+
+    def run(self, schedules: list[EmailSchedule]) -> int:
+        """Submit ``schedules`` and wait until each has been recorded or timed out."""
+        jobs = self.submit(schedules)
+        for job in jobs:
+            job.settled.wait()
+        return len(jobs)
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._closed = True
+            self._pending = []
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _domains_of(self, recipients: list[str]) -> tuple[str, ...]:
+        if self._domain_limit <= 0:
+            return ()
+        return tuple(sorted({r.rsplit("@", 1)[-1].strip().lower() for r in recipients}))
+
+    def _pump(self) -> None:
+        """Start pending jobs, oldest first, while workers and their domains have room."""
+        with self._lock:
+            if self._closed:
+                return
+            started: list[_Job] = []
+            waiting: list[_Job] = []
+            for job in self._pending:
+                if self._running < self._workers and all(
+                    self._domain_active.get(d, 0) < self._domain_limit for d in job.domains
+                ):
+                    self._running += 1
+                    for d in job.domains:
+                        self._domain_active[d] = self._domain_active.get(d, 0) + 1
+                    job.started = True
+                    started.append(job)
+                else:
+                    waiting.append(job)
+            self._pending = waiting
+            for job in started:
+                # The clock starts with the send, not while queued
+                if self._timeout > 0:
+                    job.timer = threading.Timer(self._timeout, self._expire, (job,))
+                    job.timer.daemon = True
+                    job.timer.start()
+                self._executor.submit(self._run, job)
+
+    def _release(self, job: _Job) -> None:
+        with self._lock:
+            self._running -= 1
+            for d in job.domains:
+                self._domain_active[d] -= 1
+                if not self._domain_active[d]:
+                    del self._domain_active[d]
+            self._in_flight.discard(job.schedule.schedule_id)
+        self._pump()
+
+    def _run(self, job: _Job) -> None:
+        schedule = job.schedule
+        try:
+            try:
+                error = self._deliver(schedule)
+            except Exception as e:
+                logger.exception("schedule_send_error", schedule_id=schedule.schedule_id)
+                error = str(e)
+            with job.lock:
+                late = job.timed_out
+                job.finished = True
+            if job.timer is not None:
+                job.timer.cancel()
+            if late:
+                logger.warning("schedule_late_result", schedule_id=schedule.schedule_id, error=error)
+                self._on_late_result(schedule, error)
+            else:
+                self._record(schedule, error)
+        except Exception:
+            logger.exception("schedule_dispatch_error", schedule_id=schedule.schedule_id)
+        finally:
+            self._release(job)
+            job.settled.set()
+
+    def _expire(self, job: _Job) -> None:
+        with job.lock:
+            if job.finished:
+                return
+            job.timed_out = True
+        # Stays in flight until its worker returns, so it is not sent twice
+        logger.warning("schedule_job_timeout", schedule_id=job.schedule.schedule_id, timeout=self._timeout)
+        try:
+            self._on_timeout(job.schedule)
+        except Exception:
+            logger.exception("schedule_dispatch_error", schedule_id=job.schedule.schedule_id)
+        finally:
+            job.settled.set()
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 from app.config.settings import settings
-from app.email.interfaces import EmailProvider, ScheduleProvider
+from app.email.interfaces import EmailProvider, LeaderLock, ScheduleProvider
 
 _email_provider: EmailProvider | None = None
 _schedule_provider: ScheduleProvider | None = None
+_leader_lock: LeaderLock | None = None
 
 
 def get_email_provider() -> EmailProvider:
@@ -26,6 +27,30 @@ def get_schedule_provider() -> ScheduleProvider:
     if _schedule_provider is not None:
         return _schedule_provider
 
-    from app.email.json_schedule_provider import JsonScheduleProvider
-    _schedule_provider = JsonScheduleProvider(settings.SCHEDULES_DIR)
+    if settings.SCHEDULE_PROVIDER == "json":
+        from app.email.json_schedule_provider import JsonScheduleProvider
+        _schedule_provider = JsonScheduleProvider(settings.SCHEDULES_DIR)
+    else:
+        from app.email.sqlite_schedule_provider import SqliteScheduleProvider
+        _schedule_provider = SqliteScheduleProvider(settings.SCHEDULES_DIR)
     return _schedule_provider
+
+
+def get_leader_lock() -> LeaderLock:
+    global _leader_lock
+    if _leader_lock is not None:
+        return _leader_lock
+
+    from pathlib import Path
+
+    schedules_dir = Path(settings.SCHEDULES_DIR).resolve()
+    if settings.SCHEDULER_LOCK_BACKEND == "sqlite":
+        from app.email.leader_lock import SqliteLeaderLock
+        _leader_lock = SqliteLeaderLock(schedules_dir / "leader.db", settings.SCHEDULER_LEASE_SECONDS)
+    elif settings.SCHEDULER_LOCK_BACKEND == "none":
+        from app.email.leader_lock import NoLeaderLock
+        _leader_lock = NoLeaderLock()
+    else:
+        from app.email.leader_lock import FileLeaderLock
+        _leader_lock = FileLeaderLock(schedules_dir / "scheduler.lock")
+    return _leader_lock
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from typing import Any
 
 from app.email.models import EmailLog, EmailSchedule, EmailScheduleCreate, EmailScheduleUpdate
 
@@ -38,6 +39,10 @@ class ScheduleProvider(ABC):
     def update_schedule(self, schedule_id: str, update: EmailScheduleUpdate) -> EmailSchedule | None:
         """Update a schedule. Returns None if not found."""
 
+    @abstractmethod
+    def update_fields(self, schedule_id: str, fields: dict[str, Any]) -> EmailSchedule | None:
+        """Set arbitrary schedule fields (e.g. next_run_at, retry_count) in one write."""
+
     @abstractmethod
     def delete_schedule(self, schedule_id: str) -> bool:
         """Delete a schedule. Returns True if deleted."""
@@ -46,6 +51,10 @@ class ScheduleProvider(ABC):
     def get_due_schedules(self) -> list[EmailSchedule]:
         """Return active schedules where next_run_at <= now."""
 
+    @abstractmethod
+    def next_due_at(self) -> str | None:
+        """Earliest next_run_at among active schedules, or None if there is none."""
+
     @abstractmethod
     def add_log(self, log: EmailLog) -> EmailLog:
         """Add a delivery log entry."""
@@ -53,3 +62,23 @@ class ScheduleProvider(ABC):
     @abstractmethod
     def get_logs(self, schedule_id: str) -> list[EmailLog]:
         """Get delivery logs for a schedule, sorted by sent_at desc."""
+
+    @abstractmethod
+    def prune_logs(self, before: str) -> int:
+        """Drop delivery logs older than ``before`` (ISO timestamp); returns how many.
+
+        Stores may keep entries past the cutoff until they can be removed
+        cheaply (e.g. whole log files).
+        """
+
+
+class LeaderLock(ABC):
+    """Lease that elects one process to run the scheduler."""
+
+    @abstractmethod
+    def acquire(self) -> bool:
+        """Take the lease if free or expired, or renew it if held. Returns True while leader."""
+
+    @abstractmethod
+    def release(self) -> None:
+        """Give the lease up so another process can take over right away."""
@@ -4,9 +4,13 @@ import json
 import uuid
 from datetime import datetime, timezone
 from pathlib import Path
+from typing import Any
 
+from app.config.settings import settings
+from app.email.delivery_log import JsonlDeliveryLog
 from app.email.interfaces import ScheduleProvider
 from app.email.models import EmailLog, EmailSchedule, EmailScheduleCreate, EmailScheduleUpdate
+from app.email.schedule_queue import get_schedule_queue
 from app.logging_config import get_logger
 
 logger = get_logger(__name__)
@@ -17,7 +21,19 @@ class JsonScheduleProvider(ScheduleProvider):
         self._dir = Path(schedules_dir).resolve()
         self._dir.mkdir(parents=True, exist_ok=True)
         self._schedules_path = self._dir / "schedules.json"
-        self._logs_path = self._dir / "delivery_log.json"
+        self._logs = JsonlDeliveryLog(
+            self._dir / "delivery_logs",
+            settings.DELIVERY_LOG_MAX_FILE_BYTES,
+            settings.DELIVERY_LOG_MAX_FILE_AGE_HOURS * 3600,
+        )
+        legacy_logs = self._dir / "delivery_log.json"
+        if not self._logs.existed and legacy_logs.exists():
+            # One-time import; the legacy file is left in place and ignored afterwards
+            with open(legacy_logs) as f:
+                logs = sorted((EmailLog(**l) for l in json.load(f)), key=lambda l: l.sent_at)
+            if logs:
+                self._logs.append_many(logs)
+            logger.info("delivery_log_migrated", count=len(logs))
         logger.info("schedule_provider_init", dir=str(self._dir))
 
     # -- internal helpers -------------------------------------------------------
@@ -33,17 +49,6 @@ class JsonScheduleProvider(ScheduleProvider):
         with open(self._schedules_path, "w") as f:
             json.dump([s.model_dump() for s in schedules], f, indent=2)
 
-    def _read_logs(self) -> list[EmailLog]:
-        if not self._logs_path.exists():
-            return []
-        with open(self._logs_path) as f:
-            data = json.load(f)
-        return [EmailLog(**l) for l in data]
-
-    def _write_logs(self, logs: list[EmailLog]) -> None:
-        with open(self._logs_path, "w") as f:
-            json.dump([l.model_dump() for l in logs], f, indent=2)
-
     @staticmethod
     def _now() -> str:
         return datetime.now(timezone.utc).isoformat()
@@ -69,6 +74,7 @@ class JsonScheduleProvider(ScheduleProvider):
         )
         schedules.append(saved)
         self._write_schedules(schedules)
+        get_schedule_queue().update(saved)
         logger.info("schedule_created", schedule_id=saved.schedule_id, owner=owner)
         return saved
 
@@ -103,6 +109,20 @@ class JsonScheduleProvider(ScheduleProvider):
                 data["updated_at"] = self._now()
                 schedules[i] = EmailSchedule(**data)
                 self._write_schedules(schedules)
+                get_schedule_queue().update(schedules[i])
+                return schedules[i]
+        return None
+
+    def update_fields(self, schedule_id: str, fields: dict[str, Any]) -> EmailSchedule | None:
+        schedules = self._read_schedules()
+        for i, s in enumerate(schedules):
+            if s.schedule_id == schedule_id:
+                data = s.model_dump()
+                data.update(fields)
+                data["updated_at"] = self._now()
+                schedules[i] = EmailSchedule(**data)
+                self._write_schedules(schedules)
+                get_schedule_queue().update(schedules[i])
                 return schedules[i]
         return None
 
@@ -112,6 +132,7 @@ class JsonScheduleProvider(ScheduleProvider):
         if len(new_schedules) == len(schedules):
             return False
         self._write_schedules(new_schedules)
+        get_schedule_queue().remove(schedule_id)
         logger.info("schedule_deleted", schedule_id=schedule_id)
         return True
 
@@ -123,16 +144,20 @@ class JsonScheduleProvider(ScheduleProvider):
             if s.status == "active" and s.next_run_at and s.next_run_at <= now
         ]
 
+    def next_due_at(self) -> str | None:
+        return min(
+            (s.next_run_at for s in self._read_schedules() if s.status == "active" and s.next_run_at),
+            default=None,
+        )
+
     # -- logs -------------------------------------------------------------------
 
     def add_log(self, log: EmailLog) -> EmailLog:
-        logs = self._read_logs()
-        logs.append(log)
-        self._write_logs(logs)
+        self._logs.append(log)
         return log
 
     def get_logs(self, schedule_id: str) -> list[EmailLog]:
-        logs = self._read_logs()
-        filtered = [l for l in logs if l.schedule_id == schedule_id]
-        filtered.sort(key=lambda l: l.sent_at, reverse=True)
-        return filtered
+        return self._logs.get(schedule_id)
+
+    def prune_logs(self, before: str) -> int:
+        return self._logs.prune(before)
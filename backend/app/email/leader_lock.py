@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import IO
+
+from app.email.interfaces import LeaderLock
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def _holder_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class NoLeaderLock(LeaderLock):
+    """Every process leads; for single-process deployments."""
+
+    def acquire(self) -> bool:
+        return True
+
+    def release(self) -> None:
+        pass
+
+
+class FileLeaderLock(LeaderLock):
+    """``flock`` on a lock file; for workers sharing one host.
+
+    The kernel drops the lock when the holding process exits, so there is
+    no lease to expire: a standby takes over on its next ``acquire``.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._file: IO[str] | None = None
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        import fcntl
+
+        with self._lock:
+            if self._file is not None:
+                return True
+            f = open(self._path, "a+")
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                f.close()
+                return False
+            # Holder id is for operators only; the flock is what counts
+            f.seek(0)
+            f.truncate()
+            f.write(_holder_id() + "\n")
+            f.flush()
+            self._file = f
+            return True
+
+    def release(self) -> None:
+        import fcntl
+
+        with self._lock:
+            if self._file is None:
+                return
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class SqliteLeaderLock(LeaderLock):
+    """Row lease in a SQLite database; the holder renews it before it expires.
+
+    A lease not renewed within ``lease_seconds`` (holder crashed or hung)
+    can be taken by any other process. Expiry uses wall-clock time, so
+    participating hosts need synchronized clocks.
+    """
+
+    def __init__(self, db_path: Path, lease_seconds: float, name: str = "scheduler") -> None:
+        self._db_path = Path(db_path)
+        self._db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lease = lease_seconds
+        self._name = name
+        self._holder = _holder_id()
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._lock = threading.Lock()
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS leases ("
+            " name TEXT PRIMARY KEY, holder TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    @property
+    def holder(self) -> str:
+        return self._holder
+
+    def acquire(self) -> bool:
+        now = time.time()
+        with self._lock:
+            try:
+                # Insert, or take over if it is ours already or has expired
+                self._conn.execute(
+                    "INSERT INTO leases (name, holder, expires_at) VALUES (?, ?, ?)"
+                    " ON CONFLICT(name) DO UPDATE SET holder = excluded.holder,"
+                    " expires_at = excluded.expires_at"
+                    " WHERE leases.holder = excluded.holder OR leases.expires_at < ?",
+                    (self._name, self._holder, now + self._lease, now),
+                )
+                row = self._conn.execute(
+                    "SELECT holder FROM leases WHERE name = ?", (self._name,),
+                ).fetchone()
+            except sqlite3.OperationalError as e:
+                # Database busy or unreachable: not leader until proven otherwise
+                logger.warning("leader_lease_error", error=str(e))
+                return False
+        return row is not None and row[0] == self._holder
+
+    def release(self) -> None:
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "DELETE FROM leases WHERE name = ? AND holder = ?", (self._name, self._holder),
+                )
+            except sqlite3.OperationalError as e:
+                logger.warning("leader_lease_error", error=str(e))
@@ -270,11 +270,7 @@ def _fetch_widget_data(
         if person:
             tickers_str = person.get("tickers", "")
             ticker_list = [t.strip() for t in tickers_str.split(";") if t.strip()]
-            stock_records = []
-            for ticker in ticker_list:
-                stock = provider.get_record("stocks", ticker)
-                if stock:
-                    stock_records.append(stock)
+            stock_records = provider.get_records("stocks", ticker_list)
             return _apply_in_memory_overrides(stock_records, filters, sort_by, sort_order)[:max_rows]
         return []
 
@@ -284,11 +280,9 @@ def _fetch_widget_data(
             tickers_str = person.get("tickers", "")
             ticker_list = [t.strip() for t in tickers_str.split(";") if t.strip()]
             sector_counts: dict[str, int] = {}
-            for ticker in ticker_list:
-                stock = provider.get_record("stocks", ticker)
-                if stock:
-                    sector = stock.get("sector", "Unknown")
-                    sector_counts[sector] = sector_counts.get(sector, 0) + 1
+            for stock in provider.get_records("stocks", ticker_list):
+                sector = stock.get("sector", "Unknown")
+                sector_counts[sector] = sector_counts.get(sector, 0) + 1
             return [{"sector": s, "count": str(c)} for s, c in sorted(sector_counts.items())][:max_rows]
         return []
 
@@ -317,8 +311,12 @@ def _apply_in_memory_overrides(
 ) -> list[dict[str, Any]]:
     """Apply filter/sort overrides to in-memory data."""
     result = data
-    for field, value in filters.items():
-        result = [r for r in result if str(r.get(field, "")).lower() == value.lower()]
+    if filters:
+        wanted = [(field, value.lower()) for field, value in filters.items()]
+        result = [
+            r for r in result
+            if all(str(r.get(field, "")).lower() == value for field, value in wanted)
+        ]
     if sort_by and result:
         reverse = sort_order == "desc"
         try:
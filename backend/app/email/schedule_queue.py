@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import threading
+from datetime import datetime, timezone
+
+from app.email.models import EmailSchedule
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def _parse(next_run_at: str) -> datetime:
+    when = datetime.fromisoformat(next_run_at)
+    return when if when.tzinfo else when.replace(tzinfo=timezone.utc)
+
+
+class ScheduleQueue:
+    """Min-heap of active schedules' ``next_run_at``, so the scheduler knows when to wake.
+
+    The store stays the source of truth; the queue only says *when* to look.
+    Changes replace a schedule's entry lazily: the old heap item is skipped
+    when it surfaces. Providers report every write, and a change that moves
+    the earliest due time forward wakes the scheduler loop early.
+
+    Writes may come from any thread; the wake-up is handed to the loop
+    with ``call_soon_threadsafe``.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._heap: list[tuple[datetime, str]] = []
+        self._due_at: dict[str, datetime] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._wake: asyncio.Event | None = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._due_at)
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Bind to the event loop whose ``wait`` calls should be woken."""
+        self._loop = loop
+        self._wake = asyncio.Event()
+
+    def rebuild(self, schedules: list[EmailSchedule]) -> None:
+        with self._lock:
+            self._due_at = {
+                s.schedule_id: _parse(s.next_run_at)
+                for s in schedules
+                if s.status == "active" and s.next_run_at
+            }
+            self._compact()
+        self.wake()
+        logger.info("schedule_queue_rebuilt", size=len(self._due_at))
+
+    def update(self, schedule: EmailSchedule) -> None:
+        if schedule.status != "active" or not schedule.next_run_at:
+            self.remove(schedule.schedule_id)
+            return
+        when = _parse(schedule.next_run_at)
+        with self._lock:
+            if self._due_at.get(schedule.schedule_id) == when:
+                return
+            head = self._peek()
+            self._due_at[schedule.schedule_id] = when
+            heapq.heappush(self._heap, (when, schedule.schedule_id))
+            if len(self._heap) > 2 * len(self._due_at) + 64:
+                self._compact()
+            earlier = head is None or when < head
+        if earlier:
+            self.wake()
+
+    def remove(self, schedule_id: str) -> None:
+        with self._lock:
+            self._due_at.pop(schedule_id, None)
+
+    def next_due_at(self) -> datetime | None:
+        with self._lock:
+            return self._peek()
+
+    def seconds_until_due(self, now: datetime | None = None) -> float | None:
+        """Seconds until the earliest schedule is due (0 if overdue); None when empty."""
+        head = self.next_due_at()
+        if head is None:
+            return None
+        now = now or datetime.now(timezone.utc)
+        return max(0.0, (head - now).total_seconds())
+
+    async def wait(self, timeout: float) -> bool:
+        """Sleep up to ``timeout`` seconds; returns True if woken early by a change."""
+        if self._wake is None:
+            await asyncio.sleep(timeout)
+            return False
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._wake.clear()
+
+    def wake(self) -> None:
+        """Wake a pending ``wait`` early; safe from any thread."""
+        loop, wake = self._loop, self._wake
+        if loop is None or wake is None or loop.is_closed():
+            return
+        loop.call_soon_threadsafe(wake.set)
+
+    def _peek(self) -> datetime | None:
+        # Drop heap items superseded by a later update or removal
+        while self._heap:
+            when, schedule_id = self._heap[0]
+            if self._due_at.get(schedule_id) == when:
+                return when
+            heapq.heappop(self._heap)
+        return None
+
+    def _compact(self) -> None:
+        self._heap = [(when, sid) for sid, when in self._due_at.items()]
+        heapq.heapify(self._heap)
+
+
+_queue: ScheduleQueue | None = None
+
+
+def get_schedule_queue() -> ScheduleQueue:
+    global _queue
+    if _queue is None:
+        _queue = ScheduleQueue()
+    return _queue
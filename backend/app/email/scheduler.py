@@ -1,110 +1,260 @@
 from __future__ import annotations
 
 import asyncio
+import time
 import uuid
 from datetime import datetime, timedelta, timezone
 
 from fastapi import FastAPI
 
 from app.config.settings import settings
-from app.email.factory import get_email_provider, get_schedule_provider
-from app.email.models import EmailLog, EmailScheduleUpdate
+from app.email.factory import get_email_provider, get_leader_lock, get_schedule_provider
+from app.email.dispatcher import ScheduleDispatcher
+from app.email.models import EmailLog, EmailSchedule
 from dateutil.relativedelta import relativedelta
 from app.email.renderer import render_email
+from app.email.schedule_queue import ScheduleQueue, get_schedule_queue
 from app.logging_config import get_logger
 
 logger = get_logger(__name__)
 
+# Retention is checked at most this often
+_PRUNE_INTERVAL_SECONDS = 3600
+_MIN_SLEEP_SECONDS = 1.0
+
+_dispatcher: ScheduleDispatcher | None = None
+
 
 def start_scheduler(app: FastAPI) -> None:
-    """Register a background task that processes due schedules."""
+    """Register background tasks that send schedules as they come due.
+
+    Every process competes for the leader lock; only the current leader
+    dispatches, and a standby takes over once the lease is released or
+    expires. The leader sleeps until the earliest ``next_run_at`` in the
+    schedule queue and is woken early when a local write brings a schedule
+    forward. Writes made in other processes are picked up by a cheap
+    indexed probe of the store every ``SCHEDULER_POLL_SECONDS``.
+    """
 
     @app.on_event("startup")
     async def _launch_scheduler() -> None:
-        asyncio.create_task(_scheduler_loop())
-        logger.info("scheduler_started", interval=settings.SCHEDULER_INTERVAL_SECONDS)
+        leadership = asyncio.Event()
+        asyncio.create_task(_leadership_loop(leadership))
+        asyncio.create_task(_scheduler_loop(leadership))
+        logger.info(
+            "scheduler_started",
+            interval=settings.SCHEDULER_INTERVAL_SECONDS,
+            workers=settings.SCHEDULER_WORKERS,
+            lock=settings.SCHEDULER_LOCK_BACKEND,
+        )
 
-    async def _scheduler_loop() -> None:
+    @app.on_event("shutdown")
+    async def _stop_scheduler() -> None:
+        global _dispatcher
+        if _dispatcher is not None:
+            _dispatcher.shutdown()
+            _dispatcher = None
+        await asyncio.to_thread(get_leader_lock().release)
+
+    async def _leadership_loop(leadership: asyncio.Event) -> None:
+        lock = get_leader_lock()
         while True:
-            await asyncio.sleep(settings.SCHEDULER_INTERVAL_SECONDS)
             try:
-                await asyncio.to_thread(_process_due_schedules)
+                leader = await asyncio.to_thread(lock.acquire)
+            except Exception:
+                logger.exception("leader_lock_error")
+                leader = False
+            if leader and not leadership.is_set():
+                logger.info("scheduler_leadership_acquired")
+                leadership.set()
+                get_schedule_queue().wake()
+            elif not leader and leadership.is_set():
+                logger.warning("scheduler_leadership_lost")
+                leadership.clear()
+            # Renew well inside the lease so one slow round does not lose it
+            await asyncio.sleep(settings.SCHEDULER_LEASE_SECONDS / 3)
+
+    async def _scheduler_loop(leadership: asyncio.Event) -> None:
+        queue = get_schedule_queue()
+        queue.attach(asyncio.get_running_loop())
+        last_synced = last_pruned = float("-inf")
+        while True:
+            if not leadership.is_set():
+                await leadership.wait()
+                # Another process may have changed everything while we stood by
+                last_synced = float("-inf")
+            store_due = None
+            try:
+                # Resync catches writes the queue never saw (other processes, manual edits)
+                if time.monotonic() - last_synced >= settings.SCHEDULER_INTERVAL_SECONDS:
+                    await asyncio.to_thread(_sync_queue)
+                    last_synced = time.monotonic()
+                # Writes from other processes never reach this queue; the indexed
+                # probe catches schedules they made due without a full rebuild
+                store_due = await asyncio.to_thread(_store_seconds_until_due)
+                if leadership.is_set() and (queue.seconds_until_due() == 0 or store_due == 0):
+                    # Hands jobs to the dispatcher and returns; in-flight ones are skipped
+                    await asyncio.to_thread(_process_due_schedules, False)
+                if time.monotonic() - last_pruned >= _PRUNE_INTERVAL_SECONDS:
+                    last_pruned = time.monotonic()
+                    await asyncio.to_thread(_prune_delivery_logs)
             except Exception:
                 logger.exception("scheduler_loop_error")
+            await queue.wait(_sleep_seconds(queue, settings.SCHEDULER_POLL_SECONDS, store_due))
 
 
-def _process_due_schedules() -> None:
-    """Check for and process all due schedules."""
-    schedule_provider = get_schedule_provider()
-    email_provider = get_email_provider()
+def _sync_queue() -> None:
+    get_schedule_queue().rebuild(get_schedule_provider().list_schedules())
+
+
+def _store_seconds_until_due() -> float | None:
+    next_run_at = get_schedule_provider().next_due_at()
+    if next_run_at is None:
+        return None
+    when = datetime.fromisoformat(next_run_at)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def _sleep_seconds(queue: ScheduleQueue, poll_interval: float, store_due: float | None = None) -> float:
+    """Time until the next due schedule (queue or store probe), capped by the poll interval."""
+    candidates = [t for t in (queue.seconds_until_due(), store_due) if t is not None]
+    if not candidates:
+        return poll_interval
+    until_due = min(candidates)
+    # The floor keeps a schedule that stays due (e.g. its store write failed) from spinning
+    return max(_MIN_SLEEP_SECONDS, min(until_due, poll_interval))
+
 
-    due = schedule_provider.get_due_schedules()
+def _prune_delivery_logs() -> int:
+    """Apply DELIVERY_LOG_RETENTION_DAYS; returns how many log entries were dropped."""
+    if settings.DELIVERY_LOG_RETENTION_DAYS <= 0:
+        return 0
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.DELIVERY_LOG_RETENTION_DAYS)
+    return get_schedule_provider().prune_logs(cutoff.isoformat())
+
+
+def get_dispatcher() -> ScheduleDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        _dispatcher = ScheduleDispatcher(
+            _deliver,
+            _record_outcome,
+            _handle_timeout,
+            _record_late_result,
+            workers=settings.SCHEDULER_WORKERS,
+            domain_concurrency=settings.SCHEDULER_DOMAIN_CONCURRENCY,
+            job_timeout=settings.SCHEDULER_JOB_TIMEOUT_SECONDS,
+        )
+    return _dispatcher
+
+
+def _process_due_schedules(wait: bool = True) -> None:
+    """Dispatch all due schedules; with ``wait``, block until each has an outcome."""
+    due = get_schedule_provider().get_due_schedules()
     if not due:
         return
 
-    logger.info("processing_due_schedules", count=len(due))
+    dispatcher = get_dispatcher()
+    jobs = dispatcher.submit(due)
+    if jobs:
+        logger.info("processing_due_schedules", count=len(jobs), due=len(due))
+    if wait:
+        for job in jobs:
+            job.settled.wait()
+
+
+def _deliver(schedule: EmailSchedule) -> str | None:
+    """Render and send one schedule; returns the error, or None when sent."""
+    subject, html_body, text_body, images = render_email(
+        entity_type=schedule.entity_type,
+        entity_id=schedule.entity_id,
+        schedule_name=schedule.name,
+        widget_ids=schedule.widget_ids,
+        widget_overrides=schedule.widget_overrides,
+    )
+
+    success = get_email_provider().send_email(
+        recipients=schedule.recipients,
+        subject=subject,
+        html_body=html_body,
+        text_body=text_body,
+        images=images,
+    )
+    return None if success else "Email provider returned False"
+
+
+def _record_outcome(schedule: EmailSchedule, error: str | None) -> None:
+    now = datetime.now(timezone.utc).isoformat()
+    if error is not None:
+        _handle_failure(schedule, error, now)
+        return
+
+    get_schedule_provider().add_log(EmailLog(
+        log_id=str(uuid.uuid4()),
+        schedule_id=schedule.schedule_id,
+        sent_at=now,
+        status="sent",
+        recipients=schedule.recipients,
+    ))
+    _update_schedule_fields(schedule.schedule_id, {
+        "status": "active",
+        "retry_count": 0,
+        "next_run_at": _next_regular_run(schedule),
+        "last_run_at": now,
+    })
+    logger.info("schedule_sent", schedule_id=schedule.schedule_id)
+
+
+def _next_regular_run(schedule: EmailSchedule) -> str:
+    return _compute_next_run(
+        datetime.fromisoformat(schedule.next_run_at),
+        schedule.days_of_week,
+        schedule.time_of_day,
+        schedule.recurrence_type,
+        schedule.day_of_month,
+    )
 
-    for schedule in due:
-        try:
-            subject, html_body, text_body, images = render_email(
-                entity_type=schedule.entity_type,
-                entity_id=schedule.entity_id,
-                schedule_name=schedule.name,
-                widget_ids=schedule.widget_ids,
-                widget_overrides=schedule.widget_overrides,
-            )
-
-            success = email_provider.send_email(
-                recipients=schedule.recipients,
-                subject=subject,
-                html_body=html_body,
-                text_body=text_body,
-                images=images,
-            )
-
-            now = datetime.now(timezone.utc).isoformat()
-
-            if success:
-                schedule_provider.add_log(EmailLog(
-                    log_id=str(uuid.uuid4()),
-                    schedule_id=schedule.schedule_id,
-                    sent_at=now,
-                    status="sent",
-                    recipients=schedule.recipients,
-                ))
-                next_run = _compute_next_run(
-                    datetime.fromisoformat(schedule.next_run_at),
-                    schedule.days_of_week,
-                    schedule.time_of_day,
-                    schedule.recurrence_type,
-                    schedule.day_of_month,
-                )
-                schedule_provider.update_schedule(
-                    schedule.schedule_id,
-                    EmailScheduleUpdate(
-                        status="active",
-                    ),
-                )
-                # Direct update for fields not in EmailScheduleUpdate
-                _update_schedule_fields(schedule.schedule_id, {
-                    "retry_count": 0,
-                    "next_run_at": next_run,
-                    "last_run_at": now,
-                })
-                logger.info("schedule_sent", schedule_id=schedule.schedule_id)
-            else:
-                _handle_failure(schedule, "Email provider returned False", now)
-
-        except Exception as e:
-            now = datetime.now(timezone.utc).isoformat()
-            _handle_failure(schedule, str(e), now)
-            logger.exception("schedule_send_error", schedule_id=schedule.schedule_id)
-
-
-def _handle_failure(schedule: "EmailSchedule", error: str, now: str) -> None:  # noqa: F821
-    """Handle a failed schedule send with retry logic."""
-    from app.email.models import EmailSchedule
 
+def _handle_timeout(schedule: EmailSchedule) -> None:
+    """Log a send that overran its timeout and move on to the next regular run.
+
+    The send is still running and may yet succeed, so it is not retried:
+    a retry could email the recipients twice.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    get_schedule_provider().add_log(EmailLog(
+        log_id=str(uuid.uuid4()),
+        schedule_id=schedule.schedule_id,
+        sent_at=now,
+        status="failed",
+        error=f"Timed out after {settings.SCHEDULER_JOB_TIMEOUT_SECONDS}s; the email may still be sent",
+        recipients=schedule.recipients,
+    ))
+    _update_schedule_fields(schedule.schedule_id, {"next_run_at": _next_regular_run(schedule)})
+    logger.warning("schedule_timeout_not_retried", schedule_id=schedule.schedule_id)
+
+
+def _record_late_result(schedule: EmailSchedule, error: str | None) -> None:
+    """Record the outcome of a send that finished after its timeout was handled."""
+    if error is not None:
+        # Already logged as a timeout; the next regular run is already set
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    get_schedule_provider().add_log(EmailLog(
+        log_id=str(uuid.uuid4()),
+        schedule_id=schedule.schedule_id,
+        sent_at=now,
+        status="sent",
+        recipients=schedule.recipients,
+    ))
+    _update_schedule_fields(schedule.schedule_id, {"retry_count": 0, "last_run_at": now})
+    logger.info("schedule_sent_late", schedule_id=schedule.schedule_id)
+
+
+def _handle_failure(schedule: EmailSchedule, error: str, now: str) -> None:
+    """Handle a failed schedule send with retry logic."""
     schedule_provider = get_schedule_provider()
     new_retry_count = schedule.retry_count + 1
 
@@ -135,20 +285,7 @@ def _handle_failure(schedule: "EmailSchedule", error: str, now: str) -> None:  #
 
 def _update_schedule_fields(schedule_id: str, fields: dict) -> None:
     """Directly update schedule fields that aren't covered by EmailScheduleUpdate."""
-    schedule_provider = get_schedule_provider()
-    schedule = schedule_provider.get_schedule(schedule_id)
-    if schedule is None:
-        return
-
-    schedules = schedule_provider._read_schedules()  # type: ignore[attr-defined]
-    for i, s in enumerate(schedules):
-        if s.schedule_id == schedule_id:
-            data = s.model_dump()
-            data.update(fields)
-            data["updated_at"] = datetime.now(timezone.utc).isoformat()
-            schedules[i] = type(s)(**data)
-            schedule_provider._write_schedules(schedules)  # type: ignore[attr-defined]
-            return
+    get_schedule_provider().update_fields(schedule_id, fields)
 
 
 def _compute_next_run(
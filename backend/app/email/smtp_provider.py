@@ -43,7 +43,9 @@ class SmtpEmailProvider(EmailProvider):
         msg["To"] = ", ".join(recipients)
 
         try:
-            with smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT) as server:
+            with smtplib.SMTP(
+                settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT_SECONDS,
+            ) as server:
                 if settings.SMTP_USE_TLS:
                     server.starttls()
                 server.login(settings.SMTP_USERNAME, settings.SMTP_PASSWORD)
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator
+
+from app.email.delivery_log import JsonlDeliveryLog
+from app.email.interfaces import ScheduleProvider
+from app.email.models import EmailLog, EmailSchedule, EmailScheduleCreate, EmailScheduleUpdate
+from app.email.schedule_queue import get_schedule_queue
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+DB_NAME = "schedules.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS schedules (
+    schedule_id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    entity_type TEXT NOT NULL,
+    entity_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    next_run_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS schedules_owner ON schedules (owner);
+CREATE INDEX IF NOT EXISTS schedules_entity ON schedules (entity_type, entity_id);
+CREATE INDEX IF NOT EXISTS schedules_due ON schedules (status, next_run_at);
+
+CREATE TABLE IF NOT EXISTS delivery_logs (
+    log_id TEXT PRIMARY KEY,
+    schedule_id TEXT NOT NULL,
+    sent_at TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS delivery_logs_schedule ON delivery_logs (schedule_id, sent_at);
+CREATE INDEX IF NOT EXISTS delivery_logs_sent ON delivery_logs (sent_at);
+"""
+
+# Fields stored in their own (indexed) columns as well as in the JSON body
+_COLUMNS = ("owner", "entity_type", "entity_id", "status", "next_run_at")
+
+
+class SqliteScheduleProvider(ScheduleProvider):
+    """Schedules and delivery logs in one SQLite database (WAL mode).
+
+    Filter fields are real columns with indexes, so lookups and the due scan
+    only decode the matching rows; the full schedule is kept as JSON next to
+    them. Every write is a single transaction. Existing JSON-provider data
+    (``schedules.json`` and the delivery log) is imported once, into a new
+    database.
+    """
+
+    def __init__(self, schedules_dir: str) -> None:
+        self._dir = Path(schedules_dir).resolve()
+        self._dir.mkdir(parents=True, exist_ok=True)
+        self._db_path = self._dir / DB_NAME
+        is_new = not self._db_path.exists()
+        # One connection shared by all threads; the lock serializes its use
+        self._conn = sqlite3.connect(self._db_path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        if is_new:
+            self._import_json()
+        logger.info("schedule_provider_init", dir=str(self._dir), backend="sqlite")
+
+    # -- internal helpers -------------------------------------------------------
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _query(self, sql: str, params: tuple[Any, ...] = ()) -> list[tuple[Any, ...]]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _row(schedule: EmailSchedule) -> tuple[Any, ...]:
+        return (
+            schedule.schedule_id,
+            *(getattr(schedule, c) for c in _COLUMNS),
+            schedule.model_dump_json(),
+        )
+
+    def _put(self, conn: sqlite3.Connection, schedule: EmailSchedule) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO schedules (schedule_id, owner, entity_type, entity_id, status,"
+            " next_run_at, data) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            self._row(schedule),
+        )
+
+    def _import_json(self) -> None:
+        schedules_path = self._dir / "schedules.json"
+        logs_dir = self._dir / "delivery_logs"
+        logs_path = self._dir / "delivery_log.json"
+        schedules: list[EmailSchedule] = []
+        logs: list[EmailLog] = []
+        if schedules_path.exists():
+            with open(schedules_path) as f:
+                schedules = [EmailSchedule(**s) for s in json.load(f)]
+        if logs_dir.is_dir():
+            logs = JsonlDeliveryLog(logs_dir, 0, 0).read_all()
+        elif logs_path.exists():
+            with open(logs_path) as f:
+                logs = [EmailLog(**l) for l in json.load(f)]
+        if not schedules and not logs:
+            return
+        with self._transaction() as conn:
+            for s in schedules:
+                self._put(conn, s)
+            for log in logs:
+                self._insert_log(conn, log)
+        logger.info("schedules_imported_from_json", schedules=len(schedules), logs=len(logs))
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now(timezone.utc).isoformat()
+
+    # -- schedules ---------------------------------------------------------------
+
+    def create_schedule(self, schedule: EmailScheduleCreate, owner: str) -> EmailSchedule:
+        now = self._now()
+        saved = EmailSchedule(
+            schedule_id=str(uuid.uuid4()),
+            owner=owner,
+            name=schedule.name,
+            entity_type=schedule.entity_type,
+            entity_id=schedule.entity_id,
+            widget_ids=schedule.widget_ids,
+            recipients=schedule.recipients,
+            time_of_day=schedule.time_of_day,
+            days_of_week=schedule.days_of_week,
+            widget_overrides=schedule.widget_overrides,
+            created_at=now,
+            updated_at=now,
+        )
+        with self._transaction() as conn:
+            self._put(conn, saved)
+        get_schedule_queue().update(saved)
+        logger.info("schedule_created", schedule_id=saved.schedule_id, owner=owner)
+        return saved
+
+    def get_schedule(self, schedule_id: str) -> EmailSchedule | None:
+        rows = self._query("SELECT data FROM schedules WHERE schedule_id = ?", (schedule_id,))
+        return EmailSchedule.model_validate_json(rows[0][0]) if rows else None
+
+    def list_schedules(self, owner: str | None = None, entity_type: str | None = None, entity_id: str | None = None) -> list[EmailSchedule]:
+        clauses: list[str] = []
+        params: list[Any] = []
+        for column, value in (("owner", owner), ("entity_type", entity_type), ("entity_id", entity_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._query(f"SELECT data FROM schedules{where} ORDER BY rowid", tuple(params))
+        return [EmailSchedule.model_validate_json(r[0]) for r in rows]
+
+    def update_schedule(self, schedule_id: str, update: EmailScheduleUpdate) -> EmailSchedule | None:
+        update_data = update.model_dump(exclude_none=True)
+        return self.update_fields(schedule_id, update_data)
+
+    def update_fields(self, schedule_id: str, fields: dict[str, Any]) -> EmailSchedule | None:
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT data FROM schedules WHERE schedule_id = ?", (schedule_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            data = json.loads(row[0])
+            data.update(fields)
+            data["updated_at"] = self._now()
+            updated = EmailSchedule(**data)
+            conn.execute(
+                "UPDATE schedules SET owner = ?, entity_type = ?, entity_id = ?, status = ?,"
+                " next_run_at = ?, data = ? WHERE schedule_id = ?",
+                (*self._row(updated)[1:], schedule_id),
+            )
+        get_schedule_queue().update(updated)
+        return updated
+
+    def delete_schedule(self, schedule_id: str) -> bool:
+        with self._transaction() as conn:
+            deleted = conn.execute(
+                "DELETE FROM schedules WHERE schedule_id = ?", (schedule_id,),
+            ).rowcount
+        if not deleted:
+            return False
+        get_schedule_queue().remove(schedule_id)
+        logger.info("schedule_deleted", schedule_id=schedule_id)
+        return True
+
+    def get_due_schedules(self) -> list[EmailSchedule]:
+        now = self._now()
+        # Range scan on the (status, next_run_at) index; '' means never scheduled
+        rows = self._query(
+            "SELECT data FROM schedules WHERE status = 'active' AND next_run_at > ''"
+            " AND next_run_at <= ? ORDER BY next_run_at",
+            (now,),
+        )
+        return [EmailSchedule.model_validate_json(r[0]) for r in rows]
+
+    def next_due_at(self) -> str | None:
+        # Answered from the (status, next_run_at) index alone
+        rows = self._query(
+            "SELECT MIN(next_run_at) FROM schedules WHERE status = 'active' AND next_run_at > ''",
+        )
+        return rows[0][0] if rows else None
+
+    # -- logs -------------------------------------------------------------------
+
+    @staticmethod
+    def _insert_log(conn: sqlite3.Connection, log: EmailLog) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO delivery_logs (log_id, schedule_id, sent_at, data)"
+            " VALUES (?, ?, ?, ?)",
+            (log.log_id, log.schedule_id, log.sent_at, log.model_dump_json()),
+        )
+
+    def add_log(self, log: EmailLog) -> EmailLog:
+        with self._transaction() as conn:
+            self._insert_log(conn, log)
+        return log
+
+    def get_logs(self, schedule_id: str) -> list[EmailLog]:
+        rows = self._query(
+            "SELECT data FROM delivery_logs WHERE schedule_id = ? ORDER BY sent_at DESC",
+            (schedule_id,),
+        )
+        return [EmailLog.model_validate_json(r[0]) for r in rows]
+
+    def prune_logs(self, before: str) -> int:
+        with self._transaction() as conn:
+            removed = conn.execute("DELETE FROM delivery_logs WHERE sent_at < ?", (before,)).rowcount
+        if removed:
+            logger.info("delivery_log_pruned", entries=removed)
+        return removed
@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+from typing import Any, AsyncIterator
+
+import httpx
+
 from app.config.settings import settings
 from app.llm.interfaces import LLMProvider
 from app.llm.models import LLMQueryRequest, LLMQueryResponse
@@ -22,47 +26,89 @@ Rules:
 
 
 class AnthropicProvider(LLMProvider):
-    def __init__(self) -> None:
+    """Async Anthropic client sharing one keep-alive connection pool.
+
+    ``http_client`` lets tests (or a proxy setup) supply the transport.
+    """
+
+    def __init__(self, http_client: httpx.AsyncClient | None = None) -> None:
         import anthropic
 
-        self._client = anthropic.Anthropic(api_key=settings.ANTHROPIC_API_KEY)
+        if http_client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=settings.LLM_MAX_CONCURRENCY,
+                    max_keepalive_connections=settings.LLM_MAX_CONCURRENCY,
+                ),
+                timeout=httpx.Timeout(settings.LLM_REQUEST_TIMEOUT_SECONDS, connect=10.0),
+            )
+        self._client = anthropic.AsyncAnthropic(
+            api_key=settings.ANTHROPIC_API_KEY,
+            base_url=settings.LLM_BASE_URL or None,
+            http_client=http_client,
+        )
         logger.info("anthropic_provider_init", model=settings.LLM_MODEL)
 
-    def query(
+    async def query(
         self,
         request: LLMQueryRequest,
         context: str,
         sources_context: str,
     ) -> LLMQueryResponse:
+        response = await self._client.messages.create(
+            **self._message_params(request, context, sources_context),
+        )
+        return _to_response(response)
+
+    async def stream(
+        self,
+        request: LLMQueryRequest,
+        context: str,
+        sources_context: str,
+    ) -> AsyncIterator[str | LLMQueryResponse]:
+        async with self._client.messages.stream(
+            **self._message_params(request, context, sources_context),
+        ) as stream:
+            async for text in stream.text_stream:
+                yield text
+            yield _to_response(await stream.get_final_message())
+
+    def _message_params(
+        self,
+        request: LLMQueryRequest,
+        context: str,
+        sources_context: str,
+    ) -> dict[str, Any]:
         user_message = (
             f"Entity: {request.entity_type} / {request.entity_id}\n\n"
             f"--- Structured Data ---\n{context}\n\n"
             f"--- Document Excerpts ---\n{sources_context}\n\n"
             f"--- Question ---\n{request.query}"
         )
+        return {
+            "model": settings.LLM_MODEL,
+            "max_tokens": settings.LLM_MAX_RESPONSE_TOKENS,
+            "system": SYSTEM_PROMPT,
+            "messages": [{"role": "user", "content": user_message}],
+        }
 
-        response = self._client.messages.create(
-            model=settings.LLM_MODEL,
-            max_tokens=settings.LLM_MAX_RESPONSE_TOKENS,
-            system=SYSTEM_PROMPT,
-            messages=[{"role": "user", "content": user_message}],
-        )
 
-        answer = ""
-        for block in response.content:
-            if block.type == "text":
-                answer += block.text
-
-        token_usage = {}
-        if response.usage:
-            token_usage = {
-                "input_tokens": response.usage.input_tokens,
-                "output_tokens": response.usage.output_tokens,
-            }
-
-        return LLMQueryResponse(
-            answer=answer,
-            sources=[],  # Populated by the API layer
-            model=response.model,
-            token_usage=token_usage,
-        )
+def _to_response(response: Any) -> LLMQueryResponse:
+    answer = ""
+    for block in response.content:
+        if block.type == "text":
+            answer += block.text
+
+    token_usage = {}
+    if response.usage:
+        token_usage = {
+            "input_tokens": response.usage.input_tokens,
+            "output_tokens": response.usage.output_tokens,
+        }
+
+    return LLMQueryResponse(
+        answer=answer,
+        sources=[],  # Populated by the API layer
+        model=response.model,
+        token_usage=token_usage,
+    )
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable
+
+from app.config.settings import settings
+from app.llm.models import LLMCacheStats, LLMQueryRequest, LLMQueryResponse
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_UNSAFE_RE = re.compile(r"[^A-Za-z0-9_.-]")
+
+EntityKey = tuple[str, str]
+
+
+def normalize_query(query: str) -> str:
+    """Case- and whitespace-insensitive form of a question; trailing '?' etc. ignored."""
+    return _WHITESPACE_RE.sub(" ", query).strip().rstrip("?!. ").lower()
+
+
+def cache_key(
+    request: LLMQueryRequest,
+    context: str,
+    chunk_ids: list[str],
+    model: str,
+) -> str:
+    """Fingerprint of everything that shapes the answer.
+
+    Chunk ids change whenever a document is re-indexed, so a question whose
+    selected context changed never hits an older answer.
+    """
+    payload = json.dumps(
+        [normalize_query(request.query), request.entity_type, request.entity_id, context, chunk_ids, model],
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """LRU cache of LLM answers with a TTL and an optional on-disk tier.
+
+    Entries are grouped by entity so that (re)indexing a document for an
+    entity drops every answer about it. The disk tier, if configured, keeps
+    one JSON file per answer under ``<dir>/<entity_type>/<entity_id>/`` so
+    answers survive restarts and invalidation is a single directory removal.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, cache_dir: Path | None = None) -> None:
+        self._max_entries = max(1, max_entries)
+        self._ttl = ttl_seconds
+        self._dir = Path(cache_dir) if cache_dir else None
+        if self._dir is not None:
+            self._dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        # key → (expires_at, entity, response JSON), least recently used first
+        self._entries: OrderedDict[str, tuple[float, EntityKey, str]] = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: str, entity: EntityKey) -> LLMQueryResponse | None:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None and self._dir is not None:
+            entry = self._read_disk(key, entity, now)
+            if entry is not None:
+                with self._lock:
+                    self._store(key, entry)
+        with self._lock:
+            if entry is None:
+                self._misses += 1
+                return None
+            self._hits += 1
+        return LLMQueryResponse.model_validate_json(entry[2])
+
+    def put(self, key: str, entity: EntityKey, response: LLMQueryResponse) -> None:
+        entry = (time.time() + self._ttl, entity, response.model_dump_json())
+        with self._lock:
+            self._store(key, entry)
+        if self._dir is not None:
+            self._write_disk(key, entry)
+
+    def invalidate(self, entities: Iterable[EntityKey]) -> int:
+        """Drop all answers about ``entities``; returns how many in-memory entries went."""
+        targets = set(entities)
+        if not targets:
+            return 0
+        with self._lock:
+            stale = [k for k, (_, entity, _) in self._entries.items() if entity in targets]
+            for k in stale:
+                del self._entries[k]
+        if self._dir is not None:
+            for entity in targets:
+                shutil.rmtree(self._entity_dir(entity), ignore_errors=True)
+        if stale:
+            logger.info("llm_cache_invalidated", entities=len(targets), entries=len(stale))
+        return len(stale)
+
+    def stats(self) -> LLMCacheStats:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return LLMCacheStats(
+                enabled=True,
+                entries=len(self._entries),
+                hits=self._hits,
+                misses=self._misses,
+                hit_rate=round(self._hits / lookups, 4) if lookups else 0.0,
+                ttl_seconds=self._ttl,
+                disk=self._dir is not None,
+            )
+
+    def _store(self, key: str, entry: tuple[float, EntityKey, str]) -> None:
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def _entity_dir(self, entity: EntityKey) -> Path:
+        assert self._dir is not None
+        return self._dir / _UNSAFE_RE.sub("_", entity[0]) / _UNSAFE_RE.sub("_", entity[1])
+
+    def _read_disk(self, key: str, entity: EntityKey, now: float) -> tuple[float, EntityKey, str] | None:
+        path = self._entity_dir(entity) / f"{key}.json"
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if data["expires_at"] <= now:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        return data["expires_at"], entity, data["response"]
+
+    def _write_disk(self, key: str, entry: tuple[float, EntityKey, str]) -> None:
+        expires_at, entity, response = entry
+        directory = self._entity_dir(entity)
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            tmp = directory / f".{key}.{uuid.uuid4().hex}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({"expires_at": expires_at, "response": response}, f)
+            os.replace(tmp, directory / f"{key}.json")
+        except OSError as e:
+            # The memory tier still has the answer
+            logger.warning("llm_cache_disk_write_failed", error=str(e))
+
+
+_cache: LLMResponseCache | None = None
+
+
+def get_llm_cache() -> LLMResponseCache | None:
+    """The shared response cache, or None when caching is disabled."""
+    global _cache
+    if not settings.LLM_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        cache_dir = Path(settings.LLM_CACHE_DIR).resolve() if settings.LLM_CACHE_DIR else None
+        _cache = LLMResponseCache(
+            settings.LLM_CACHE_MAX_ENTRIES, settings.LLM_CACHE_TTL_SECONDS, cache_dir,
+        )
+    return _cache
+
+
+def invalidate_entities(entities: Iterable[tuple[str, str]]) -> None:
+    """Drop cached answers about entities whose documents just changed."""
+    cache = get_llm_cache()
+    if cache is not None:
+        cache.invalidate(entities)
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+from typing import NamedTuple
+
+import numpy as np
+
+from app.documents.embeddings import get_embedder
+from app.documents.extractor import estimate_tokens
+from app.documents.models import DocumentSearchResult
+from app.llm.models import LLMSource
+
+# Only the best candidates are considered; the rest would never fit anyway
+_MAX_CANDIDATES = 60
+# Shorter shared text between neighbouring chunks is treated as coincidence
+_MIN_OVERLAP = 8
+
+NO_DOCUMENTS = "(No relevant documents found)"
+
+
+class _Candidate(NamedTuple):
+    file_id: str
+    filename: str
+    chunk_id: str
+    chunk_index: int
+    text: str
+    relevance: float
+
+
+class PackedContext(NamedTuple):
+    text: str
+    sources: list[LLMSource]
+    chunk_ids: list[str]
+    tokens: int
+
+
+def pack_context(
+    results: list[DocumentSearchResult],
+    token_budget: int,
+    max_chunks: int,
+    mmr_lambda: float = 0.7,
+) -> PackedContext:
+    """Choose document chunks for a prompt within ``token_budget`` (estimated) tokens.
+
+    Chunks are picked greedily by maximal marginal relevance: relevance to
+    the query minus ``1 - mmr_lambda`` times the similarity to chunks already
+    picked, so near-duplicates lose out to new information. Identical texts
+    are dropped, and picked neighbours from the same file are merged into one
+    excerpt with their shared overlap sent once.
+    """
+    candidates = _candidates(results)
+    if not candidates or token_budget <= 0 or max_chunks <= 0:
+        return PackedContext(NO_DOCUMENTS, [], [], 0)
+
+    vectors = get_embedder().embed([c.text for c in candidates])
+    similarity = vectors @ vectors.T
+    relevance = np.array([c.relevance for c in candidates])
+    max_similarity = np.zeros(len(candidates))
+    by_position = {(c.file_id, c.chunk_index): i for i, c in enumerate(candidates)}
+
+    chosen: list[int] = []
+    remaining = set(range(len(candidates)))
+    budget = token_budget
+    while remaining and len(chosen) < max_chunks:
+        costs = {i: _cost(i, candidates, by_position, chosen) for i in remaining}
+        fitting = [i for i in remaining if costs[i] <= budget]
+        if not fitting:
+            break
+        best = max(
+            fitting,
+            key=lambda i: (mmr_lambda * relevance[i] - (1.0 - mmr_lambda) * max_similarity[i], -i),
+        )
+        chosen.append(best)
+        remaining.discard(best)
+        budget -= costs[best]
+        max_similarity = np.maximum(max_similarity, similarity[best])
+
+    return _assemble([candidates[i] for i in chosen])
+
+
+def _candidates(results: list[DocumentSearchResult]) -> list[_Candidate]:
+    """Flatten search hits, scoring each chunk by its file's score and its rank in the file."""
+    top_score = max((r.score for r in results), default=0.0) or 1.0
+    seen_texts: set[str] = set()
+    candidates: list[_Candidate] = []
+    for result in results:
+        for rank, chunk in enumerate(result.matching_chunks):
+            key = " ".join(chunk.text.split())
+            if key in seen_texts:
+                continue
+            seen_texts.add(key)
+            candidates.append(
+                _Candidate(
+                    file_id=result.file_id,
+                    filename=result.filename,
+                    chunk_id=chunk.chunk_id,
+                    chunk_index=chunk.chunk_index,
+                    text=chunk.text,
+                    relevance=result.score / top_score / (1 + rank),
+                )
+            )
+            if len(candidates) >= _MAX_CANDIDATES:
+                return candidates
+    return candidates
+
+
+def _cost(
+    i: int,
+    candidates: list[_Candidate],
+    by_position: dict[tuple[str, int], int],
+    chosen: list[int],
+) -> int:
+    """Tokens added by candidate ``i``, less any overlap already sent by a chosen neighbour."""
+    c = candidates[i]
+    text = c.text
+    before = by_position.get((c.file_id, c.chunk_index - 1))
+    if before is not None and before in chosen:
+        text = text[_overlap(candidates[before].text, text):]
+    after = by_position.get((c.file_id, c.chunk_index + 1))
+    if after is not None and after in chosen:
+        text = text[:len(text) - _overlap(text, candidates[after].text)]
+    return estimate_tokens(text)
+
+
+def _overlap(first: str, second: str) -> int:
+    """Length of the longest suffix of ``first`` that starts ``second``."""
+    probe = second[:_MIN_OVERLAP]
+    start = max(0, len(first) - len(second))
+    while True:
+        start = first.find(probe, start)
+        if start == -1 or len(first) - start < _MIN_OVERLAP:
+            return 0
+        if second.startswith(first[start:]):
+            return len(first) - start
+        start += 1
+
+
+def _assemble(chosen: list[_Candidate]) -> PackedContext:
+    if not chosen:
+        return PackedContext(NO_DOCUMENTS, [], [], 0)
+
+    # Files in order of their best pick; chunks in document order within a file
+    by_file: dict[str, list[_Candidate]] = {}
+    for c in chosen:
+        by_file.setdefault(c.file_id, []).append(c)
+
+    parts: list[str] = []
+    sources: list[LLMSource] = []
+    for chunks in by_file.values():
+        chunks.sort(key=lambda c: c.chunk_index)
+        runs: list[list[_Candidate]] = []
+        for c in chunks:
+            if runs and c.chunk_index == runs[-1][-1].chunk_index + 1:
+                runs[-1].append(c)
+            else:
+                runs.append([c])
+        parts.extend(_excerpt(run) for run in runs)
+        sources.extend(
+            LLMSource(file_id=c.file_id, filename=c.filename, chunk_index=c.chunk_index, excerpt=c.text[:200])
+            for c in chunks
+        )
+
+    text = "\n\n".join(parts)
+    return PackedContext(text, sources, [c.chunk_id for c in chosen], estimate_tokens(text))
+
+
+def _excerpt(run: list[_Candidate]) -> str:
+    first = run[0]
+    text = first.text
+    for prev, c in zip(run, run[1:]):
+        shared = _overlap(prev.text, c.text)
+        text += c.text[shared:] if shared else " " + c.text
+    if len(run) == 1:
+        label = f"chunk {first.chunk_index}"
+    else:
+        label = f"chunks {first.chunk_index}-{run[-1].chunk_index}"
+    return f"[{first.filename}, {label}]\n{text}"
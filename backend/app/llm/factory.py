@@ -11,6 +11,12 @@ def get_llm_provider() -> LLMProvider:
     if _provider is not None:
         return _provider
 
+    if settings.LLM_PROVIDER == "fake":
+        from app.llm.fake_provider import FakeLLMProvider
+
+        _provider = FakeLLMProvider()
+        return _provider
+
     if not settings.ANTHROPIC_API_KEY:
         raise ValueError("ANTHROPIC_API_KEY is not configured")
 
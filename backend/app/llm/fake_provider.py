@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import re
+from typing import AsyncIterator
+
+from app.llm.interfaces import LLMProvider
+from app.llm.models import LLMQueryRequest, LLMQueryResponse
+
+_EXCERPT_RE = re.compile(r"^\[(.+), chunks? [\d-]+\]$", re.MULTILINE)
+
+
+class FakeLLMProvider(LLMProvider):
+    """Offline stand-in for local development and tests.
+
+    Answers deterministically from the request and the supplied excerpts,
+    streaming the answer one word at a time.
+    """
+
+    model = "fake-llm"
+
+    async def query(
+        self,
+        request: LLMQueryRequest,
+        context: str,
+        sources_context: str,
+    ) -> LLMQueryResponse:
+        async for item in self.stream(request, context, sources_context):
+            if isinstance(item, LLMQueryResponse):
+                return item
+        raise RuntimeError("stream ended without a response")
+
+    async def stream(
+        self,
+        request: LLMQueryRequest,
+        context: str,
+        sources_context: str,
+    ) -> AsyncIterator[str | LLMQueryResponse]:
+        files = list(dict.fromkeys(_EXCERPT_RE.findall(sources_context)))
+        answer = (
+            f"Answer for {request.entity_type} {request.entity_id} to '{request.query}', "
+            f"based on {len(files)} document(s)"
+        )
+        if files:
+            answer += ": " + ", ".join(files)
+        answer += "."
+        words = answer.split(" ")
+        for i, word in enumerate(words):
+            yield word if i == 0 else " " + word
+        yield LLMQueryResponse(
+            answer=answer,
+            model=self.model,
+            token_usage={
+                "input_tokens": (len(context) + len(sources_context) + len(request.query)) // 4,
+                "output_tokens": len(words),
+            },
+        )
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import AsyncIterator
+
+from app.config.settings import settings
+from app.exceptions import GoldMineError
+from app.llm.factory import get_llm_provider
+from app.llm.models import LLMQueryRequest, LLMQueryResponse
+from app.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+class _TokenBucket:
+    def __init__(self, rate_per_second: float, capacity: float) -> None:
+        self._rate = rate_per_second
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    def take(self) -> bool:
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
+
+
+class LLMGateway:
+    """Admission control in front of the LLM provider.
+
+    - At most ``max_concurrency`` upstream calls run at once; callers wait
+      up to ``queue_timeout`` seconds for a slot, then get a 503.
+    - Each user may start ``rate_per_minute`` questions per minute (bursts up
+      to the same number); beyond that they get a 429.
+    - Identical questions in flight at the same time (same cache key) share
+      one upstream call.
+
+    Lives on the event loop; all state is touched from it only.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int | None = None,
+        rate_per_minute: int | None = None,
+        queue_timeout: float | None = None,
+    ) -> None:
+        self._semaphore = asyncio.Semaphore(max_concurrency or settings.LLM_MAX_CONCURRENCY)
+        self._rate_per_minute = (
+            settings.LLM_RATE_LIMIT_PER_MINUTE if rate_per_minute is None else rate_per_minute
+        )
+        self._queue_timeout = (
+            settings.LLM_QUEUE_TIMEOUT_SECONDS if queue_timeout is None else queue_timeout
+        )
+        self._buckets: dict[str, _TokenBucket] = {}
+        self._in_flight: dict[str, asyncio.Task[LLMQueryResponse]] = {}
+        self.coalesced = 0
+
+    async def query(
+        self,
+        user: str,
+        key: str,
+        request: LLMQueryRequest,
+        context: str,
+        sources_context: str,
+    ) -> LLMQueryResponse:
+        self.admit(user)
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            logger.info("llm_request_coalesced", user=user)
+        else:
+            task = asyncio.ensure_future(self._call(request, context, sources_context))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        # Shielded: one caller disconnecting must not cancel the others' answer
+        response = await asyncio.shield(task)
+        return response.model_copy(deep=True)
+
+    async def stream(
+        self,
+        request: LLMQueryRequest,
+        context: str,
+        sources_context: str,
+    ) -> AsyncIterator[str | LLMQueryResponse]:
+        """Stream from the provider once a slot is free; call ``admit`` first."""
+        await self._acquire()
+        try:
+            async for item in get_llm_provider().stream(request, context, sources_context):
+                yield item
+        finally:
+            self._semaphore.release()
+
+    async def _call(
+        self,
+        request: LLMQueryRequest,
+        context: str,
+        sources_context: str,
+    ) -> LLMQueryResponse:
+        await self._acquire()
+        try:
+            return await get_llm_provider().query(request, context, sources_context)
+        finally:
+            self._semaphore.release()
+
+    async def _acquire(self) -> None:
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self._queue_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("llm_queue_timeout", timeout=self._queue_timeout)
+            raise GoldMineError("LLM is busy, try again shortly", status_code=503)
+
+    def admit(self, user: str) -> None:
+        """Count a question against ``user``'s rate limit; raises a 429 when exhausted."""
+        if self._rate_per_minute <= 0:
+            return
+        bucket = self._buckets.get(user)
+        if bucket is None:
+            bucket = self._buckets[user] = _TokenBucket(
+                self._rate_per_minute / 60.0, float(self._rate_per_minute),
+            )
+        if not bucket.take():
+            logger.warning("llm_rate_limited", user=user)
+            raise GoldMineError("LLM rate limit exceeded", status_code=429)
+
+
+_gateway: LLMGateway | None = None
+
+
+def get_llm_gateway() -> LLMGateway:
+    global _gateway
+    if _gateway is None:
+        _gateway = LLMGateway()
+    return _gateway
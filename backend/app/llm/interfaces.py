@@ -1,16 +1,30 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+from typing import AsyncIterator
 
 from app.llm.models import LLMQueryRequest, LLMQueryResponse
 
 
 class LLMProvider(ABC):
     @abstractmethod
-    def query(
+    async def query(
         self,
         request: LLMQueryRequest,
         context: str,
         sources_context: str,
     ) -> LLMQueryResponse:
         """Send a query to the LLM with assembled context."""
+
+    @abstractmethod
+    def stream(
+        self,
+        request: LLMQueryRequest,
+        context: str,
+        sources_context: str,
+    ) -> AsyncIterator[str | LLMQueryResponse]:
+        """Like ``query``, but yield answer text deltas as they arrive.
+
+        The final item is the complete ``LLMQueryResponse`` (answer, model
+        and token usage).
+        """
@@ -21,3 +21,14 @@ class LLMQueryResponse(BaseModel):
     sources: list[LLMSource] = Field(default_factory=list)
     model: str = ""
     token_usage: dict[str, int] = Field(default_factory=dict)
+    cached: bool = False
+
+
+class LLMCacheStats(BaseModel):
+    enabled: bool
+    entries: int = 0
+    hits: int = 0
+    misses: int = 0
+    hit_rate: float = 0.0
+    ttl_seconds: float = 0.0
+    disk: bool = False
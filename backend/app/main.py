@@ -15,6 +15,8 @@ from app.api.documents import router as documents_router
 from app.auth.router import router as auth_router
 from app.auth.middleware import AuthMiddleware
 from app.api.schedules import router as schedules_router
+from app.data_access.reloader import start_data_reloader
+from app.documents.compactor import start_document_compactor
 from app.email.scheduler import start_scheduler
 
 setup_logging()
@@ -46,6 +48,8 @@ def create_app() -> FastAPI:
     application.include_router(schedules_router)
 
     start_scheduler(application)
+    start_data_reloader(application)
+    start_document_compactor(application)
 
     logger.info("app_started", env=settings.ENV)
     return application
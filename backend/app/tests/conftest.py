@@ -1,4 +1,5 @@
 import os
+import shutil
 import tempfile
 
 # Set test environment before importing app
@@ -14,6 +15,11 @@ os.environ["GOLDMINE_VIEWS_DIR"] = _views_tmpdir
 _docs_tmpdir = tempfile.mkdtemp(prefix="goldmine_docs_test_")
 os.environ["GOLDMINE_DOCUMENTS_DIR"] = _docs_tmpdir
 
+# Index existing files inline so tests see a complete index
+os.environ["GOLDMINE_DOCUMENT_INGEST_BACKGROUND"] = "false"
+os.environ["GOLDMINE_DOCUMENT_INGEST_WORKERS"] = "0"
+os.environ["GOLDMINE_DOCUMENT_PDF_WORKERS"] = "0"
+
 _schedules_tmpdir = tempfile.mkdtemp(prefix="goldmine_schedules_test_")
 os.environ["GOLDMINE_SCHEDULES_DIR"] = _schedules_tmpdir
 
@@ -30,18 +36,41 @@ import app.documents.factory as docf
 import app.llm.factory as llmf
 import app.email.factory as emf
 import app.api.documents as docs_api
+import app.documents.embeddings as embeddings
+import app.documents.extraction_cache as extraction_cache
+import app.documents.ingestion as ingestion
+import app.llm.cache as llm_cache
+import app.llm.gateway as llm_gateway
+import app.email.scheduler as scheduler
+import app.email.schedule_queue as schedule_queue
 
 
 @pytest.fixture(autouse=True)
 def _reset_providers():
     daf._provider = None
+    daf._price_history_store = None
     osf._provider = None
     vf._provider = None
     docf._provider = None
     llmf._provider = None
     emf._email_provider = None
     emf._schedule_provider = None
+    if emf._leader_lock is not None:
+        emf._leader_lock.release()
+        emf._leader_lock = None
     docs_api._indexed_existing = False
+    if ingestion._pipeline is not None:
+        # A finished run has released its ingestion claim
+        ingestion._pipeline.join(120)
+    ingestion._pipeline = None
+    extraction_cache._cache = None
+    embeddings._embedder = None
+    llm_cache._cache = None
+    llm_gateway._gateway = None
+    if scheduler._dispatcher is not None:
+        scheduler._dispatcher.shutdown()
+        scheduler._dispatcher = None
+    schedule_queue._queue = None
     # Clean views files between tests
     import glob
     for f in glob.glob(os.path.join(_views_tmpdir, "*.json")):
@@ -49,9 +78,12 @@ def _reset_providers():
     # Clean documents index between tests
     for f in glob.glob(os.path.join(_docs_tmpdir, "*.json")):
         os.remove(f)
+    shutil.rmtree(os.path.join(_docs_tmpdir, "segments"), ignore_errors=True)
     # Clean schedules data between tests
-    for f in glob.glob(os.path.join(_schedules_tmpdir, "*.json")):
-        os.remove(f)
+    for pattern in ("*.json", "*.db", "*.db-wal", "*.db-shm"):
+        for f in glob.glob(os.path.join(_schedules_tmpdir, pattern)):
+            os.remove(f)
+    shutil.rmtree(os.path.join(_schedules_tmpdir, "delivery_logs"), ignore_errors=True)
     yield
 
 
@@ -97,3 +97,148 @@ async def test_pagination_metadata(authed_client):
     assert "has_previous" in data
     assert data["has_previous"] is False
     assert data["total_pages"] > 1
+
+
+@pytest.mark.asyncio
+async def test_query_stocks_sort_numeric_desc(authed_client):
+    response = await authed_client.get("/api/data/stocks?sort_by=market_cap_b&sort_order=desc&page_size=20")
+    assert response.status_code == 200
+    caps = [float(r["market_cap_b"]) for r in response.json()["data"]]
+    assert caps == sorted(caps, reverse=True)
+
+
+@pytest.mark.asyncio
+async def test_query_filter_is_case_insensitive(authed_client):
+    response = await authed_client.get("/api/data/stocks?sector=technology&page_size=200")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_records"] >= 1
+    assert all(r["sector"] == "Technology" for r in data["data"])
+
+
+@pytest.mark.asyncio
+async def test_query_filter_search_and_sort_compose(authed_client):
+    response = await authed_client.get(
+        "/api/data/portfolio_trades?ticker=AAPL&search=buy&sort_by=date&sort_order=desc&page_size=200"
+    )
+    assert response.status_code == 200
+    rows = response.json()["data"]
+    assert len(rows) >= 1
+    assert all(r["ticker"] == "AAPL" and r["action"] == "buy" for r in rows)
+    dates = [r["date"] for r in rows]
+    assert dates == sorted(dates, reverse=True)
+    # Values are returned exactly as stored in the CSV
+    assert all(isinstance(r["shares"], str) for r in rows)
+
+
+@pytest.mark.asyncio
+async def test_query_multiple_filters_intersect(authed_client):
+    response = await authed_client.get("/api/data/stocks?sector=Technology&exchange=NASDAQ&page_size=200")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_records"] >= 1
+    for row in data["data"]:
+        assert row["sector"] == "Technology"
+        assert row["exchange"] == "NASDAQ"
+
+
+@pytest.mark.asyncio
+async def test_query_filter_no_match(authed_client):
+    response = await authed_client.get("/api/data/stocks?sector=Nonexistent")
+    assert response.status_code == 200
+    assert response.json()["total_records"] == 0
+
+
+def test_declared_indexes_built_at_load():
+    from app.data_access.csv_provider import CsvDataAccessProvider
+
+    provider = CsvDataAccessProvider()
+    stocks = next(d for d in provider.list_datasets() if d.name == "stocks")
+    assert "sector" in stocks.indexed_fields.split(";")
+
+    table = provider._get_data("stocks")
+    assert table.columns["sector"].is_indexed
+    assert not table.columns["industry"].is_indexed
+
+    # Undeclared columns get an index on first filter
+    ids = table.match_all({"industry": "software"})
+    assert table.columns["industry"].is_indexed
+    assert len(ids) >= 1
+
+
+def test_get_records_batch_preserves_order_and_skips_unknown():
+    from app.data_access.csv_provider import CsvDataAccessProvider
+
+    provider = CsvDataAccessProvider()
+    records = provider.get_records("stocks", ["MSFT", "ZZZZ", "AAPL"])
+    assert [r["ticker"] for r in records] == ["MSFT", "AAPL"]
+    # Lookups are exact by default
+    assert provider.get_record("stocks", "aapl") is None
+
+
+def test_get_record_case_insensitive_mode(monkeypatch):
+    from app.config.settings import settings
+    from app.data_access.csv_provider import CsvDataAccessProvider
+
+    monkeypatch.setattr(settings, "DATA_CASE_INSENSITIVE_IDS", True)
+    provider = CsvDataAccessProvider()
+    record = provider.get_record("stocks", "aapl")
+    assert record is not None
+    assert record["ticker"] == "AAPL"
+
+
+def _write_csv(path, header, rows, mtime_ns):
+    import os
+
+    path.write_text("\n".join([",".join(header)] + [",".join(r) for r in rows]) + "\n")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_reload_changed_swaps_in_new_generation(tmp_path):
+    from app.data_access.csv_provider import CsvDataAccessProvider
+    from app.data_access.models import FilterParams
+
+    _write_csv(
+        tmp_path / "datasets.csv",
+        ["dataset_id", "name", "display_name", "description", "record_count", "id_field", "category", "indexed_fields"],
+        [["DS-1", "quotes", "Quotes", "Test", "2", "ticker", "test", "sector"]],
+        1_000_000_000,
+    )
+    _write_csv(tmp_path / "quotes.csv", ["ticker", "sector"], [["AAA", "Tech"], ["BBB", "Energy"]], 1_000_000_000)
+
+    provider = CsvDataAccessProvider(str(tmp_path))
+    old_table = provider._get_data("quotes")
+    assert provider.query("quotes", FilterParams(filters={"sector": "tech"})).total_records == 1
+    assert provider.reload_changed() == []
+
+    _write_csv(
+        tmp_path / "quotes.csv",
+        ["ticker", "sector"],
+        [["AAA", "Tech"], ["BBB", "Energy"], ["CCC", "Tech"]],
+        2_000_000_000,
+    )
+    assert provider.reload_changed() == ["quotes"]
+
+    # New table (and its declared index) replaced the old one; old readers keep theirs
+    assert provider.query("quotes", FilterParams(filters={"sector": "tech"})).total_records == 2
+    assert provider.get_record("quotes", "CCC") is not None
+    assert len(old_table) == 2
+    assert provider._get_data("quotes").columns["sector"].is_indexed
+
+    stats = provider.get_stats()
+    quotes = next(s for s in stats.datasets if s.dataset == "quotes")
+    assert quotes.generation == 2
+    assert quotes.rows == 3
+    assert stats.generation == 2
+
+
+@pytest.mark.asyncio
+async def test_data_stats_endpoint(authed_client):
+    await authed_client.get("/api/data/stocks?page_size=1")
+    response = await authed_client.get("/api/health/data")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["generation"] >= 1
+    stocks = next(d for d in data["datasets"] if d["dataset"] == "stocks")
+    assert stocks["rows"] > 0
+    assert stocks["load_duration_ms"] >= 0
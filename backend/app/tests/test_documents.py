@@ -1,5 +1,25 @@
+import json
+import threading
+import time
+
+import numpy as np
 import pytest
 
+import app.documents.ingestion as ingestion
+from app.config.settings import settings
+import app.documents.extraction_cache as extraction_cache
+from app.documents.embeddings import HashingEmbedder
+from app.documents.extraction_cache import ExtractionCache, extract_chunks, text_key
+import app.documents.extractor as extractor
+from app.documents.factory import get_document_provider
+from app.documents.ingestion import IngestionPipeline
+from app.documents.inverted_index import InvertedIndex
+from app.documents.json_provider import JsonDocumentIndexProvider
+from app.documents.models import EntityAssociation
+from app.documents.vector_index import VectorIndex
+from app.email.leader_lock import FileLeaderLock
+from app.object_storage.factory import get_storage_provider
+
 
 @pytest.mark.asyncio
 async def test_list_documents_auto_indexes_existing(authed_client):
@@ -44,6 +64,16 @@ async def test_search_documents_filter_by_entity(authed_client):
         assert "AAPL" in entity_ids
 
 
+@pytest.mark.asyncio
+async def test_search_documents_hybrid_mode(authed_client):
+    await authed_client.get("/api/documents/")
+    response = await authed_client.get("/api/documents/search?q=earnings&mode=hybrid")
+    assert response.status_code == 200
+    assert len(response.json()) > 0
+    response = await authed_client.get("/api/documents/search?q=earnings&mode=semantic")
+    assert response.status_code == 422
+
+
 @pytest.mark.asyncio
 async def test_search_no_results(authed_client):
     await authed_client.get("/api/documents/")
@@ -116,3 +146,527 @@ async def test_upload_no_filename(authed_client):
 async def test_documents_require_auth(client):
     response = await client.get("/api/documents/")
     assert response.status_code == 401
+
+
+def _index(provider, file_id, text, entity_id="AAPL", title="Doc"):
+    return provider.index_document(
+        file_id=file_id, filename=f"{file_id}.txt", title=title, doc_type="note",
+        mime_type="text/plain", date="2025-01-01", description="",
+        entities=[EntityAssociation(entity_type="stock", entity_id=entity_id)], text=text,
+    )
+
+
+def test_inverted_index_bm25():
+    index = InvertedIndex()
+    index.add("a", "margin margin margin guidance")
+    index.add("b", "margin outlook for the quarter with lots of other words here")
+    index.add("c", "nothing relevant")
+
+    scores = index.score(["margin"])
+    assert set(scores) == {"a", "b"}
+    assert scores["a"] > scores["b"]
+    # Rarer terms weigh more
+    assert index.score(["guidance"])["a"] > index.score(["margin"])["a"] / 3
+
+    index.remove("a", "margin margin margin guidance")
+    assert index.document_frequency("margin") == 1
+    assert index.document_frequency("guidance") == 0
+    assert index.score(["margin"], keys={"c"}) == {}
+
+
+def test_provider_search_ranks_and_maintains_index(tmp_path):
+    provider = JsonDocumentIndexProvider(str(tmp_path))
+    _index(provider, "f1", "Revenue grew. Revenue guidance raised. Revenue beat.")
+    _index(provider, "f2", "Revenue was flat this quarter.", entity_id="MSFT")
+    _index(provider, "f3", "Unrelated supply chain commentary.", title="Revenue review")
+
+    results = provider.search("revenue")
+    ranked = [r.file_id for r in results]
+    assert set(ranked) == {"f1", "f2", "f3"}
+    assert ranked.index("f1") < ranked.index("f2")
+    # f3 only matches on its (double-weighted) title
+    assert next(r for r in results if r.file_id == "f3").matching_chunks == []
+
+    assert [r.file_id for r in provider.search("revenue", limit=1)] == ranked[:1]
+    assert {r.file_id for r in provider.search("revenue", entity_id="MSFT")} == {"f2"}
+
+    # Re-indexing replaces the old postings; removal drops them
+    _index(provider, "f1", "Dividend announcement only.")
+    assert "f1" not in {r.file_id for r in provider.search("revenue")}
+    assert provider.remove_document("f2")
+    assert {r.file_id for r in provider.search("revenue")} == {"f3"}
+
+    # The index is rebuilt from disk on restart
+    reloaded = JsonDocumentIndexProvider(str(tmp_path))
+    assert [r.file_id for r in reloaded.search("dividend")] == ["f1"]
+
+
+def test_hashing_embedder_matches_word_variants():
+    embedder = HashingEmbedder(dim=256)
+    vectors = embedder.embed([
+        "Quarterly revenues increased on stronger margins",
+        "revenue increase and margin expansion",
+        "The board appointed a new chief legal officer",
+    ])
+    assert vectors.shape == (3, 256) and vectors.dtype == np.float32
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert vectors[0] @ vectors[1] > 2 * (vectors[0] @ vectors[2])
+    assert np.array_equal(embedder.embed(["margins"]), embedder.embed(["margins"]))
+
+
+def test_vector_index_add_remove_and_search():
+    index = VectorIndex(dim=3)
+    index.add_many(["x", "y", "z"], np.eye(3, dtype=np.float32))
+    query = np.array([0.9, 0.1, 0.0], dtype=np.float32)
+    assert [k for k, _ in index.search(query, k=2)] == ["x", "y"]
+    assert [k for k, _ in index.search(query, k=5, keys={"y", "z"})] == ["y"]
+
+    # Removing swaps the last row into the hole
+    index.remove("x")
+    assert len(index) == 2 and "x" not in index
+    assert [k for k, _ in index.search(query, k=5)] == ["y"]
+    index.add_many(["x"], np.array([[1.0, 0.0, 0.0]], dtype=np.float32))
+    assert index.search(query, k=1)[0][0] == "x"
+
+
+def test_provider_hybrid_search_finds_word_variants(tmp_path):
+    provider = JsonDocumentIndexProvider(str(tmp_path))
+    _index(provider, "f1", "Revenues increased sharply on pricing.")
+    _index(provider, "f2", "The board appointed a new chief legal officer.", entity_id="MSFT")
+
+    # BM25 has no stemming, so only the embedding side links revenue/revenues
+    assert provider.search("revenue increase") == []
+    # The first hybrid search starts the background build and ranks by keyword meanwhile
+    if not provider.build_vector_index():
+        assert provider.search("revenue increase", mode="hybrid") == []
+    assert provider.build_vector_index(wait=True)
+    hybrid = provider.search("revenue increase", mode="hybrid")
+    assert [r.file_id for r in hybrid] == ["f1"]
+    assert hybrid[0].matching_chunks
+
+    # Writes after the vector index is built are reflected in it
+    _index(provider, "f3", "Revenues increased again in Europe.", entity_id="MSFT")
+    assert {r.file_id for r in provider.search("revenue increase", entity_id="MSFT", mode="hybrid")} == {"f3"}
+    provider.remove_document("f1")
+    assert [r.file_id for r in provider.search("revenue increase", mode="hybrid")] == ["f3"]
+    with pytest.raises(ValueError):
+        provider.search("revenue", mode="semantic")
+
+
+def test_vector_index_build_keeps_up_with_writes_during_build(tmp_path, monkeypatch):
+    import app.documents.json_provider as json_provider
+
+    provider = JsonDocumentIndexProvider(str(tmp_path))
+    for i in range(3):
+        _index(provider, f"f{i}", f"Revenues increased in region {i}.")
+    monkeypatch.setattr(json_provider, "_EMBED_BATCH", 1)
+
+    embedder = HashingEmbedder(64)
+    calls = []
+
+    class _Interleaving:
+        dim = embedder.dim
+
+        def embed(self, texts):
+            calls.append(texts)
+            if len(calls) == 1:
+                # Embedding runs without the provider lock: another thread can write meanwhile
+                writer = threading.Thread(target=lambda: (
+                    _index(provider, "late", "Revenues increased late in the year."),
+                    provider.remove_document("f0"),
+                ))
+                writer.start()
+                writer.join(timeout=5)
+                assert not writer.is_alive()
+            return embedder.embed(texts)
+
+    monkeypatch.setattr(json_provider, "get_embedder", lambda: _Interleaving())
+    assert provider.build_vector_index(wait=True)
+    hits = {r.file_id for r in provider.search("revenue increase", mode="hybrid")}
+    assert hits == {"f1", "f2", "late"}
+    assert len(provider._vector_index) == 3
+
+
+def test_segments_append_and_replay(tmp_path):
+    provider = JsonDocumentIndexProvider(str(tmp_path))
+    for i in range(5):
+        _index(provider, f"f{i}", f"Document {i} about margins.")
+    provider.remove_document("f3")
+    _index(provider, "f1", "Replaced text about buybacks.")
+
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    assert len(manifest["segments"]) == 1
+    lines = (tmp_path / "segments" / manifest["segments"][0]).read_text().splitlines()
+    assert len(lines) == 7
+    assert json.loads(lines[5]) == {"op": "del", "file_id": "f3"}
+    assert not (tmp_path / "index.json").exists()
+
+    reloaded = JsonDocumentIndexProvider(str(tmp_path))
+    assert {d.file_id for d in reloaded.list_documents()} == {"f0", "f1", "f2", "f4"}
+    assert [r.file_id for r in reloaded.search("buybacks")] == ["f1"]
+    assert "f1" not in {r.file_id for r in reloaded.search("margins")}
+
+
+def test_segments_roll_and_compact(tmp_path):
+    provider = JsonDocumentIndexProvider(str(tmp_path), max_segment_bytes=1)
+    for i in range(4):
+        _index(provider, f"f{i}", f"Revision one of document {i}.")
+    for i in range(4):
+        _index(provider, f"f{i}", f"Revision two of document {i}.")
+    provider.remove_document("f0")
+    assert len(list((tmp_path / "segments").glob("*.jsonl"))) == 10
+
+    assert provider.compact() is False  # below the garbage threshold
+    assert provider.compact(force=True) is True
+
+    segments = json.loads((tmp_path / "manifest.json").read_text())["segments"]
+    assert sorted(segments) == sorted(p.name for p in (tmp_path / "segments").glob("*.jsonl"))
+    assert len(list((tmp_path / "segments").glob("*.blob"))) == 2
+    assert len(segments) == 2
+    # The compacted segment replays first
+    compacted = (tmp_path / "segments" / segments[0]).read_text().splitlines()
+    assert len(compacted) == 3
+
+    reloaded = JsonDocumentIndexProvider(str(tmp_path))
+    assert {d.file_id for d in reloaded.list_documents()} == {"f1", "f2", "f3"}
+    assert reloaded.search("one") == []
+    assert len(reloaded.search("two")) == 3
+
+
+def test_workers_sharing_a_directory_survive_each_others_compaction(tmp_path):
+    # Two providers on one directory stand in for two uvicorn workers
+    a = JsonDocumentIndexProvider(str(tmp_path), max_segment_bytes=1)
+    b = JsonDocumentIndexProvider(str(tmp_path), max_segment_bytes=1)
+    for i in range(3):
+        _index(a, f"a{i}", f"Revision one of worker a document {i}.")
+    _index(b, "b0", "Worker b wrote this document.")
+    _index(a, "a0", "Revision two of worker a document 0.")
+    # Each sees the other's writes
+    assert a.is_indexed("b0") and b.get_document("a0").chunks[0].text.startswith("Revision two")
+
+    with a._store.compaction():
+        assert b.compact(force=True) is False  # one compactor at a time
+    assert a.compact(force=True) is True
+
+    # b's chunk locations still point at the old segments, which stay until b lets go
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    assert manifest["retired"]
+    b_ref = b._chunks["b0"][0]
+    assert b._store.read_text(b_ref.segment, b_ref.offset, b_ref.length) == "Worker b wrote this document."
+
+    _index(b, "b1", "Written after the compaction.")
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    assert manifest["retired"] == []
+    assert sorted(manifest["segments"]) == sorted(p.name for p in (tmp_path / "segments").glob("*.jsonl"))
+    assert b.get_document("b0").chunks[0].text == "Worker b wrote this document."
+    assert [r.file_id for r in a.search("compaction")] == ["b1"]
+    assert a.remove_document("b1") and not b.is_indexed("b1")
+
+    reloaded = JsonDocumentIndexProvider(str(tmp_path))
+    assert {d.file_id for d in reloaded.list_documents()} == {"a0", "a1", "a2", "b0"}
+    assert reloaded.get_document("a0").chunks[0].text == "Revision two of worker a document 0."
+
+
+def test_worker_booting_during_legacy_migration_waits_for_it(tmp_path, monkeypatch):
+    source = JsonDocumentIndexProvider(str(tmp_path / "src"))
+    records = [_index(source, f"f{i}", f"Legacy document {i}.") for i in range(3)]
+    (tmp_path / "index.json").write_text(json.dumps([r.model_dump() for r in records]))
+
+    second: list[JsonDocumentIndexProvider] = []
+    booting = threading.Thread(target=lambda: second.append(JsonDocumentIndexProvider(str(tmp_path))))
+    original = JsonDocumentIndexProvider._migrate_legacy
+
+    def migrate_while_another_worker_boots(self, legacy_path):
+        booting.start()
+        booting.join(0.3)
+        assert booting.is_alive()  # blocked on the manifest lock
+        original(self, legacy_path)
+
+    monkeypatch.setattr(JsonDocumentIndexProvider, "_migrate_legacy", migrate_while_another_worker_boots)
+    first = JsonDocumentIndexProvider(str(tmp_path))
+    booting.join(5)
+    assert len(first.list_documents()) == len(second[0].list_documents()) == 3
+
+
+def test_legacy_index_is_migrated(tmp_path):
+    legacy = JsonDocumentIndexProvider(str(tmp_path / "old"))
+    _index(legacy, "f1", "Legacy transcript on pricing.")
+    record = legacy.get_document("f1")
+    (tmp_path / "new").mkdir()
+    (tmp_path / "new" / "index.json").write_text(json.dumps([record.model_dump()]))
+
+    provider = JsonDocumentIndexProvider(str(tmp_path / "new"))
+    assert provider.get_document("f1") == record
+    assert (tmp_path / "new" / "manifest.json").exists()
+
+    # Once migrated, the legacy file is no longer read
+    (tmp_path / "new" / "index.json").write_text("[]")
+    assert JsonDocumentIndexProvider(str(tmp_path / "new")).is_indexed("f1")
+
+
+def test_chunk_texts_live_in_blobs(tmp_path):
+    provider = JsonDocumentIndexProvider(str(tmp_path))
+    record = _index(provider, "f1", "Gross margin expanded on services mix.")
+    _index(provider, "f2", "Capital return program was extended.")
+
+    segment = json.loads((tmp_path / "manifest.json").read_text())["segments"][0]
+    line = json.loads((tmp_path / "segments" / segment).read_text().splitlines()[0])
+    assert "text" not in line["record"]["chunks"][0]
+    assert len(line["spans"]) == len(record.chunks)
+
+    reloaded = JsonDocumentIndexProvider(str(tmp_path))
+    assert reloaded._chunk_index is None  # built on first search
+    assert reloaded.get_document("f1") == record
+    hit = reloaded.search("margin")[0]
+    assert hit.matching_chunks[0].text == record.chunks[0].text
+
+    # Writes after the index is built extend the mapped active blob
+    _index(reloaded, "f3", "Margin guidance reaffirmed.")
+    assert {r.file_id for r in reloaded.search("margin")} == {"f1", "f3"}
+    assert reloaded.get_document("f3").chunks[0].text == "Margin guidance reaffirmed."
+
+
+def test_inline_text_segments_are_upgraded(tmp_path):
+    source = JsonDocumentIndexProvider(str(tmp_path / "src"))
+    record = _index(source, "f1", "Inline text from the first segment format.")
+    (tmp_path / "segments").mkdir()
+    (tmp_path / "segments" / "seg-000001.jsonl").write_text(
+        json.dumps({"op": "put", "record": record.model_dump()}) + "\n"
+    )
+    (tmp_path / "manifest.json").write_text(
+        json.dumps({"version": 1, "segments": ["seg-000001.jsonl"], "next_segment": 2})
+    )
+
+    provider = JsonDocumentIndexProvider(str(tmp_path))
+    assert provider.get_document("f1") == record
+    assert json.loads((tmp_path / "manifest.json").read_text())["version"] == 2
+    assert not (tmp_path / "segments" / "seg-000001.jsonl").exists()
+    assert JsonDocumentIndexProvider(str(tmp_path)).get_document("f1") == record
+
+
+def test_ingestion_pipeline_uses_process_pool_and_batches():
+    files = get_storage_provider().list_files()
+    pipeline = IngestionPipeline(workers=2, batch_size=4, queue_size=3)
+    assert pipeline.start(files) is True
+    pipeline.join(timeout=120)
+
+    status = pipeline.status()
+    assert status.state == "completed"
+    assert status.indexed + status.failed == status.total == len(files)
+    assert status.failed == 0
+    provider = get_document_provider()
+    assert all(provider.is_indexed(f.file_id) for f in files)
+    assert provider.search("earnings")
+
+
+def test_ingest_missing_runs_in_one_process_at_a_time(tmp_path):
+    files = get_storage_provider().list_files()[:3]
+    other_worker = FileLeaderLock(tmp_path / "ingestion.lock")
+    pipeline = IngestionPipeline(workers=0, claim=FileLeaderLock(tmp_path / "ingestion.lock"))
+
+    assert other_worker.acquire()
+    assert pipeline.ingest_missing(files, background=False) is None
+    assert not any(get_document_provider().is_indexed(f.file_id) for f in files)
+
+    other_worker.release()
+    assert pipeline.ingest_missing(files, background=False) == 3
+    # The claim is released with the run; nothing is left to do for the next holder
+    assert other_worker.acquire()
+    other_worker.release()
+    assert pipeline.ingest_missing(files, background=False) == 0
+
+
+@pytest.mark.asyncio
+async def test_background_ingestion_reports_progress(authed_client, monkeypatch):
+    monkeypatch.setattr(settings, "DOCUMENT_INGEST_BACKGROUND", True)
+    # Requests are served while ingestion runs
+    response = await authed_client.get("/api/documents/")
+    assert response.status_code == 200
+
+    ingestion.get_ingestion_pipeline().join(timeout=120)
+    response = await authed_client.get("/api/documents/ingestion")
+    assert response.status_code == 200
+    status = response.json()
+    assert status["state"] == "completed"
+    assert status["total"] >= 14
+    assert status["indexed"] == status["total"]
+    assert status["eta_seconds"] == 0.0
+
+    response = await authed_client.get("/api/documents/")
+    assert len(response.json()) >= 14
+
+
+def test_extraction_cache_reuses_text_and_chunks(tmp_path, monkeypatch):
+    extraction_cache._cache = ExtractionCache(tmp_path, max_bytes=1_000_000)
+    calls = []
+
+    def counting_extract(file_bytes, mime_type, filename, issues=None):
+        calls.append(filename)
+        yield file_bytes.decode()
+
+    monkeypatch.setattr(extraction_cache, "iter_text", counting_extract)
+    body = ("Revenue rose sharply this quarter. " * 40).encode()
+
+    first = extract_chunks(body, "text/plain", "a.txt")
+    assert extract_chunks(body, "text/plain", "copy-of-a.txt") == first
+    assert calls == ["a.txt"]
+
+    # A new chunk size re-chunks the cached text without re-extracting
+    monkeypatch.setattr(settings, "DOCUMENT_CHUNK_SIZE", 200)
+    smaller = extract_chunks(body, "text/plain", "a.txt")
+    assert len(smaller) > len(first)
+    assert calls == ["a.txt"]
+    assert (tmp_path / f"{text_key(body)}.txt").exists()
+
+
+def test_extraction_cache_evicts_least_recently_used(tmp_path):
+    cache = ExtractionCache(tmp_path, max_bytes=250)
+    cache.put_text("a", "x" * 100)
+    cache.put_text("b", "y" * 100)
+    assert cache.get_text("a") == "x" * 100  # a is now most recent
+    cache.put_text("c", "z" * 100)
+
+    assert cache.get_text("b") is None
+    assert cache.get_text("a") is not None and cache.get_text("c") is not None
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.txt", "c.txt"]
+
+    # A new instance picks up the existing entries and their sizes
+    reopened = ExtractionCache(tmp_path, max_bytes=250)
+    reopened.put_text("d", "w" * 100)
+    assert len(list(tmp_path.iterdir())) == 2
+
+
+def _make_pdf(pages: list[str]) -> bytes:
+    """A minimal PDF with one line of Helvetica text per page."""
+    count = len(pages)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        ("<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(count)), count,
+        )).encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for i, text in enumerate(pages):
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(
+            (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+             f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>").encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % off for off in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def test_pdf_pages_stream_in_order_across_workers(monkeypatch):
+    pdf = _make_pdf([f"Page {i} discusses segment margins" for i in range(1, 8)])
+    monkeypatch.setattr(settings, "DOCUMENT_PDF_PAGES_PER_TASK", 2)
+
+    serial = list(extractor.iter_pdf_pages(pdf, "filing.pdf"))
+    assert [t.strip() for t in serial] == [f"Page {i} discusses segment margins" for i in range(1, 8)]
+
+    monkeypatch.setattr(settings, "DOCUMENT_PDF_WORKERS", 2)
+    monkeypatch.setattr(extractor, "_page_pool", None)
+    try:
+        assert list(extractor.iter_pdf_pages(pdf, "filing.pdf")) == serial
+    finally:
+        extractor._page_pool.shutdown()
+        extractor._page_pool = None
+
+    text = extractor.extract_text(pdf, "application/pdf", "filing.pdf")
+    assert text.count("discusses") == 7
+
+
+def test_only_marked_pool_workers_skip_the_page_pool(monkeypatch):
+    pdf = _make_pdf(["Page 1 text", "Page 2 text"])
+    monkeypatch.setattr(settings, "DOCUMENT_PDF_WORKERS", 2)
+    monkeypatch.setattr(extractor, "_page_pool", None)
+
+    # A pool worker (marked by the pool initializer) extracts serially
+    monkeypatch.setattr(extractor, "_in_worker_process", False)
+    extractor.mark_worker_process()
+    assert extractor.extract_text(pdf, "application/pdf", "a.pdf").count("text") == 2
+    assert extractor._page_pool is None
+
+    # Any other process, including a uvicorn worker child, uses the page pool
+    monkeypatch.setattr(extractor, "_in_worker_process", False)
+    try:
+        assert extractor.extract_text(pdf, "application/pdf", "a.pdf").count("text") == 2
+        assert extractor._page_pool is not None
+    finally:
+        extractor._page_pool.shutdown()
+        extractor._page_pool = None
+
+
+def test_pdf_page_time_budget_skips_slow_pages(monkeypatch):
+    from pypdf import PageObject
+
+    original = PageObject.extract_text
+
+    def slow_on_page_two(self, *args, **kwargs):
+        text = original(self, *args, **kwargs)
+        if "Page 2" in text:
+            time.sleep(5)
+        return text
+
+    monkeypatch.setattr(PageObject, "extract_text", slow_on_page_two)
+    pdf = _make_pdf(["Page 1 ok", "Page 2 stuck", "Page 3 ok"])
+
+    started = time.monotonic()
+    texts = extractor._extract_page_range(pdf, "slow.pdf", 0, 3, timeout=0.2)
+    assert time.monotonic() - started < 3
+    assert [t and t.strip() for t in texts] == ["Page 1 ok", None, "Page 3 ok"]
+
+
+def test_incomplete_pdf_extraction_is_not_cached(tmp_path, monkeypatch):
+    from pypdf import PageObject
+
+    extraction_cache._cache = ExtractionCache(tmp_path, max_bytes=1_000_000)
+    original = PageObject.extract_text
+    failures = [RuntimeError("transient")]
+
+    def flaky_page_two(self, *args, **kwargs):
+        text = original(self, *args, **kwargs)
+        if "Page 2" in text and failures:
+            raise failures.pop()
+        return text
+
+    monkeypatch.setattr(PageObject, "extract_text", flaky_page_two)
+    pdf = _make_pdf(["Page 1 revenue", "Page 2 margins", "Page 3 cash"])
+
+    first = extract_chunks(pdf, "application/pdf", "flaky.pdf")
+    assert "margins" not in " ".join(t for t, _, _ in first)
+    assert list(tmp_path.iterdir()) == []
+
+    # The next attempt extracts the page and is cached
+    second = extract_chunks(pdf, "application/pdf", "flaky.pdf")
+    assert "margins" in " ".join(t for t, _, _ in second)
+    assert (tmp_path / f"{text_key(pdf)}.txt").exists()
+
+
+def test_iter_chunks_streams_pieces_like_whole_text():
+    text = "\n".join(
+        f"Line {i} covers revenue. It also covers margins! Does it cover cash?" for i in range(60)
+    )
+    whole = extractor.chunk_text(text, 200, 50)
+    assert len(whole) > 5
+    pieces = [text[i:i + 37] for i in range(0, len(text), 37)]
+    assert list(extractor.iter_chunks(iter(pieces), 200, 50)) == whole
+    for chunk, start, end in whole:
+        assert chunk.split()[0] in text[start:end]
+
+
+def test_iter_chunks_token_units():
+    text = " ".join(f"Sentence number {i} is here." for i in range(200))
+    chunks = extractor.chunk_text(text, chunk_size=50, overlap=10, unit="tokens")
+    assert all(extractor.estimate_tokens(c) <= 50 for c, _, _ in chunks)
+    assert len(chunks) > len(extractor.chunk_text(text, chunk_size=50 * 4 * 2, overlap=40))
+    with pytest.raises(ValueError):
+        extractor.chunk_text(text, unit="words")
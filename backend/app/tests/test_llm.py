@@ -1,10 +1,23 @@
-from unittest.mock import MagicMock
+import asyncio
+import json
+import time
+from unittest.mock import AsyncMock, MagicMock
 
+import httpx
 import pytest
 
 import app.llm.factory as llmf
 from app.config.settings import settings
-from app.llm.models import LLMQueryResponse
+from app.documents.extractor import chunk_text, estimate_tokens
+from app.documents.factory import get_document_provider
+from app.documents.models import DocumentChunk, DocumentSearchResult
+from app.exceptions import GoldMineError
+from app.llm.anthropic_provider import AnthropicProvider
+from app.llm.cache import LLMResponseCache, invalidate_entities
+from app.llm.context import NO_DOCUMENTS, pack_context
+from app.llm.fake_provider import FakeLLMProvider
+from app.llm.gateway import LLMGateway
+from app.llm.models import LLMQueryRequest, LLMQueryResponse
 
 
 @pytest.mark.asyncio
@@ -13,7 +26,7 @@ async def test_llm_query_returns_response(authed_client):
     await authed_client.get("/api/documents/")
 
     # Mock the LLM provider
-    mock_provider = MagicMock()
+    mock_provider = AsyncMock()
     mock_provider.query.return_value = LLMQueryResponse(
         answer="AAPL reported strong earnings with revenue growth.",
         sources=[],
@@ -67,7 +80,7 @@ async def test_llm_query_includes_sources(authed_client):
     # Trigger auto-index
     await authed_client.get("/api/documents/")
 
-    mock_provider = MagicMock()
+    mock_provider = AsyncMock()
     mock_provider.query.return_value = LLMQueryResponse(
         answer="Based on the earnings transcript, revenue increased.",
         sources=[],
@@ -101,3 +114,277 @@ async def test_llm_query_includes_sources(authed_client):
     finally:
         settings.ANTHROPIC_API_KEY = original_key
         llmf._provider = None
+
+
+@pytest.mark.asyncio
+async def test_llm_query_cached_until_entity_reindexed(authed_client):
+    await authed_client.get("/api/documents/")
+    # Hybrid ranks by keyword until the vector index is ready; settle it so
+    # repeated queries retrieve the same context
+    await asyncio.to_thread(get_document_provider().build_vector_index, True)
+
+    mock_provider = AsyncMock()
+    mock_provider.query.return_value = LLMQueryResponse(answer="Revenue grew.", model="m")
+    llmf._provider = mock_provider
+    original_key = settings.ANTHROPIC_API_KEY
+    settings.ANTHROPIC_API_KEY = "test-key"
+    body = {"query": "What were AAPL earnings?", "entity_type": "stock", "entity_id": "AAPL"}
+
+    try:
+        first = (await authed_client.post("/api/documents/query", json=body)).json()
+        # Case, spacing and trailing punctuation don't defeat the cache
+        second = (await authed_client.post(
+            "/api/documents/query", json={**body, "query": "  what were AAPL   earnings"},
+        )).json()
+        assert first["cached"] is False and second["cached"] is True
+        assert second["answer"] == first["answer"] and second["sources"] == first["sources"]
+        assert mock_provider.query.call_count == 1
+
+        stats = (await authed_client.get("/api/documents/query/cache")).json()
+        assert stats["hits"] == 1 and stats["misses"] == 1 and stats["hit_rate"] == 0.5
+
+        # Indexing documents for another entity leaves the answer; for AAPL it drops it
+        invalidate_entities([("stock", "MSFT")])
+        assert (await authed_client.post("/api/documents/query", json=body)).json()["cached"] is True
+        invalidate_entities([("stock", "AAPL")])
+        assert (await authed_client.post("/api/documents/query", json=body)).json()["cached"] is False
+        assert mock_provider.query.call_count == 2
+    finally:
+        settings.ANTHROPIC_API_KEY = original_key
+        llmf._provider = None
+
+
+def test_llm_cache_ttl_invalidation_and_disk_tier(tmp_path, monkeypatch):
+    import app.llm.cache as llm_cache
+
+    request = LLMQueryRequest(query="Margins?", entity_type="stock", entity_id="AAPL")
+    key = llm_cache.cache_key(request, "ctx", ["c1", "c2"], "m")
+    assert key != llm_cache.cache_key(request, "ctx", ["c1", "c3"], "m")
+    entity = ("stock", "AAPL")
+
+    cache = LLMResponseCache(max_entries=10, ttl_seconds=60, cache_dir=tmp_path)
+    cache.put(key, entity, LLMQueryResponse(answer="Up."))
+    # A fresh instance (e.g. after a restart) is served from disk
+    restarted = LLMResponseCache(max_entries=10, ttl_seconds=60, cache_dir=tmp_path)
+    assert restarted.get(key, entity).answer == "Up."
+
+    assert restarted.invalidate([entity]) == 1
+    assert restarted.get(key, entity) is None
+    assert cache.get(key, entity) is not None  # another process keeps its memory tier
+    assert not (tmp_path / "stock" / "AAPL").exists()
+
+    now = time.time()
+    monkeypatch.setattr(llm_cache.time, "time", lambda: now + 61)
+    assert cache.get(key, entity) is None
+
+
+def _parse_sse(body: str) -> list[tuple[str, object]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_llm_query_stream_sends_sources_then_tokens(authed_client, monkeypatch):
+    await authed_client.get("/api/documents/")
+    await asyncio.to_thread(get_document_provider().build_vector_index, True)
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "fake")
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", "")
+    body = {"query": "earnings", "entity_type": "stock", "entity_id": "AAPL"}
+
+    response = await authed_client.post("/api/documents/query/stream", json=body)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _parse_sse(response.text)
+
+    assert events[0][0] == "sources"
+    tokens = [data["text"] for name, data in events if name == "token"]
+    assert len(tokens) > 3
+    assert events[-1] == ("done", {"model": "fake-llm", "token_usage": events[-1][1]["token_usage"], "cached": False})
+
+    # The streamed answer matches the non-streaming one, which is now cached
+    full = (await authed_client.post("/api/documents/query", json=body)).json()
+    assert full["cached"] is True
+    assert "".join(tokens) == full["answer"]
+    assert [s["file_id"] for s in full["sources"]] == [s["file_id"] for s in events[0][1]]
+
+    again = _parse_sse((await authed_client.post("/api/documents/query/stream", json=body)).text)
+    assert [name for name, _ in again] == ["sources", "token", "done"]
+    assert again[-1][1]["cached"] is True
+
+
+@pytest.mark.asyncio
+async def test_llm_query_stream_reports_provider_errors(authed_client, monkeypatch):
+    mock_provider = MagicMock()
+    mock_provider.stream.side_effect = RuntimeError("overloaded")
+    llmf._provider = mock_provider
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", "test-key")
+
+    response = await authed_client.post(
+        "/api/documents/query/stream",
+        json={"query": "Test query", "entity_type": "stock", "entity_id": "AAPL"},
+    )
+    events = _parse_sse(response.text)
+    assert [name for name, _ in events] == ["sources", "error"]
+
+
+def _result(file_id, chunks, score=1.0):
+    return DocumentSearchResult(
+        file_id=file_id,
+        filename=f"{file_id}.txt",
+        title=file_id,
+        doc_type="transcript",
+        date="",
+        description="",
+        entities=[],
+        matching_chunks=[
+            DocumentChunk(
+                chunk_id=f"{file_id}-{index}",
+                file_id=file_id,
+                chunk_index=index,
+                text=text,
+                char_start=0,
+                char_end=len(text),
+            )
+            for index, text in chunks
+        ],
+        score=score,
+    )
+
+
+def test_pack_context_merges_neighbours_and_drops_duplicates():
+    text = " ".join(f"Sentence {i} covers margins and revenue growth." for i in range(60))
+    chunks = chunk_text(text, 300, 100)
+    results = [
+        _result("a", [(1, chunks[1][0]), (0, chunks[0][0]), (2, chunks[2][0])], score=2.0),
+        _result("b", [(0, chunks[0][0])]),  # same text as a's first chunk
+    ]
+    packed = pack_context(results, token_budget=10_000, max_chunks=10, mmr_lambda=1.0)
+
+    assert packed.chunk_ids == ["a-1", "a-0", "a-2"]
+    assert [s.chunk_index for s in packed.sources] == [0, 1, 2]
+    assert packed.text.startswith("[a.txt, chunks 0-2]\n")
+    body = packed.text.split("\n", 1)[1]
+    # Each sentence appears once even though neighbouring chunks overlap
+    assert body.count("Sentence 5 covers") == 1
+    assert body == text[:len(body)]
+
+
+def test_pack_context_respects_budget_and_prefers_new_information():
+    revenue = "Revenue grew twelve percent on iPhone demand in the quarter."
+    results = [
+        _result("a", [(0, revenue)], score=3.0),
+        _result("b", [(4, revenue.replace("twelve", "12"))], score=2.9),
+        _result("c", [(7, "Board approved a larger buyback and a dividend increase.")], score=2.0),
+    ]
+    by_relevance = pack_context(results, token_budget=10_000, max_chunks=2, mmr_lambda=1.0)
+    assert by_relevance.chunk_ids == ["a-0", "b-4"]
+    diverse = pack_context(results, token_budget=10_000, max_chunks=2, mmr_lambda=0.5)
+    assert diverse.chunk_ids == ["a-0", "c-7"]
+
+    tight = pack_context(results, token_budget=estimate_tokens(revenue), max_chunks=5)
+    assert tight.chunk_ids == ["a-0"]
+    assert pack_context(results, token_budget=3, max_chunks=5).text == NO_DOCUMENTS
+
+
+class _SlowProvider(FakeLLMProvider):
+    def __init__(self):
+        self.calls = 0
+        self.running = 0
+        self.peak = 0
+
+    async def query(self, request, context, sources_context):
+        self.calls += 1
+        self.running += 1
+        self.peak = max(self.peak, self.running)
+        await asyncio.sleep(0.05)
+        self.running -= 1
+        return await super().query(request, context, sources_context)
+
+
+def _request(query):
+    return LLMQueryRequest(query=query, entity_type="stock", entity_id="AAPL")
+
+
+@pytest.mark.asyncio
+async def test_gateway_coalesces_and_limits_concurrency():
+    provider = _SlowProvider()
+    llmf._provider = provider
+    gateway = LLMGateway(max_concurrency=2, rate_per_minute=0, queue_timeout=5)
+
+    # Three identical questions share one call; four distinct ones run two at a time
+    same = [gateway.query("u1", "same", _request("q"), "", "") for _ in range(3)]
+    distinct = [gateway.query("u1", f"k{i}", _request(f"q{i}"), "", "") for i in range(4)]
+    answers = await asyncio.gather(*same, *distinct)
+
+    assert provider.calls == 5 and provider.peak == 2
+    assert gateway.coalesced == 2
+    assert answers[0] == answers[1] == answers[2] and answers[0] is not answers[1]
+    llmf._provider = None
+
+
+@pytest.mark.asyncio
+async def test_gateway_rate_limit_and_queue_timeout():
+    llmf._provider = _SlowProvider()
+    gateway = LLMGateway(max_concurrency=1, rate_per_minute=2, queue_timeout=0.01)
+    gateway.admit("u1")
+    gateway.admit("u1")
+    with pytest.raises(GoldMineError) as exc:
+        gateway.admit("u1")
+    assert exc.value.status_code == 429
+    gateway.admit("u2")  # limits are per user
+
+    busy = LLMGateway(max_concurrency=1, rate_per_minute=0, queue_timeout=0.01)
+    results = await asyncio.gather(
+        busy.query("u1", "a", _request("a"), "", ""),
+        busy.query("u1", "b", _request("b"), "", ""),
+        return_exceptions=True,
+    )
+    assert isinstance(results[0], LLMQueryResponse)
+    assert isinstance(results[1], GoldMineError) and results[1].status_code == 503
+    llmf._provider = None
+
+
+def _stub_anthropic(request: httpx.Request) -> httpx.Response:
+    """A minimal stand-in for the Messages API, plain and streaming."""
+    body = json.loads(request.content)
+    assert request.url.path == "/v1/messages"
+    message = {
+        "id": "msg_1", "type": "message", "role": "assistant", "model": body["model"],
+        "content": [{"type": "text", "text": "Revenue grew."}],
+        "stop_reason": "end_turn", "stop_sequence": None,
+        "usage": {"input_tokens": 42, "output_tokens": 4},
+    }
+    if not body.get("stream"):
+        return httpx.Response(200, json=message)
+    events = [
+        ("message_start", {"type": "message_start", "message": {
+            **message, "content": [], "stop_reason": None, "usage": {"input_tokens": 42, "output_tokens": 0},
+        }}),
+        ("content_block_start", {"type": "content_block_start", "index": 0,
+                                 "content_block": {"type": "text", "text": ""}}),
+        *[("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                   "delta": {"type": "text_delta", "text": t}}) for t in ("Revenue", " grew.")],
+        ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+        ("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                           "usage": {"output_tokens": 4}}),
+        ("message_stop", {"type": "message_stop"}),
+    ]
+    sse = "".join(f"event: {name}\ndata: {json.dumps(data)}\n\n" for name, data in events)
+    return httpx.Response(200, content=sse.encode(), headers={"content-type": "text/event-stream"})
+
+
+@pytest.mark.asyncio
+async def test_anthropic_provider_against_stub_server(monkeypatch):
+    monkeypatch.setattr(settings, "ANTHROPIC_API_KEY", "test-key")
+    provider = AnthropicProvider(http_client=httpx.AsyncClient(transport=httpx.MockTransport(_stub_anthropic)))
+
+    response = await provider.query(_request("Revenue?"), "ctx", "docs")
+    assert response.answer == "Revenue grew."
+    assert response.token_usage == {"input_tokens": 42, "output_tokens": 4}
+
+    items = [item async for item in provider.stream(_request("Revenue?"), "ctx", "docs")]
+    assert items[:-1] == ["Revenue", " grew."]
+    assert items[-1].answer == "Revenue grew." and items[-1].token_usage["output_tokens"] == 4
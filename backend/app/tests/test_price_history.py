@@ -0,0 +1,256 @@
+from __future__ import annotations
+
+import os
+
+import numpy as np
+import pytest
+
+import app.data_access.factory as daf
+from app.data_access.downsampling import lttb_indices, marker_indices, minmax_indices
+from app.data_access.price_history import PriceHistoryStore, PriceSeries, resample
+
+_ROWS = [
+    # date, ticker, close, eps_estimate, eps_actual — grouped by date like the real file
+    ("2024-01-02", "AAPL", "185.64", "", ""),
+    ("2024-01-02", "MSFT", "370.87", "", ""),
+    ("2024-01-03", "AAPL", "184.25", "2.10", ""),
+    ("2024-01-03", "MSFT", "370.60", "", ""),
+    ("2024-01-04", "AAPL", "181.91", "", "2.18"),
+    ("2024-01-04", "MSFT", "367.94", "", ""),
+    ("2024-01-05", "AAPL", "181.18", "", ""),
+]
+
+
+def _write_history(path, rows, mtime_ns=1_700_000_000_000_000_000):
+    lines = ["date,ticker,close,eps_estimate,eps_actual"] + [",".join(r) for r in rows]
+    path.write_text("\n".join(lines) + "\n")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+@pytest.fixture
+def history_store(tmp_path):
+    csv_path = tmp_path / "stock_history.csv"
+    _write_history(csv_path, _ROWS)
+    return PriceHistoryStore(csv_path, tmp_path / "cache")
+
+
+def test_series_is_contiguous_and_typed(history_store):
+    series = history_store.get_series("AAPL")
+    assert series is not None
+    assert series.size == 4
+    assert series.dates.dtype == np.int32
+    assert series.close.dtype == np.float64
+    assert np.all(np.diff(series.dates) > 0)
+    assert isinstance(series.close, np.memmap)
+
+    records = series.to_records()
+    assert records[0] == {"date": "2024-01-02", "close": 185.64}
+    assert records[1]["eps_estimate"] == 2.10
+    assert records[2]["eps_actual"] == 2.18
+    assert "eps_actual" not in records[1]
+
+    assert history_store.get_series("ZZZZ") is None
+    assert history_store.tickers() == ["AAPL", "MSFT"]
+
+
+def test_cache_is_reused_and_rebuilt_on_change(tmp_path, history_store):
+    history_store.get_series("AAPL")
+    cache_dirs = [p for p in (tmp_path / "cache").iterdir() if p.is_dir()]
+    assert len(cache_dirs) == 1
+
+    # A second store (another worker) opens the existing conversion
+    other = PriceHistoryStore(tmp_path / "stock_history.csv", tmp_path / "cache")
+    assert other.get_series("MSFT").size == 3
+    assert [p for p in (tmp_path / "cache").iterdir() if p.is_dir()] == cache_dirs
+
+    _write_history(
+        tmp_path / "stock_history.csv",
+        _ROWS + [("2024-01-05", "MSFT", "367.75", "", "")],
+        mtime_ns=1_800_000_000_000_000_000,
+    )
+    assert history_store.get_series("MSFT").size == 4
+    new_dirs = [p for p in (tmp_path / "cache").iterdir() if p.is_dir()]
+    assert len(new_dirs) == 1 and new_dirs != cache_dirs
+
+
+def test_missing_csv_returns_no_series(tmp_path):
+    store = PriceHistoryStore(tmp_path / "missing.csv", tmp_path / "cache")
+    assert store.get_series("AAPL") is None
+
+
+@pytest.mark.asyncio
+async def test_price_history_endpoint_pages_store(authed_client, history_store):
+    daf._price_history_store = history_store
+
+    resp = await authed_client.get("/api/entities/stock/AAPL/price-history?page_size=3")
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["total_records"] == 4
+    assert data["has_next"] is True
+    assert [r["date"] for r in data["data"]] == ["2024-01-02", "2024-01-03", "2024-01-04"]
+
+    resp = await authed_client.get("/api/entities/stock/AAPL/price-history?page=2&page_size=3")
+    assert [r["date"] for r in resp.json()["data"]] == ["2024-01-05"]
+
+
+@pytest.mark.asyncio
+async def test_price_history_endpoint_unknown_stock(authed_client, history_store):
+    daf._price_history_store = history_store
+    resp = await authed_client.get("/api/entities/stock/ZZZZ/price-history")
+    assert resp.status_code == 404
+
+
+def test_lttb_keeps_endpoints_and_extremes():
+    x = np.arange(1000)
+    y = np.sin(x / 50.0)
+    y[437] = 5.0
+    picked = lttb_indices(x, y, 100)
+    assert len(picked) <= 100
+    assert picked[0] == 0 and picked[-1] == 999
+    assert 437 in picked
+    assert np.all(np.diff(picked) > 0)
+
+    assert len(lttb_indices(x[:10], y[:10], 100)) == 10
+
+
+def test_minmax_keeps_bucket_extremes_and_skips_nan():
+    y = np.arange(100, dtype=np.float64)
+    y[10] = -1.0
+    y[50] = np.nan
+    picked = minmax_indices(y, 20)
+    assert picked[0] == 0 and picked[-1] == 99
+    assert 10 in picked
+    assert 50 not in picked
+    assert len(picked) <= 22
+
+
+def test_marker_indices():
+    est = np.array([np.nan, 1.0, np.nan, np.nan])
+    act = np.array([np.nan, np.nan, np.nan, 2.0])
+    assert marker_indices(est, act).tolist() == [1, 3]
+
+
+@pytest.mark.asyncio
+async def test_price_history_endpoint_downsamples_and_keeps_eps(tmp_path, authed_client):
+    rows = []
+    for i in range(400):
+        day = np.datetime64("2020-01-01") + i
+        est = "1.50" if i == 123 else ""
+        act = "1.60" if i == 321 else ""
+        rows.append((str(day), "AAPL", f"{100 + (i % 37) * 0.5:.2f}", est, act))
+    _write_history(tmp_path / "stock_history.csv", rows)
+    daf._price_history_store = PriceHistoryStore(tmp_path / "stock_history.csv", tmp_path / "cache")
+
+    for method in ("lttb", "minmax"):
+        resp = await authed_client.get(
+            f"/api/entities/stock/AAPL/price-history?points=50&downsample={method}"
+        )
+        assert resp.status_code == 200
+        data = resp.json()["data"]
+        assert len(data) <= 52
+        assert data[0]["date"] == "2020-01-01"
+        assert data[-1]["date"] == str(np.datetime64("2020-01-01") + 399)
+        assert any(r.get("eps_estimate") == 1.5 for r in data)
+        assert any(r.get("eps_actual") == 1.6 for r in data)
+
+    resp = await authed_client.get(
+        "/api/entities/stock/AAPL/price-history?start=2020-02-01&end=2020-02-10"
+    )
+    data = resp.json()["data"]
+    assert [r["date"] for r in (data[0], data[-1])] == ["2020-02-01", "2020-02-10"]
+    assert resp.json()["total_records"] == 10
+
+    resp = await authed_client.get("/api/entities/stock/AAPL/price-history?points=2")
+    assert resp.status_code == 422
+
+
+def _daily_series(start: str, closes: list[float]) -> PriceSeries:
+    dates = (np.datetime64(start) + np.arange(len(closes))).astype(np.int32)
+    nan = np.full(len(closes), np.nan)
+    return PriceSeries("AAPL", dates, np.array(closes, dtype=np.float64), nan.copy(), nan.copy())
+
+
+def test_resample_weekly_ohlc():
+    # 2024-01-01 is a Monday: two full weeks
+    series = _daily_series("2024-01-01", [10, 12, 9, 11, 10, 10, 10, 20, 22, 18, 21, 25, 24, 23])
+    series.eps_actual[3] = 1.1
+    series.eps_actual[5] = 1.2
+
+    bars = resample(series, "weekly")
+    records = bars.to_records()
+    assert [r["date"] for r in records] == ["2024-01-07", "2024-01-14"]
+    assert records[0] == {
+        "date": "2024-01-07", "open": 10.0, "high": 12.0, "low": 9.0, "close": 10.0,
+        "eps_actual": 1.2,
+    }
+    assert records[1]["open"] == 20.0 and records[1]["high"] == 25.0 and records[1]["low"] == 18.0
+    assert "eps_actual" not in records[1]
+
+    assert resample(series, "daily") is series
+
+
+def test_resample_monthly_and_quarterly():
+    series = _daily_series("2024-01-30", [float(i) for i in range(70)])
+    monthly = resample(series, "monthly").to_records()
+    assert [r["date"] for r in monthly] == ["2024-01-31", "2024-02-29", "2024-03-31", "2024-04-08"]
+    assert monthly[1]["open"] == 2.0 and monthly[1]["close"] == 30.0
+
+    quarterly = resample(series, "quarterly").to_records()
+    assert [(r["open"], r["close"]) for r in quarterly] == [(0.0, 61.0), (62.0, 69.0)]
+
+    assert resample(series.between(0, -1), "monthly").size == 0
+
+
+@pytest.mark.asyncio
+async def test_price_history_endpoint_interval(authed_client, history_store):
+    daf._price_history_store = history_store
+    resp = await authed_client.get(
+        "/api/entities/stock/AAPL/price-history?interval=weekly&start=2024-01-03"
+    )
+    assert resp.status_code == 200
+    data = resp.json()
+    assert data["total_records"] == 1
+    assert data["data"] == [{
+        "date": "2024-01-05", "open": 184.25, "high": 184.25, "low": 181.18, "close": 181.18,
+        "eps_estimate": 2.10, "eps_actual": 2.18,
+    }]
+
+    resp = await authed_client.get("/api/entities/stock/AAPL/price-history?interval=hourly")
+    assert resp.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_price_history_batch(authed_client, history_store):
+    daf._price_history_store = history_store
+
+    resp = await authed_client.get(
+        "/api/entities/stock/price-history/batch?tickers=MSFT,AAPL,ZZZZ,AAPL"
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["tickers"] == ["MSFT", "AAPL"]
+    assert body["missing"] == ["ZZZZ"]
+    assert body["aligned"] is False
+    aapl = body["series"]["AAPL"]
+    assert aapl["dates"] == ["2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05"]
+    assert aapl["eps_estimate"] == [None, 2.10, None, None]
+    assert len(body["series"]["MSFT"]["close"]) == 3
+
+
+@pytest.mark.asyncio
+async def test_price_history_batch_aligned(authed_client, history_store):
+    daf._price_history_store = history_store
+
+    resp = await authed_client.get(
+        "/api/entities/stock/price-history/batch?tickers=AAPL,MSFT&align=true&start=2024-01-03"
+    )
+    body = resp.json()
+    assert body["aligned"] is True
+    assert body["dates"] == ["2024-01-03", "2024-01-04", "2024-01-05"]
+    # MSFT has no 2024-01-05 row: its last close is carried forward
+    assert body["series"]["MSFT"]["close"] == [370.60, 367.94, 367.94]
+    assert body["series"]["MSFT"]["dates"] is None
+    assert body["series"]["AAPL"]["eps_actual"] == [None, 2.18, None]
+
+    resp = await authed_client.get("/api/entities/stock/price-history/batch?tickers=,")
+    assert resp.status_code == 400
@@ -1,14 +1,34 @@
 from __future__ import annotations
 
+import asyncio
+import json
+import sqlite3
+import threading
+import time
 from datetime import datetime, timezone
 from unittest.mock import MagicMock
 
 import pytest
 from dateutil.relativedelta import relativedelta
 
-from app.email.factory import get_schedule_provider
-from app.email.models import EmailScheduleCreate
-from app.email.scheduler import _compute_next_run, _process_due_schedules, _update_schedule_fields
+from app.email.delivery_log import JsonlDeliveryLog
+from app.email.dispatcher import ScheduleDispatcher
+from app.email.factory import get_leader_lock, get_schedule_provider
+from app.email.leader_lock import FileLeaderLock, SqliteLeaderLock
+from app.email.json_schedule_provider import JsonScheduleProvider
+from app.email.models import EmailLog, EmailSchedule, EmailScheduleCreate, EmailScheduleUpdate
+from app.email.schedule_queue import ScheduleQueue, get_schedule_queue
+from app.email.scheduler import (
+    _compute_next_run,
+    _handle_timeout,
+    _process_due_schedules,
+    _prune_delivery_logs,
+    _record_late_result,
+    _sleep_seconds,
+    _sync_queue,
+    _update_schedule_fields,
+)
+from app.email.sqlite_schedule_provider import SqliteScheduleProvider
 
 
 @pytest.mark.asyncio
@@ -105,6 +125,39 @@ async def test_process_due_schedule_retry():
     assert next_run > datetime.now(timezone.utc)
 
 
+@pytest.mark.asyncio
+async def test_timed_out_send_is_not_retried():
+    provider = get_schedule_provider()
+    schedule = provider.create_schedule(
+        EmailScheduleCreate(
+            name="Slow Send",
+            entity_type="stock",
+            entity_id="AAPL",
+            recipients=["test@example.com"],
+            time_of_day="09:00",
+            days_of_week=[0, 1, 2, 3, 4],
+        ),
+        owner="analyst1",
+    )
+    past = (datetime.now(timezone.utc) - relativedelta(hours=1)).isoformat()
+    _update_schedule_fields(schedule.schedule_id, {"next_run_at": past})
+    schedule = provider.get_schedule(schedule.schedule_id)
+
+    # The send may still go out, so no 5-minute retry: straight to the next regular run
+    _handle_timeout(schedule)
+    updated = provider.get_schedule(schedule.schedule_id)
+    assert updated.retry_count == 0 and updated.status == "active"
+    assert datetime.fromisoformat(updated.next_run_at) > datetime.now(timezone.utc) + relativedelta(hours=1)
+    assert [l.status for l in provider.get_logs(schedule.schedule_id)] == ["failed"]
+
+    # A late success is still recorded; a late failure adds nothing
+    _record_late_result(schedule, "SMTP error")
+    _record_late_result(schedule, None)
+    updated = provider.get_schedule(schedule.schedule_id)
+    assert updated.last_run_at is not None
+    assert sorted(l.status for l in provider.get_logs(schedule.schedule_id)) == ["failed", "sent"]
+
+
 @pytest.mark.asyncio
 async def test_compute_next_run_skips_days():
     # Schedule for Mon/Wed/Fri (0, 2, 4)
@@ -122,3 +175,390 @@ async def test_compute_next_run_skips_days():
     assert next_dt.weekday() == 2
     assert next_dt.hour == 9
     assert next_dt.minute == 0
+
+
+def _create(provider, name="S", entity_id="AAPL", owner="analyst1"):
+    return provider.create_schedule(
+        EmailScheduleCreate(
+            name=name,
+            entity_type="stock",
+            entity_id=entity_id,
+            recipients=["test@example.com"],
+        ),
+        owner=owner,
+    )
+
+
+@pytest.mark.parametrize("provider_cls", [JsonScheduleProvider, SqliteScheduleProvider])
+def test_schedule_providers_update_fields_and_filters(tmp_path, provider_cls):
+    provider = provider_cls(str(tmp_path))
+    a = _create(provider, "A")
+    b = _create(provider, "B", entity_id="MSFT", owner="analyst2")
+    past = (datetime.now(timezone.utc) - relativedelta(minutes=1)).isoformat()
+    earlier = (datetime.now(timezone.utc) - relativedelta(hours=1)).isoformat()
+
+    updated = provider.update_fields(a.schedule_id, {"next_run_at": past, "retry_count": 2})
+    assert updated.next_run_at == past and updated.retry_count == 2
+    provider.update_fields(b.schedule_id, {"next_run_at": earlier})
+    assert provider.update_fields("missing", {"retry_count": 1}) is None
+
+    assert [s.name for s in provider.get_due_schedules()] in (["A", "B"], ["B", "A"])
+    provider.update_schedule(b.schedule_id, EmailScheduleUpdate(status="paused"))
+    assert [s.name for s in provider.get_due_schedules()] == ["A"]
+
+    assert [s.name for s in provider.list_schedules(owner="analyst2")] == ["B"]
+    assert [s.name for s in provider.list_schedules(entity_type="stock", entity_id="AAPL")] == ["A"]
+    assert [s.name for s in provider.list_schedules()] == ["A", "B"]
+    assert provider.delete_schedule(a.schedule_id) and not provider.delete_schedule(a.schedule_id)
+    assert provider.get_schedule(a.schedule_id) is None
+
+
+def test_sqlite_schedule_provider_imports_json_and_uses_indexes(tmp_path):
+    legacy = JsonScheduleProvider(str(tmp_path))
+    kept = _create(legacy, "Legacy")
+    legacy.add_log(EmailLog(
+        log_id="l1", schedule_id=kept.schedule_id, sent_at="2026-01-01T09:00:00+00:00",
+        status="sent", recipients=["test@example.com"],
+    ))
+
+    provider = SqliteScheduleProvider(str(tmp_path))
+    assert provider.get_schedule(kept.schedule_id).name == "Legacy"
+    assert [l.log_id for l in provider.get_logs(kept.schedule_id)] == ["l1"]
+
+    # Imported once: a restart reads the database, not the JSON files
+    _create(provider, "New")
+    reopened = SqliteScheduleProvider(str(tmp_path))
+    assert [s.name for s in reopened.list_schedules()] == ["Legacy", "New"]
+
+    conn = sqlite3.connect(tmp_path / "schedules.db")
+    plan = " ".join(str(row) for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT data FROM schedules WHERE status = 'active'"
+        " AND next_run_at > '' AND next_run_at <= ? ORDER BY next_run_at", ("x",),
+    ))
+    assert "schedules_due" in plan
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    conn.close()
+
+
+def _log(log_id, schedule_id, sent_at):
+    return EmailLog(
+        log_id=log_id, schedule_id=schedule_id, sent_at=sent_at,
+        status="sent", recipients=["test@example.com"],
+    )
+
+
+def test_delivery_log_rotates_indexes_and_recovers(tmp_path):
+    log = JsonlDeliveryLog(tmp_path, max_file_bytes=400, max_file_age_seconds=3600)
+    for i in range(10):
+        log.append(_log(f"l{i}", "a" if i % 2 else "b", f"2026-01-01T09:{i:02d}:00+00:00"))
+    assert len(log.files) > 1
+    assert [l.log_id for l in log.get("a")] == ["l9", "l7", "l5", "l3", "l1"]
+
+    # Simulate a crash mid-append: the torn line is dropped on reopen
+    with open(tmp_path / log.files[-1], "ab") as f:
+        f.write(b'{"log_id": "torn", "sched')
+    reopened = JsonlDeliveryLog(tmp_path, max_file_bytes=400, max_file_age_seconds=3600)
+    assert [l.log_id for l in reopened.get("b")] == ["l8", "l6", "l4", "l2", "l0"]
+    reopened.append(_log("l10", "b", "2026-01-01T09:10:00+00:00"))
+    assert reopened.get("b")[0].log_id == "l10"
+    assert len(reopened.read_all()) == 11
+
+
+def test_delivery_log_prune_drops_only_sealed_expired_files(tmp_path):
+    log = JsonlDeliveryLog(tmp_path, max_file_bytes=1, max_file_age_seconds=3600)
+    log.append(_log("old", "a", "2025-01-01T00:00:00+00:00"))
+    log.append(_log("new", "a", "2026-06-01T00:00:00+00:00"))
+    log.append(_log("older-but-active", "a", "2024-01-01T00:00:00+00:00"))
+    assert len(log.files) == 3
+
+    assert log.prune("2026-01-01T00:00:00+00:00") == 1
+    assert len(log.files) == 2
+    assert [l.log_id for l in log.get("a")] == ["new", "older-but-active"]
+
+
+def test_delivery_log_instances_share_one_directory(tmp_path):
+    first = JsonlDeliveryLog(tmp_path, max_file_bytes=1, max_file_age_seconds=3600)
+    second = JsonlDeliveryLog(tmp_path, max_file_bytes=1, max_file_age_seconds=3600)
+    first.append(_log("l1", "S1", "2025-01-01T00:00:00+00:00"))
+    second.append(_log("l2", "S2", "2025-01-01T00:01:00+00:00"))
+    assert [l.log_id for l in second.get("S2")] == ["l2"]
+    assert [l.log_id for l in first.get("S2")] == ["l2"]
+
+    # Every append rolls; files made by one instance are followed by the other
+    for i in range(3, 8):
+        second.append(_log(f"l{i}", "S1", f"2026-06-01T00:0{i}:00+00:00"))
+    first.append(_log("l8", "S1", "2026-06-01T00:08:00+00:00"))
+    assert len(first.files) > 1 and first.files == second.files
+    expected = ["l8", "l7", "l6", "l5", "l4", "l3", "l1"]
+    assert [l.log_id for l in second.get("S1")] == expected
+
+    # So is retention
+    assert first.prune("2026-01-01T00:00:00+00:00") == 2
+    assert second.get("S2") == []
+    assert [l.log_id for l in second.get("S1")] == expected[:-1]
+
+
+def test_json_provider_migrates_legacy_log(tmp_path):
+    (tmp_path / "delivery_log.json").write_text(json.dumps([
+        _log("l2", "s1", "2026-02-01T00:00:00+00:00").model_dump(),
+        _log("l1", "s1", "2026-01-01T00:00:00+00:00").model_dump(),
+    ]))
+    provider = JsonScheduleProvider(str(tmp_path))
+    assert [l.log_id for l in provider.get_logs("s1")] == ["l2", "l1"]
+    provider.add_log(_log("l3", "s1", "2026-03-01T00:00:00+00:00"))
+
+    # Migrated once; the legacy file is no longer read
+    (tmp_path / "delivery_log.json").write_text("[]")
+    assert [l.log_id for l in JsonScheduleProvider(str(tmp_path)).get_logs("s1")] == ["l3", "l2", "l1"]
+
+
+def test_sqlite_provider_prunes_logs(tmp_path, monkeypatch):
+    provider = SqliteScheduleProvider(str(tmp_path))
+    provider.add_log(_log("old", "s1", "2020-01-01T00:00:00+00:00"))
+    provider.add_log(_log("new", "s1", datetime.now(timezone.utc).isoformat()))
+
+    monkeypatch.setattr("app.email.scheduler.get_schedule_provider", lambda: provider)
+    monkeypatch.setattr("app.email.scheduler.settings.DELIVERY_LOG_RETENTION_DAYS", 365)
+    assert _prune_delivery_logs() == 1
+    assert [l.log_id for l in provider.get_logs("s1")] == ["new"]
+
+    monkeypatch.setattr("app.email.scheduler.settings.DELIVERY_LOG_RETENTION_DAYS", 0)
+    assert _prune_delivery_logs() == 0
+
+
+def _schedule(schedule_id, recipient="a@example.com"):
+    return EmailSchedule(
+        schedule_id=schedule_id, owner="analyst1", name=schedule_id,
+        entity_type="stock", entity_id="AAPL", recipients=[recipient],
+    )
+
+
+class _Recorder:
+    """Deliver/record callbacks that track how many sends overlap."""
+
+    def __init__(self, delay=0.1):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.recorded = []
+        self.timed_out = []
+        self.late = []
+
+    def deliver(self, schedule):
+        with self.lock:
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+        return None
+
+    def record(self, schedule, error):
+        self.recorded.append((schedule.schedule_id, error))
+
+    def dispatcher(self, workers=4, domain_concurrency=0, job_timeout=5):
+        return ScheduleDispatcher(
+            self.deliver, self.record, self.timed_out.append,
+            lambda schedule, error: self.late.append((schedule.schedule_id, error)),
+            workers=workers, domain_concurrency=domain_concurrency, job_timeout=job_timeout,
+        )
+
+
+def test_dispatcher_runs_in_parallel_within_limits():
+    rec = _Recorder()
+    assert rec.dispatcher(workers=4).run([_schedule(f"s{i}", f"u{i}@d{i}.com") for i in range(8)]) == 8
+    assert rec.peak == 4
+    assert sorted(r[0] for r in rec.recorded) == sorted(f"s{i}" for i in range(8))
+
+    # Same recipient domain: capped by the per-domain limit
+    rec = _Recorder()
+    rec.dispatcher(workers=4, domain_concurrency=2).run(
+        [_schedule(f"s{i}", f"u{i}@Corp.com") for i in range(6)],
+    )
+    assert rec.peak == 2 and len(rec.recorded) == 6
+
+
+def test_dispatcher_busy_domain_does_not_block_other_domains():
+    done = {}
+    start = time.monotonic()
+
+    def deliver(schedule):
+        if schedule.recipients[0].endswith("slow.com"):
+            time.sleep(0.3)
+        done[schedule.schedule_id] = time.monotonic() - start
+
+    rec = _Recorder()
+    rec.deliver = deliver
+    jobs = rec.dispatcher(workers=4, domain_concurrency=1).submit(
+        [_schedule(f"slow{i}", f"u{i}@slow.com") for i in range(4)] + [_schedule("fast", "u@fast.com")],
+    )
+    # submit() does not wait for the batch
+    assert len(jobs) == 5 and len(done) < 5
+    for job in jobs:
+        job.settled.wait(5)
+    assert done["fast"] < 0.2
+    assert max(done.values()) >= 1.2  # slow.com sends ran one at a time
+
+
+def test_dispatcher_timeout_starts_when_the_send_does():
+    # A burst to one domain: each send fits the timeout, the wait for the domain does not
+    rec = _Recorder(delay=0.15)
+    dispatcher = rec.dispatcher(workers=8, domain_concurrency=1, job_timeout=0.4)
+    assert dispatcher.run([_schedule(f"s{i}", f"u{i}@firm.com") for i in range(6)]) == 6
+    assert rec.timed_out == [] and rec.late == []
+    assert sorted(r[0] for r in rec.recorded) == [f"s{i}" for i in range(6)]
+
+
+def test_dispatcher_never_runs_a_schedule_twice_and_times_out():
+    release = threading.Event()
+    rec = _Recorder()
+    rec.deliver = lambda schedule: release.wait(5) and None
+    dispatcher = rec.dispatcher(job_timeout=0.1)
+
+    schedule = _schedule("slow")
+    assert dispatcher.run([schedule]) == 1
+    assert [s.schedule_id for s in rec.timed_out] == ["slow"]
+    # Still running on its worker, so it cannot be picked again
+    assert dispatcher.in_flight == {"slow"}
+    assert dispatcher.submit([schedule]) == []
+
+    release.set()
+    for _ in range(100):
+        if not dispatcher.in_flight:
+            break
+        time.sleep(0.01)
+    assert dispatcher.in_flight == set()
+    # The late result goes to its own callback, not through ``record`` again
+    assert rec.recorded == [] and rec.late == [("slow", None)]
+
+
+def test_schedule_queue_tracks_provider_writes():
+    provider = get_schedule_provider()
+    queue = get_schedule_queue()
+    a = _create(provider, "A")
+    b = _create(provider, "B")
+    assert queue.next_due_at() is None  # not scheduled yet
+
+    soon = datetime.now(timezone.utc) + relativedelta(minutes=5)
+    later = soon + relativedelta(hours=1)
+    _update_schedule_fields(a.schedule_id, {"next_run_at": later.isoformat()})
+    _update_schedule_fields(b.schedule_id, {"next_run_at": soon.isoformat()})
+    assert queue.next_due_at() == soon and len(queue) == 2
+
+    # Pausing or deleting drops the entry; the stale heap item is skipped
+    provider.update_schedule(b.schedule_id, EmailScheduleUpdate(status="paused"))
+    assert queue.next_due_at() == later
+    provider.delete_schedule(a.schedule_id)
+    assert queue.next_due_at() is None
+
+    # A fresh queue is rebuilt from the store
+    provider.update_schedule(b.schedule_id, EmailScheduleUpdate(status="active"))
+    fresh = ScheduleQueue()
+    fresh.rebuild(provider.list_schedules())
+    assert fresh.next_due_at() == soon
+    assert _sleep_seconds(fresh, 60) == 60
+    assert 250 < _sleep_seconds(fresh, 600) <= 300
+    assert _sleep_seconds(fresh, 600, store_due=30) == 30
+
+
+@pytest.mark.asyncio
+async def test_schedule_queue_wakes_loop_on_earlier_schedule_from_thread():
+    queue = ScheduleQueue()
+    queue.attach(asyncio.get_running_loop())
+    queue.rebuild([_schedule("far")])
+    await queue.wait(0)  # consume the rebuild's wake-up
+
+    far = _schedule("far")
+    far.next_run_at = (datetime.now(timezone.utc) + relativedelta(days=1)).isoformat()
+    queue.update(far)
+    assert await queue.wait(1) is True
+
+    near = _schedule("near")
+    near.next_run_at = datetime.now(timezone.utc).isoformat()
+    threading.Timer(0.05, queue.update, (near,)).start()
+    assert await queue.wait(5) is True
+    assert queue.seconds_until_due() == 0
+
+    # A later schedule does not wake the loop
+    queue.update(far.model_copy(update={"schedule_id": "later"}))
+    assert await queue.wait(0.05) is False
+
+
+@pytest.mark.asyncio
+async def test_sync_queue_rebuilds_from_store():
+    provider = get_schedule_provider()
+    schedule = _create(provider)
+    past = (datetime.now(timezone.utc) - relativedelta(hours=1)).isoformat()
+    _update_schedule_fields(schedule.schedule_id, {"next_run_at": past})
+
+    # Simulate a write the queue never saw (e.g. from another process)
+    get_schedule_queue().remove(schedule.schedule_id)
+    assert get_schedule_queue().next_due_at() is None
+    _sync_queue()
+    assert get_schedule_queue().seconds_until_due() == 0
+
+
+def test_file_leader_lock_is_exclusive_until_released(tmp_path):
+    first = FileLeaderLock(tmp_path / "scheduler.lock")
+    second = FileLeaderLock(tmp_path / "scheduler.lock")
+    assert first.acquire() and first.acquire()
+    assert not second.acquire()
+    first.release()
+    assert second.acquire()
+    assert not first.acquire()
+    second.release()
+
+
+def test_sqlite_leader_lock_renews_expires_and_releases(tmp_path):
+    first = SqliteLeaderLock(tmp_path / "leader.db", lease_seconds=0.5)
+    second = SqliteLeaderLock(tmp_path / "leader.db", lease_seconds=0.5)
+    assert first.acquire()
+    assert not second.acquire()
+
+    # Renewing keeps the lease past its original expiry
+    time.sleep(0.3)
+    assert first.acquire()
+    time.sleep(0.3)
+    assert not second.acquire()
+
+    # A holder that stops renewing loses it
+    time.sleep(0.5)
+    assert second.acquire()
+    assert not first.acquire()
+
+    second.release()
+    assert first.acquire()
+
+
+def test_leader_lock_backend_from_settings(monkeypatch):
+    monkeypatch.setattr("app.email.factory.settings.SCHEDULER_LOCK_BACKEND", "sqlite")
+    lock = get_leader_lock()
+    assert isinstance(lock, SqliteLeaderLock) and lock.acquire()
+    assert get_leader_lock() is lock
+
+
+@pytest.mark.parametrize("provider_cls", [JsonScheduleProvider, SqliteScheduleProvider])
+def test_next_due_at_probe_sees_writes_from_another_process(tmp_path, provider_cls):
+    leader = provider_cls(str(tmp_path))
+    other = provider_cls(str(tmp_path))  # stands in for a standby worker
+    assert leader.next_due_at() is None
+
+    a = _create(other, "A")
+    b = _create(other, "B")
+    other.update_fields(a.schedule_id, {"next_run_at": "2030-01-02T09:00:00+00:00"})
+    other.update_fields(b.schedule_id, {"next_run_at": "2030-01-01T09:00:00+00:00"})
+    assert leader.next_due_at() == "2030-01-01T09:00:00+00:00"
+    other.update_fields(b.schedule_id, {"status": "paused"})
+    assert leader.next_due_at() == "2030-01-02T09:00:00+00:00"
+
+
+def test_sqlite_next_due_at_uses_due_index(tmp_path):
+    SqliteScheduleProvider(str(tmp_path))
+    conn = sqlite3.connect(tmp_path / "schedules.db")
+    plan = " ".join(str(row) for row in conn.execute(
+        "EXPLAIN QUERY PLAN SELECT MIN(next_run_at) FROM schedules"
+        " WHERE status = 'active' AND next_run_at > ''",
+    ))
+    conn.close()
+    assert "schedules_due" in plan
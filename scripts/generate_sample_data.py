@@ -230,16 +230,16 @@ def generate_people():
 
 def generate_datasets():
     rows = [
-        {"dataset_id": "DS-001", "name": "stocks", "display_name": "Stock Universe", "description": "Core stock universe with fundamentals", "record_count": 75, "id_field": "ticker", "category": "market_data"},
-        {"dataset_id": "DS-002", "name": "people", "display_name": "People Directory", "description": "Executives and analysts", "record_count": 40, "id_field": "person_id", "category": "contacts"},
-        {"dataset_id": "DS-003", "name": "sectors", "display_name": "Sector Reference", "description": "Sector and industry taxonomy", "record_count": 10, "id_field": "sector", "category": "reference"},
-        {"dataset_id": "DS-004", "name": "watchlists", "display_name": "Watchlists", "description": "Portfolio manager watchlists", "record_count": 0, "id_field": "watchlist_id", "category": "portfolio"},
-        {"dataset_id": "DS-005", "name": "meetings", "display_name": "Meeting Notes", "description": "Research meeting records", "record_count": 0, "id_field": "meeting_id", "category": "research"},
-        {"dataset_id": "DS-006", "name": "ratings", "display_name": "Analyst Ratings", "description": "Internal analyst ratings and targets", "record_count": 0, "id_field": "rating_id", "category": "research"},
-        {"dataset_id": "DS-007", "name": "portfolios", "display_name": "Portfolios", "description": "Portfolio holdings and allocations", "record_count": 0, "id_field": "portfolio_id", "category": "portfolio"},
-        {"dataset_id": "DS-008", "name": "events", "display_name": "Corporate Events", "description": "Earnings calls, conferences, filings", "record_count": 0, "id_field": "event_id", "category": "market_data"},
-        {"dataset_id": "DS-009", "name": "macro", "display_name": "Macro Indicators", "description": "Macroeconomic data points", "record_count": 0, "id_field": "indicator_id", "category": "market_data"},
-        {"dataset_id": "DS-010", "name": "filings", "display_name": "SEC Filings", "description": "SEC filing metadata", "record_count": 0, "id_field": "filing_id", "category": "compliance"},
+        {"dataset_id": "DS-001", "name": "stocks", "display_name": "Stock Universe", "description": "Core stock universe with fundamentals", "record_count": 75, "id_field": "ticker", "category": "market_data", "indexed_fields": "sector;exchange;ticker"},
+        {"dataset_id": "DS-002", "name": "people", "display_name": "People Directory", "description": "Executives and analysts", "record_count": 40, "id_field": "person_id", "category": "contacts", "indexed_fields": "type"},
+        {"dataset_id": "DS-003", "name": "sectors", "display_name": "Sector Reference", "description": "Sector and industry taxonomy", "record_count": 10, "id_field": "sector", "category": "reference", "indexed_fields": ""},
+        {"dataset_id": "DS-004", "name": "watchlists", "display_name": "Watchlists", "description": "Portfolio manager watchlists", "record_count": 0, "id_field": "watchlist_id", "category": "portfolio", "indexed_fields": ""},
+        {"dataset_id": "DS-005", "name": "meetings", "display_name": "Meeting Notes", "description": "Research meeting records", "record_count": 0, "id_field": "meeting_id", "category": "research", "indexed_fields": ""},
+        {"dataset_id": "DS-006", "name": "ratings", "display_name": "Analyst Ratings", "description": "Internal analyst ratings and targets", "record_count": 0, "id_field": "rating_id", "category": "research", "indexed_fields": ""},
+        {"dataset_id": "DS-007", "name": "portfolios", "display_name": "Portfolios", "description": "Portfolio holdings and allocations", "record_count": 0, "id_field": "portfolio_id", "category": "portfolio", "indexed_fields": ""},
+        {"dataset_id": "DS-008", "name": "events", "display_name": "Corporate Events", "description": "Earnings calls, conferences, filings", "record_count": 0, "id_field": "event_id", "category": "market_data", "indexed_fields": ""},
+        {"dataset_id": "DS-009", "name": "macro", "display_name": "Macro Indicators", "description": "Macroeconomic data points", "record_count": 0, "id_field": "indicator_id", "category": "market_data", "indexed_fields": ""},
+        {"dataset_id": "DS-010", "name": "filings", "display_name": "SEC Filings", "description": "SEC filing metadata", "record_count": 0, "id_field": "filing_id", "category": "compliance", "indexed_fields": ""},
     ]
     path = STRUCTURED_DIR / "datasets.csv"
     with open(path, "w", newline="") as f: